@@ -0,0 +1,159 @@
+""" cachetool.py
+    script main() function for maintenance of cache files: morpheuslib2 cache
+    files, and the persistent cache of morpheus.py.
+"""
+import morpheuslib2
+import morpheuslib
+import morpheus
+import argparse
+import os.path
+import urllib.error
+
+def freeze(args):
+    """ Write a read-only snapshot of a Cache or DbCache file.
+    Arg:
+        args: parsed arguments with attributes source and target.
+    Returns:
+        no value returned.
+    Effect:
+        creates or replaces the snapshot file.
+    """
+    if not os.path.exists(args.source):
+        print("No such cache file: " + args.source)
+        exit()
+    ca = morpheuslib2.open_cache(args.source)
+    n = morpheuslib2.SnapshotCache.freeze(ca, args.target)
+    print(str(n) + " responses from " + str(ca) + " frozen in " + args.target)
+
+def warm(args):
+    """ Rebuild the morpheus.py persistent cache from a corpus: rank its word
+        types by frequency, keep the most frequent that fit the byte budget,
+        fetch those not cached yet, and rewrite the cachewords file to match.
+    Arg:
+        args: parsed arguments with attributes input, lang, label, top, 
+            budget and workers.
+    Returns:
+        no value returned.
+    Effect:
+        replaces la.cache or greek.cache and cachewords.la or cachewords.greek.
+    """
+    t = morpheus.file_or_strio(args.input)
+    try:
+        ws = morpheuslib.WordStream(args.label, t, args.lang)
+    except IOError:
+        print("Missing info." + args.lang + " file. Must exit.")
+        exit()
+    counts, words = morpheus.type_counts(ws)
+    ws.close()
+    print(str(sum(counts.values())) + " words, " + str(len(counts))
+          + " word types in " + args.input)
+
+    morpheuslib.configure2()
+    ca = morpheus.Cache(args.lang)
+    print(ca.init_msg)
+    try:
+        ks = ca.warm(counts, words, args.top, args.budget, args.workers)
+    except (urllib.error.HTTPError, urllib.error.URLError) as err:
+        print("Error contacting Perseus: {0}".format(err))
+        print("Cache and cachewords left unchanged.")
+        exit()
+    ca.save()
+    ca.write_cachewords()
+    covered = sum([counts[k] for k in ks])
+    print(str(len(ks)) + " word types in the persistent cache, covering "
+          + str(covered) + " of " + str(sum(counts.values())) + " words.")
+
+def merge(args):
+    """ Merge cache files of any kind into one new cache file.
+    Arg:
+        args: parsed arguments with attributes sources, target and kind.
+    Returns:
+        no value returned.
+    Effect:
+        creates or replaces the target file.
+    """
+    for src in args.sources:
+        if not os.path.exists(src):
+            print("No such cache file: " + src)
+            exit()
+    n = morpheuslib2.merge_caches(args.sources, args.target, args.kind)
+    print(str(n) + " responses from " + str(len(args.sources))
+          + " cache file(s) merged into " + args.target)
+
+def compile_dictionary(args):
+    """ Compile the OK responses of a cache into a MorphDictionary.
+    Arg:
+        args: parsed arguments with attributes source and target.
+    Returns:
+        no value returned.
+    Effect:
+        creates or replaces the dictionary file.
+    """
+    if not os.path.exists(args.source):
+        print("No such cache file: " + args.source)
+        exit()
+    ca = morpheuslib2.open_cache(args.source)
+    d = morpheuslib2.MorphDictionary.compile(ca).save(args.target)
+    print(str(d) + " compiled from " + str(ca) + " into " + args.target)
+
+def main():
+    """ Cache maintenance commands. Use -h on a command for its arguments."""
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest = 'command')
+
+    p = sub.add_parser('freeze',
+            help = "write a memory-mapped, read-only snapshot of a cache")
+    p.add_argument("source",
+            help = "Cache or DbCache file")
+    p.add_argument("target",
+            help = "snapshot file to create or replace")
+    p.set_defaults(func = freeze)
+
+    p = sub.add_parser('warm',
+            help = "fill the morpheus.py persistent cache with the most "
+                   "frequent words of a corpus")
+    p.add_argument("input",
+            help = "text string or path + file name of the corpus")
+    p.add_argument("lang",
+            help = "language of words, greek or la", choices = ['greek', 'la'])
+    p.add_argument("--top", type = int, default = 500,
+            help = "maximum number of word types to keep (default is 500)")
+    p.add_argument("--budget", type = int,
+            help = "maximum size in bytes of the cached documents (default is "
+                   "no limit)")
+    p.add_argument("--workers", type = int, default = 8,
+            help = "number of words fetched at the same time (default is 8)")
+    p.add_argument("--label", default = 'no label',
+            help = "optional label for the corpus")
+    p.set_defaults(func = warm)
+
+    p = sub.add_parser('merge',
+            help = "merge or compact cache files of any kind into a new one")
+    p.add_argument("sources", nargs = '+',
+            help = "Cache, DbCache or snapshot files, or sharded cache "
+                   "directories")
+    p.add_argument("target",
+            help = "cache file to create or replace")
+    p.add_argument("--kind",
+            choices = ['pickle', 'sqlite', 'snapshot', 'sharded'],
+            help = "kind of the target file (default: by its extension, "
+                   ".snap for a snapshot, .db, .dbcache or .sqlite for a "
+                   "database, otherwise pickle)")
+    p.set_defaults(func = merge)
+
+    p = sub.add_parser('compile',
+            help = "compile a cache into a read-only morphological dictionary")
+    p.add_argument("source",
+            help = "cache file of any kind, or sharded cache directory")
+    p.add_argument("target",
+            help = "dictionary file to create or replace")
+    p.set_defaults(func = compile_dictionary)
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+    else:
+        args.func(args)
+
+if __name__ == '__main__':
+    main()
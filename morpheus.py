@@ -9,11 +9,24 @@ import io
 import datetime
 import os.path
 import pickle
+import collections
+import threading
+import concurrent.futures
+import queue
+import gzip
+import lzma
+import zlib
+import struct
+import sqlite3
 
-def output2(arg):
+def output2(arg, level = None):
     """ Return a file for writing or appending, or None if arg is None.
-    Arg:
+        A file name ending in .gz, .xz, .zz or .zlib gives a compressed 
+        stream (see CompressedText); appending to one adds a new member.
+    Args:
         arg: the file argument given by the user.
+        level: compression level 0-9 for compressed files, or None for the
+            library default.
     Returns:
         a text stream for writing or appending, unless arg is None, in
         which case it returns None.
@@ -22,22 +35,297 @@ def output2(arg):
         fn = arg
         if fn[0] == '+':
             fn = fn[1:]
-            return open(fn, 'a')
+            mode = 'a'
         else:
-            return open(fn, 'w')
+            mode = 'w'
+        ext = os.path.splitext(fn)[1]
+        if ext in CompressedText.kinds:
+            return CompressedText(fn, mode, CompressedText.kinds[ext], level)
+        else:
+            return open(fn, mode)
     else:
         return None
 
 
+class ZlibFrames(io.RawIOBase):
+    """ A binary stream written as a sequence of frames, each a 4-byte
+        big-endian length followed by that many bytes of a complete zlib 
+        stream. Every write makes one frame, so frames are as large as the
+        chunks passed by Writer.flush(); appending to a file just adds frames.
+    Attributes:
+        file: the underlying binary file
+        level: zlib compression level
+        name: file name.
+    """
+    def __init__(self, file, level = None):
+        self.file = file
+        if level is None:
+            self.level = -1
+        else:
+            self.level = level
+        self.name = file.name
+    
+    def writable(self):
+        return True
+    
+    def write(self, b):
+        if len(b) == 0:
+            return 0
+        else:
+            z = zlib.compress(bytes(b), self.level)
+            self.file.write(struct.pack('>I', len(z)))
+            self.file.write(z)
+            return len(b)
+        
+    def flush(self):
+        if self.closed:
+            pass
+        else:
+            self.file.flush()
+        
+    @staticmethod
+    def read_frames(fn):
+        """ Decompress a file of zlib frames.
+        Arg:
+            fn: file name.
+        Returns:
+            generator of bytes, one per frame.
+        """
+        with open(fn, 'rb') as f:
+            while True:
+                h = f.read(4)
+                if len(h) < 4:
+                    return
+                else:
+                    n = struct.unpack('>I', h)[0]
+                    yield zlib.decompress(f.read(n))
+        
+        
+class CompressedText(io.TextIOWrapper):
+    """ A UTF-8 text stream written through gzip, xz or zlib frames. In
+        append mode gzip and xz add a new member to the archive, which their
+        readers (and gzip.open/lzma.open) read as one stream. 
+    Class attribute:
+        kinds: dict of file extension -> kind ('gzip', 'xz' or 'zlib').
+    Attributes:
+        raw: the underlying binary file
+        mode: 'w' or 'a'
+        kind: 'gzip', 'xz' or 'zlib'.
+    """
+    kinds = {'.gz' : 'gzip', '.xz' : 'xz', '.zz' : 'zlib', '.zlib' : 'zlib'}
+    
+    def __init__(self, fn, mode, kind, level = None):
+        raw = open(fn, mode + 'b')
+        try:
+            if kind == 'gzip':
+                if level is None:
+                    level = 9
+                else:
+                    pass
+                b = gzip.GzipFile(fn, mode + 'b', level, raw)
+            elif kind == 'xz':
+                if level is None:
+                    level = 6
+                else:
+                    pass
+                b = lzma.LZMAFile(raw, mode + 'b', preset = level)
+            elif kind == 'zlib':
+                b = ZlibFrames(raw, level)
+            else:
+                raise ValueError("Unknown compression " + kind)
+        except Exception:
+            raw.close()
+            raise
+        super().__init__(b, encoding = 'utf-8')
+        self.raw = raw
+        self.mode = mode
+        self.kind = kind
+        
+    @property
+    def name(self):
+        return self.raw.name
+    
+    def __str__(self):
+        return ("<CompressedText name='" + self.name + "' mode='" + self.mode
+                + "' kind='" + self.kind + "'>")
+        
+    def close(self):
+        """ Finish the compressed member and close the file. """
+        try:
+            super().close()
+        finally:
+            self.raw.close()
+        
+
+class Writer:
+    """ A buffered output stream for one sink. Records are accumulated in
+        memory and written out in bulk when the buffer is full, at
+        checkpoints, and on close. Optionally the writes are done by a
+        background thread, so that formatting and disk I/O overlap.
+    Attributes:
+        file: the underlying text stream
+        mode: the mode of the underlying stream
+        name: the name of the underlying stream
+        size: buffer size in characters
+        buf: list of pending strings
+        n: number of characters pending
+        q: queue.Queue of chunks for the writer thread, or None
+        thread: the writer thread, or None
+        err: exception raised in the writer thread, or None
+    """
+    def __init__(self, file, size = 1 << 20, threaded = False):
+        self.file = file
+        self.mode = getattr(file, 'mode', 'w')
+        self.name = getattr(file, 'name', '')
+        self.size = size
+        self.buf = []
+        self.n = 0
+        self.err = None
+        if threaded:
+            self.q = queue.Queue(4)
+            self.thread = threading.Thread(target = self.run, daemon = True)
+            self.thread.start()
+        else:
+            self.q = None
+            self.thread = None
+            
+    def __str__(self):
+        return self.file.__str__()
+            
+    def run(self):
+        """ Body of the writer thread: write chunks as they are queued.
+            None ends the thread.
+        Returns:
+            no value returned.
+        """
+        while True:
+            chunk = self.q.get()
+            try:
+                if chunk is None:
+                    return
+                elif self.err is None:
+                    self.file.write(chunk)
+                else:
+                    pass
+            except Exception as err:
+                self.err = err
+            finally:
+                self.q.task_done()
+                
+    def write(self, s):
+        """ Add a string to the buffer.
+        Arg:
+            s: string.
+        Returns:
+            no value returned.
+        Effect:
+            the buffer is flushed if it has reached its size.
+        """
+        self.buf.append(s)
+        self.n += len(s)
+        if self.n >= self.size:
+            self.flush()
+        else:
+            pass
+        
+    def writelines(self, l):
+        """ Add a sequence of strings to the buffer.
+        Arg:
+            l: iterable of strings.
+        Returns:
+            no value returned.
+        """
+        for s in l:
+            self.write(s)
+            
+    def flush(self):
+        """ Pass pending strings to the underlying stream as one chunk.
+        Returns:
+            no value returned.
+        Raises:
+            any exception raised earlier in the writer thread.
+        """
+        if self.err is None:
+            pass
+        else:
+            raise self.err
+        if self.buf:
+            chunk = ''.join(self.buf)
+            self.buf = []
+            self.n = 0
+            if self.q is None:
+                self.file.write(chunk)
+            else:
+                self.q.put(chunk)
+        else:
+            pass
+        
+    def checkpoint(self):
+        """ Flush the buffer, wait for the writer thread to catch up, and
+            flush the underlying stream, so that everything written so far
+            is on disk.
+        Returns:
+            no value returned.
+        """
+        self.flush()
+        if self.q is None:
+            pass
+        else:
+            self.q.join()
+            if self.err is None:
+                pass
+            else:
+                raise self.err
+        self.file.flush()
+        
+    def close(self):
+        """ Flush, stop the writer thread and close the underlying stream.
+        Returns:
+            no value returned.
+        """
+        try:
+            self.flush()
+        finally:
+            if self.thread is None:
+                pass
+            else:
+                self.q.put(None)
+                self.thread.join()
+            self.file.close()
+        if self.err is None:
+            pass
+        else:
+            raise self.err
+
+        
+def writer(arg, size = 1 << 20, threaded = False, level = None):
+    """ Return a Writer on the file given by arg, or None if arg is None.
+    Args:
+        arg: the file argument given by the user; see output2().
+        size: buffer size in characters
+        threaded: whether to write through a background thread
+        level: compression level for compressed files.
+    Returns:
+        Writer or None.
+    """
+    f = output2(arg, level)
+    if f is None:
+        return None
+    else:
+        return Writer(f, size, threaded)
+    
 
 class Output2:
     """ Handles lazy computation of output strings for echoing and saving.
+        One instance serves a whole run: reset() points it at the next
+        analysis, and each string is rendered at most once per analysis
+        however many of echo and the sinks use it.
     Attributes:
-        an: morpheuslib.Analysis
+        an: morpheuslib.Analysis or None
         OUTPUT STREAMS:
-            prolog_file: file stream or None
-            json_file: file stream or None
-            oz_file: file stream or None
+            prolog_file: file stream, Writer or None
+            json_file: file stream, Writer or None
+            oz_file: file stream, Writer or None
         echo_arg: 'oz', 'prolog' or 'json'
         core_fs: core features to output (list of strings)
         word_fs: word features to output
@@ -50,17 +338,40 @@ class Output2:
     """
     def __init__(self, an, prolog_file, json_file, oz_file, echo_arg, core_fs,
                  word_fs):
-        self.an = an
         self.prolog_file = prolog_file
         self.json_file = json_file
         self.oz_file = oz_file
         self.echo_arg = echo_arg
         self.core_fs = core_fs
         self.word_fs = word_fs
+        self.reset(an)
+        
+    def reset(self, an):
+        """ Start output of another analysis.
+        Arg:
+            an: morpheuslib.Analysis or None
+        Returns:
+            no value returned.
+        Effect:
+            drops the strings rendered for the previous analysis.
+        """
+        self.an = an
         self.prolog_str = None
         self.json_str = None
         self.oz_str = None
-        self.exp = an.export(core_fs, word_fs)
+        if an is None:
+            self.exp = None
+        else:
+            self.exp = an.export(self.core_fs, self.word_fs)
+        
+    def proc_name(self):
+        """ The Prolog procedure name of the analysis, computed from the export
+            sextuple rather than from the analysis element.
+        Returns:
+            string.
+        """
+        return (self.an.pos() + '/'
+                + str(len(self.exp[1]) + len(self.exp[3]) + len(self.exp[5])))
         
     def prolog(self):
         """ Lazily compute and return the Prolog clause for the Analysis.
@@ -159,12 +470,11 @@ class Commenter:
         else:
             self.uq = None
             
-    def register(self, an, core_fs, word_fs):
-        """ Register the analysis' Prolog procedure name.
-        Args:
-            an: a morpheuslib.Analysis
-            core_fs: list of strings (core feature names)
-            word_fs:list of strings (word feature names).
+    def register_name(self, name):
+        """ Register a Prolog procedure name, as computed by 
+            Output2.proc_name().
+        Arg:
+            name: string.
         Returns:
             no value returned.
         Effect:
@@ -173,7 +483,7 @@ class Commenter:
         if self.prolog_file is None:
             pass
         else:
-            self.uq.test(an.prolog_proc_name(core_fs, word_fs))
+            self.uq.test(name)
             
     def top_comment(self, _input, label, core_fs, word_fs, dt, st):
         """ Write basic comment)s) about file contents to output file(s).
@@ -255,6 +565,168 @@ class Commenter:
             [self.prolog_file.write("%% :-dynamic " + n +  '.\n') for n in self.uq.set]
             self.prolog_file.write("%%\n")
             
+class SqliteSink:
+    """ Writes words and analyses to an SQLite database, in three tables:
+        tokens (one row per word processed), analyses (one row per analysis
+        saved, with the core features form, lemma, expandedForm, pos and 
+        lang as columns) and features (one row per other feature of an 
+        analysis). Rows are inserted in batches with executemany and 
+        committed at checkpoints and on close, in as few transactions as
+        possible. Indexes on lemma, pos, features and the joining columns 
+        are built by close(), after loading; when appending to a database
+        that already has them, they are dropped first and rebuilt.
+    Class attributes:
+        tables: CREATE TABLE statements
+        indexes: pairs of index name and what it indexes
+        columns: the core features stored in the analyses table.
+    Attributes:
+        db: sqlite3.Connection
+        name: database file name
+        mode: 'w' or 'a'
+        batch: number of pending rows at which they are inserted
+        tokens, analyses, features: lists of pending rows
+        next_token, next_analysis: ids for the next token and analysis.
+    """
+    tables = ["CREATE TABLE IF NOT EXISTS tokens (id INTEGER PRIMARY KEY, "
+              "label TEXT, word TEXT, lang TEXT, w INTEGER, c INTEGER, "
+              "s INTEGER)",
+              "CREATE TABLE IF NOT EXISTS analyses (id INTEGER PRIMARY KEY, "
+              "token INTEGER REFERENCES tokens(id), form TEXT, lemma TEXT, "
+              "expandedForm TEXT, pos TEXT, lang TEXT)",
+              "CREATE TABLE IF NOT EXISTS features (analysis INTEGER "
+              "REFERENCES analyses(id), name TEXT, value TEXT)"]
+    indexes = [('tokens_word', 'tokens(word)'),
+               ('tokens_w', 'tokens(label, w)'),
+               ('analyses_token', 'analyses(token)'),
+               ('analyses_lemma', 'analyses(lemma)'),
+               ('analyses_pos', 'analyses(pos)'),
+               ('features_analysis', 'features(analysis)'),
+               ('features_name_value', 'features(name, value)')]
+    columns = ['form', 'lemma', 'expandedForm', 'pos', 'lang']
+    
+    def __init__(self, arg, batch = 50000):
+        """
+        Args:
+            arg: the file argument given by the user. If it starts with '+',
+                the database is added to, otherwise it is replaced.
+            batch: number of pending rows at which they are inserted.
+        Raises:
+            sqlite3.Error if the database can't be opened.
+        """
+        if arg[0] == '+':
+            self.name = arg[1:]
+            self.mode = 'a'
+        else:
+            self.name = arg
+            self.mode = 'w'
+            if os.path.exists(self.name):
+                os.remove(self.name)
+            else:
+                pass
+        self.batch = batch
+        self.db = sqlite3.connect(self.name)
+        self.db.execute("PRAGMA synchronous = OFF")
+        for t in SqliteSink.tables:
+            self.db.execute(t)
+        for (n, _) in SqliteSink.indexes:
+            self.db.execute("DROP INDEX IF EXISTS " + n)
+        self.db.commit()
+        self.next_token = self.next_id('tokens')
+        self.next_analysis = self.next_id('analyses')
+        self.tokens = []
+        self.analyses = []
+        self.features = []
+        
+    def __str__(self):
+        return "<SqliteSink name='" + self.name + "' mode='" + self.mode + "'>"
+    
+    def next_id(self, table):
+        """ The id following the highest in a table.
+        Arg:
+            table: 'tokens' or 'analyses'.
+        Returns:
+            integer.
+        """
+        m = self.db.execute("SELECT MAX(id) FROM " + table).fetchone()[0]
+        if m is None:
+            return 0
+        else:
+            return m + 1
+        
+    def add_word(self, w):
+        """ Add a token.
+        Arg:
+            w: morpheuslib.Word.
+        Returns:
+            the token's id (integer).
+        """
+        t = self.next_token
+        self.next_token += 1
+        self.tokens.append((t, w.label, w.word, w.lang, w.w, w.c, w.s))
+        return t
+    
+    def add_analysis(self, t, an):
+        """ Add an analysis of a token.
+        Args:
+            t: the token's id, as returned by add_word()
+            an: morpheuslib.Analysis.
+        Returns:
+            no value returned.
+        Effect:
+            the pending rows are inserted if there are enough of them.
+        """
+        a = self.next_analysis
+        self.next_analysis += 1
+        d = {}
+        for x in an.elem:
+            if x.tag in SqliteSink.columns:
+                d[x.tag] = x.text
+            else:
+                self.features.append((a, x.tag, x.text))
+        self.analyses.append((a, t) + tuple(d.get(c) 
+                                            for c in SqliteSink.columns))
+        if len(self.features) + len(self.analyses) >= self.batch:
+            self.flush()
+        else:
+            pass
+        
+    def flush(self):
+        """ Insert the pending rows, in the current transaction.
+        Returns:
+            no value returned.
+        """
+        self.db.executemany("INSERT INTO tokens VALUES (?,?,?,?,?,?,?)",
+                            self.tokens)
+        self.db.executemany("INSERT INTO analyses VALUES (?,?,?,?,?,?,?)",
+                            self.analyses)
+        self.db.executemany("INSERT INTO features VALUES (?,?,?)",
+                            self.features)
+        self.tokens = []
+        self.analyses = []
+        self.features = []
+        
+    def checkpoint(self):
+        """ Insert the pending rows and commit.
+        Returns:
+            no value returned.
+        """
+        self.flush()
+        self.db.commit()
+        
+    def close(self):
+        """ Insert the pending rows, build the indexes, commit and close.
+        Returns:
+            no value returned.
+        """
+        try:
+            self.flush()
+            for (n, on) in SqliteSink.indexes:
+                self.db.execute("CREATE INDEX IF NOT EXISTS " + n + " ON " + on)
+            self.db.commit()
+        finally:
+            self.db.close()
+            
+            
 class Cache:
     """ A twofold cache of analyses: volatile and persistent.
         The user has lists of words to keep in te persistent cache. Others are
@@ -264,13 +736,28 @@ class Cache:
         lang: 'greek' or 'la'
         vola: dict, the volatile cache
         pers: dict, the persistent cache
+        hits: dict, lookups of each key over all runs (see adapt()); the
+            counts of keys in neither cache are halved on every save()
         init_msg: string: initial status of cachxe
+        RUNNING COUNTS (kept up to date by lookup() and cache()):
+            sizes: dict, total bytes of the values in 'pers' and 'vola'
+            empty_ct: persistent words with no value yet
+            hit_ct: lookups answered from the cache
+            miss_ct: lookups not answered from the cache
+            insert_ct: values added by cache()
     """    
     def __init__(self, lang):
         self.lang = lang
         self.cache_add = 'none'
         self.cache_read = 'none'
         self.vola = {}
+        # Try to open the lookup counts.
+        try:
+            f = open(lang + '.hits', "rb")
+            self.hits = pickle.load(f)
+            f.close()
+        except:
+            self.hits = {}
         # Try to open cachewords.
         try:
             g = open('cachewords.' + lang, 'r')
@@ -291,6 +778,7 @@ class Cache:
 
         if self.pers is None:
             if ls == []:
+                self.pers = {}
                 self.init_msg = 'no persistent cache or cachewords file'
             else:
                 self.pers = dict.fromkeys(ls)
@@ -298,9 +786,7 @@ class Cache:
         else:
             if ls == []:
                 # Write the exiting keys.
-                h = open('cachewords.' + lang, 'w')
-                h.write('\n'.join(self.pers.keys()))
-                h.close()
+                self.write_cachewords()
                 self.init_msg = 'cachewords restored from cache keys'
             else:
                 # Synchronize.
@@ -318,8 +804,109 @@ class Cache:
                         di[k] = self.pers[k]
                 self.pers = di
                 self.init_msg = 'cachewords and cache keys synchronized'
+
+        self.hit_ct = 0
+        self.miss_ct = 0
+        self.insert_ct = 0
+        self.recount()
             
         
+    def recount(self):
+        """ Recompute the sizes and the count of empty persistent entries.
+        Returns:
+            no value returned.
+        Effect:
+            sets sizes and empty_ct. Needed only after changes made other than
+            by cache().
+        """
+        self.sizes = {'pers': sum([len(v) for v in self.pers.values()
+                                   if v is not None]),
+                      'vola': sum([len(v) for v in self.vola.values()])}
+        self.empty_ct = sum([1 for v in self.pers.values() if v is None])
+
+    @staticmethod
+    def key(word):
+        """ The cache key of a word.
+        Arg:
+            word: morpheuslib.Word.
+        Returns:
+            the word, cleansed of diacritics if it is Beta Code Greek (string).
+        """
+        if word.lang == 'greek':
+            return morpheuslib.BetaCode.cleanse(word.word)
+        else:
+            return word.word
+
+    def write_cachewords(self):
+        """ Write the persistent cache keys to the cachewords file.
+        Returns:
+            no value returned.
+        Effect:
+            overwrites cachewords.la or cachewords.greek.
+        """
+        h = open('cachewords.' + self.lang, 'w')
+        h.write('\n'.join(self.pers.keys()))
+        h.close()
+
+    def warm(self, counts, words, top, budget, workers = 8):
+        """ Replace the persistent cache with the most frequent word types
+            of a corpus, fetching any that are not cached yet.
+            
+            Cached words are selected first, in order of frequency, skipping
+            any that do not fit the budget. If any of it is left, the missing
+            words are then fetched in one batch, and selected in the same way.
+        Args:
+            counts: collections.Counter of cache keys (see type_counts())
+            words: dict of cache key -> morpheuslib.Word, used for fetching
+            top: maximum number of word types to keep (integer)
+            budget: maximum total size of the cached documents in bytes
+                (integer), or None for no limit
+            workers: number of fetches made at the same time (integer, 
+                optional, default is 8).
+        Returns:
+            the keys of the new persistent cache in order of frequency (list of
+            strings).
+        Effect:
+            the persistent cache holds only the selected keys. Keys dropped
+            from it, and fetched documents that did not fit, are moved to the
+            volatile cache.
+        Raises:
+            urllib.error.HTTPError
+            urllib.error.URLError
+            Nothing is changed if a fetch fails.
+        """
+        ranked = [k for k, n in counts.most_common(top)]
+        di = {}
+        missing = []
+        total = 0
+        for k in ranked:
+            v = self.pers.get(k)
+            if v is None:
+                v = self.vola.get(k)
+            if v is None:
+                missing.append(k)
+            elif budget is None or total + len(v) <= budget:
+                total += len(v)
+                di[k] = v
+        if budget is not None and total >= budget:
+            missing = []
+        with concurrent.futures.ThreadPoolExecutor(max(workers, 1)) as ex:
+            fetched = list(ex.map(
+                lambda k: morpheuslib.MorpheusUrl(words[k]).fetch().text, 
+                missing))
+        for k, v in zip(missing, fetched):
+            if budget is None or total + len(v) <= budget:
+                total += len(v)
+                di[k] = v
+            else:
+                self.vola[k] = v
+        for k in self.pers:
+            if k not in di and self.pers[k] is not None:
+                self.vola[k] = self.pers[k]
+        self.pers = dict([(k, di[k]) for k in ranked if k in di])
+        self.recount()
+        return list(self.pers.keys())
+
     def persistent(self):
         """ Words in the persistent cache.
         Returns:
@@ -337,24 +924,24 @@ class Cache:
         Returns:
             morpheuslib.Analysis, or None if not found.
         """
-        # Word has to be cleansed of diacritics if beta code Greek.
-        if word.lang == 'greek':
-            w = morpheuslib.BetaCode.cleanse(word.word)
-        else:
-            w = word.word
-            
+        w = Cache.key(word)
+        self.hits[w] = self.hits.get(w, 0) + 1
         if w in self.pers:
             if self.pers[w] is None:
                 self.cach_read = 'none'
+                self.miss_ct += 1
                 return None
             else:
                 self.cache_read = 'persistent'
+                self.hit_ct += 1
                 return morpheuslib.Analyses(self.pers[w].decode('utf8'), word)
         elif w in self.vola:
             self.cache_read = 'volatile'
+            self.hit_ct += 1
             return morpheuslib.Analyses(self.vola[w].decode('utf8'), word)
         else:
             self.cache_read = 'none'
+            self.miss_ct += 1
             return None
         
     def cache(self, ans):
@@ -367,44 +954,97 @@ class Cache:
             adds the analysis text to the persistent cache if the word is in the
             user's persist list or to the volatile cache, otherwise.
         """
-        #Beta Code cleaning...
-        if ans.word.lang == 'greek':
-            w = morpheuslib.BetaCode.cleanse(ans.word.word)
-        else:
-            w = ans.word.word
-        
+        w = Cache.key(ans.word)
         if w in self.pers:
             self.cache_add = 'persistent'
+            old = self.pers[w]
+            if old is None:
+                self.empty_ct -= 1
+                old = b''
+            self.sizes['pers'] += len(ans.text) - len(old)
             self.pers[w] = ans.text
         else:
             self.cache_add = 'volatile'
+            old = self.vola.get(w, b'')
+            self.sizes['vola'] += len(ans.text) - len(old)
             self.vola[w] = ans.text
+        self.insert_ct += 1
+
+    def adapt(self, threshold, cap = None):
+        """ Promote often used words from the volatile to the persistent 
+            cache, and demote the least used ones if the persistent cache is 
+            over its size cap.
+        Args:
+            threshold: lookups (see hits) at which a word is promoted
+                (integer)
+            cap: maximum total size of the documents in the persistent cache
+                in bytes (integer), or None for no limit.
+        Returns:
+            a pair of lists of the keys promoted and demoted (strings).
+        Effect:
+            moves entries between the persistent and volatile caches. Call 
+            write_cachewords() to keep the new persistent set in later runs.
+        """
+        up = [k for k in self.vola if self.hits.get(k, 0) >= threshold]
+        for k in up:
+            self.pers[k] = self.vola.pop(k)
+        self.recount()
+        down = []
+        if cap is not None:
+            total = self.sizes['pers']
+            for k in sorted(self.pers, key = lambda k: self.hits.get(k, 0)):
+                if total <= cap:
+                    break
+                elif self.pers[k] is None:
+                    continue
+                v = self.pers.pop(k)
+                total -= len(v)
+                self.vola[k] = v
+                down.append(k)
+            self.recount()
+        return (up, down)
+
+    def decay_hits(self):
+        """ Halve the lookup counts of the keys in neither cache, dropping
+            those that reach zero, so that the counts do not grow without 
+            bound.
+        Returns:
+            no value returned.
+        """
+        for k in [k for k in self.hits 
+                  if k not in self.pers and k not in self.vola]:
+            n = self.hits[k] // 2
+            if n == 0:
+                del self.hits[k]
+            else:
+                self.hits[k] = n
 
     def save(self):
-        """ Save the persistent cache dict.
+        """ Save the persistent cache dict and the lookup counts.
         Eeturns:
             no value returned.
         Effect:
-            saves the pickled dict in la.cache or greek.cache.
+            saves the pickled dict in la.cache or greek.cache, and the lookup
+            counts, after decay_hits(), in la.hits or greek.hits.
         """    
         g = open(self.lang + '.cache', "bw")
         pickle.dump(self.pers, g)
         g.close()
+        self.decay_hits()
+        g = open(self.lang + '.hits', "bw")
+        pickle.dump(self.hits, g)
+        g.close()
         
     
     def size(self, cache):
-        """ Estimated size of the cache.
+        """ Total size of the cached values.
         Arg:
             cache: 'vola' or 'pers'.
         Returns:
-            integer.
+            integer (bytes), or -1 if there is no such cache.
         """
-        if cache == 'pers':
-                   
-            return len(pickle.dumps(self.pers))
-        elif cache == 'vola':
-                  
-            return len(pickle.dumps(self.vola))          
+        if cache in self.sizes:
+            return self.sizes[cache]
         else:
             return -1
         
@@ -413,25 +1053,34 @@ class Cache:
         Arg:
             cache: 'vola' or 'pers'.
         Returns:
-            string with size in words and (roughly) bytes.
+            string with size in words and bytes.
         """
         sz = self.size(cache)
         if cache == 'pers':
             s = "permanent cache status\n"
-            for k in self.pers.keys():
-                if self.pers[k] is None:
-                    s += (k + " no value yet\n")
-                else:
-                    s += (k + " value\n")
-            s += ("rough size of cache: " + str(sz) + '\n')     
+            s += (str(len(self.pers)) + " words, " + str(self.empty_ct)
+                  + " with no value yet\n")
+            s += ("size of cache values: " + str(sz) + '\n')     
             return s
         elif cache == 'vola':
-                  
-            s = 'words in volatile cache\n' + '\n'.join(self.vola.keys()) + '\n'
-            s +=     ("rough size of cache: " + str(sz) + '\n')
+            s = "volatile cache status\n"
+            s += (str(len(self.vola)) + " words\n")
+            s += ("size of cache values: " + str(sz) + '\n')
             return s          
         else:
             return 'no such cache'
+
+    def summary(self):
+        """ A one-line account of cache contents and use in this run.
+        Returns:
+            string.
+        """
+        return ("cache: " + str(len(self.pers)) + " persistent ("
+                + str(self.empty_ct) + " empty), " + str(len(self.vola))
+                + " volatile, " + str(self.sizes['pers'] + self.sizes['vola'])
+                + " bytes; " + str(self.hit_ct) + " hits, "
+                + str(self.miss_ct) + " misses, " + str(self.insert_ct)
+                + " inserts")
             
         
 def file_or_strio(s):
@@ -450,6 +1099,26 @@ def file_or_strio(s):
         return io.StringIO(s)
 
 
+def type_counts(ws):
+    """ Count the word types of a text by cache key.
+    Arg:
+        ws: morpheuslib.WordStream.
+    Returns:
+        a pair consisting of a collections.Counter of cache keys and a dict of
+        cache key -> first morpheuslib.Word found with the key.
+    Effect:
+        consumes the stream.
+    """
+    counts = collections.Counter()
+    words = {}
+    for w in ws:
+        k = Cache.key(w)
+        counts[k] += 1
+        if k not in words:
+            words[k] = w
+    return (counts, words)
+
+
 def log(w, f, msg):
     """ Log a message to a file
     Args:
@@ -484,6 +1153,8 @@ def main():
                         help = "file for Prolog output")
     parser.add_argument("--oz",
                         help = "file for Oz language record output")
+    parser.add_argument("--sqlite",
+                        help = "SQLite database file for output")
     parser.add_argument("--echo",
                         help = "echo feature:value pairs to output",
                         choices = ['basic', 'off', 'prolog', 'json', 'oz'])
@@ -493,6 +1164,19 @@ def main():
             help = 'optional file for logging words that returned no analyses.')
     parser.add_argument("--start", type = int,
             help = "zero-based ordinal of word to start at (default is zero)")
+    parser.add_argument("--promote", type = int,
+            help = "move words looked up at least this many times (over all runs) into the persistent cache")
+    parser.add_argument("--cap", type = int,
+            help = "with --promote, maximum size in bytes of the documents in the persistent cache; the least used are dropped")
+    parser.add_argument("--buffer", type = int, default = 1 << 20,
+            help = "output buffer size in characters for --json, --prolog and --oz (default 1048576)")
+    parser.add_argument("--threaded-output", action = "store_true",
+            help = "write --json, --prolog and --oz output through background threads")
+    parser.add_argument("--compress-level", type = int,
+            choices = range(0, 10), metavar = "{0..9}",
+            help = "compression level for output files ending in .gz, .xz, .zz or .zlib")
+    parser.add_argument("--checkpoint", type = int,
+            help = "flush all output to disk every CHECKPOINT words")
     args = parser.parse_args()
 
     t = file_or_strio(args.input)
@@ -553,14 +1237,16 @@ def main():
     print("Processing starts at word " + str(st))
 
     try:
-        file1 = output2(args.json)
+        file1 = writer(args.json, args.buffer, args.threaded_output,
+                       args.compress_level)
         print('json output to ' + file1.__str__()) 
     except IOError as err:
         print(err)
         exit()
 
     try:
-        file2 = output2(args.prolog)
+        file2 = writer(args.prolog, args.buffer, args.threaded_output,
+                       args.compress_level)
         print('Prolog output to ' + file2.__str__())
     except IOError as err:
         print(err)
@@ -574,11 +1260,22 @@ def main():
         exit()
 
     try:
-        file4 = output2(args.oz)
+        file4 = writer(args.oz, args.buffer, args.threaded_output,
+                       args.compress_level)
         print("Oz language record output to " + file4.__str__())
     except IOError as err:
         print(err)
         exit()
+
+    if args.sqlite is None:
+        sq = None
+    else:
+        try:
+            sq = SqliteSink(args.sqlite)
+            print("SQLite output to " + sq.__str__())
+        except sqlite3.Error as err:
+            print(err)
+            exit()
     
     morpheuslib.configure2()
     print("Using Morpheus service at " + morpheuslib.MorpheusUrl.base)
@@ -590,6 +1287,8 @@ def main():
     log(dt, file3, ' '.join(sys.argv))
     com = Commenter(file2, file1, file4)
     com.top_comment(args.input, lbl, c, wfs, dt, st)
+    o = Output2(None, file2, file1, file4, args.echo, c, wfs)
+    sinks = [f for f in (file1, file2, file4, sq) if f is not None]
 
     ca = Cache(args.lang)
     print (ca.init_msg)
@@ -624,6 +1323,10 @@ def main():
                     break
             
             
+            if sq is None:
+                pass
+            else:
+                tok = sq.add_word(w)
             ans_ct = ans.count()
             if ans_ct == 0:
                 print("NO ANALYSES RETURNED.")
@@ -642,11 +1345,17 @@ def main():
                             + ' < ' + an.lemma())
                     else:
                         pass
-                    com.register(an, c, wfs)
-                    
-                    o = Output2(an, file2, file1, file4, args.echo, c, wfs)
+                    o.reset(an)
+                    if file2 is None:
+                        pass
+                    else:
+                        com.register_name(o.proc_name())
                     o.echo()
                     o.save()
+                    if sq is None:
+                        pass
+                    else:
+                        sq.add_analysis(tok, an)
         
                    
                 if ans.retct == 0:
@@ -658,6 +1367,12 @@ def main():
                 else:    
                     print(str(ans.retct) + " analyses retained.")
                 retained_ct +=  ans.retct
+            if w.w % 100 == 0:
+                print(ca.summary())
+            if args.checkpoint and (w.w - st + 1) % args.checkpoint == 0:
+                [f.checkpoint() for f in sinks]
+            else:
+                pass
         
     log(datetime.datetime.now(), file3, 'OPERATIONS ENDED.')
     com.prolog_bottom()
@@ -681,9 +1396,22 @@ def main():
     else:
         file4.close()
         
+    if sq is None:
+        pass
+    else:
+        sq.close()
+        
     ws.close()
+    if args.promote:
+        up, down = ca.adapt(args.promote, args.cap)
+        print("Promoted to persistent cache: " + ' '.join(up))
+        print("Demoted from persistent cache: " + ' '.join(down))
+        ca.write_cachewords()
+    else:
+        pass
     print(ca.status_str('pers'))
     print(ca.status_str('vola'))      
+    print(ca.summary())
     ca.save()
     print("morpheus.py done.")
     if ws.i - st <= 0:
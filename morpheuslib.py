@@ -9,6 +9,7 @@ import urllib.error
 import json
 from xml.etree import ElementTree
 import io
+import collections
 import unicodedata
 
 def configure2():
@@ -294,7 +295,23 @@ class Word:
         self.w = w
         self.c = c
         self.s = s
+        self.check = None
         
+    def check_form(self):
+        """ The form of the word that analysis forms are checked against,
+            computed once. See Analysis.backcheck().
+        Returns:
+            string.
+        """
+        if self.check is None:
+            if self.lang == 'greek':
+                w = BetaCode.uncap(self.word)
+                w = BetaCode.fix_grave(w)
+                self.check = BetaCode.fix_2nd_acute(w)
+            else:
+                self.check = uncap(self.word)
+        return self.check
+
     def loc_str (self):
         """The word's position information in a comma separated string. """
         return (','.join([self.label.center(len(self.label) + 2, "'"),
@@ -445,8 +462,10 @@ class Converter:
         Greek to all lower case in Latin, no initial cap treatment.
     Class attribute:
         conv: a dict to do character by character conversion.     
+        memo: a dict of the words converted so far.
     """
     conv = None
+    memo = {}
     @classmethod
     def convert(cls,word):
         """ Convert word.
@@ -469,17 +488,26 @@ class Converter:
             cls.conv = str.maketrans(greek, gamma)
         else:
             pass
-        return (unicodedata.normalize('NFD', word)).translate(Converter.conv)
+        x = cls.memo.get(word)
+        if x is None:
+            x = (unicodedata.normalize('NFD', word)).translate(Converter.conv)
+            cls.memo[word] = x
+        return x
             
 class Analyses:
     """ A wrapper for the <analyses> XML document returned by Perseus.
         The wrapper supports iterating over the <analysis> elements it 
         contains.
+        The document is parsed incrementally, as the iteration proceeds, and
+        an element is dropped once it has been made into an Analysis.
     Attributes:
         text: (string) the <analyses> XML document
-        root: (ElementTree) the tree parsed from text
-        i: iteration count, used to trigger StopIteration
-        els: the list of analysis elements
+        root: (ElementTree) the root element parsed from text, without the
+            analysis elements; None until the whole document has been parsed
+        i: iteration count
+        n: the count of analysis elements parsed so far
+        els: the analysis elements parsed but not yet iterated over
+            (collections.deque)
         retct: the count of retained analyses
         uq: morpheuslib.Unique to ensure uniqueness
         non_ret: list of analyses that were not retained.
@@ -495,9 +523,11 @@ class Analyses:
             
         """
         self.text = text
-        self.root = ElementTree.fromstring(text)
+        self.root = None
         self.i = 0
-        self.els = self.root.findall('analysis')
+        self.n = 0
+        self.els = collections.deque()
+        self.pending = self.parse_elements()
         self.word = word
         self.retct = 0
         self.uq = Unique()
@@ -505,15 +535,66 @@ class Analyses:
     def __iter__(self):
         return self
 
-    def count(self):
+    def parse_elements(self, chunk = 8192):
+        """ Parse the document a chunk at a time.
+        Returns:
+            an iterator of the <analysis> elements, as they are completed.
+        Effect:
+            sets root when the document has been parsed. The elements are
+            removed from the tree after they are returned.
         """
+        parser = ElementTree.XMLPullParser(events = ('start', 'end'))
+        root = None
+        for j in range(0, len(self.text), chunk):
+            parser.feed(self.text[j:j + chunk])
+            for (ev, el) in parser.read_events():
+                if root is None:
+                    root = el
+                if ev == 'end' and el.tag == 'analysis':
+                    yield el
+                    Analyses.detach(root, el)
+        parser.close()
+        for (ev, el) in parser.read_events():
+            if ev == 'end' and el.tag == 'analysis':
+                yield el
+                Analyses.detach(root, el)
+        self.root = root
+
+    @staticmethod
+    def detach(root, el):
+        """ Remove an element from the root, if it is one of its children.
+            The earlier ones have been removed, so it is found at the front.
         Returns:
-            the number of analysis elements in the document (integer).
+            no value returned.
         """
-        return len(self.els)
+        try:
+            root.remove(el)
+        except ValueError:
+            pass
+
+    def more(self):
+        """ Parse the next analysis element.
+        Returns:
+            False if there are no more, otherwise True.
+        """
+        try:
+            self.els.append(next(self.pending))
+            self.n = self.n + 1
+            return True
+        except StopIteration:
+            return False
+
+    def count(self):
+        """ The number of analysis elements in the document. The rest of the
+            document is parsed, if need be; its elements are kept for the
+            iteration.
+        Returns:
+            integer.
+        """
+        while self.root is None and self.more():
+            pass
+        return self.n
 
-    
-    
     def retain(self, a):
         """ Should this analysis be retained?
         Args:
@@ -531,10 +612,10 @@ class Analyses:
         Returns:
             the next <analysis> element converted into an Analysis object.
         """  
-        if self.i >= self.count():
+        if len(self.els) == 0 and not self.more():
             raise StopIteration
         else:
-            a = Analysis(self.els[self.i], self.word)
+            a = Analysis(self.els.popleft(), self.word)
             self.i = self.i + 1
             if self.retain(a):
                 self.retct = self.retct + 1
@@ -867,19 +948,11 @@ class Analysis:
             boolean.
 
         """
-        w = self.word.word
         x = self.form()
         if self.word.lang == 'la':
-            w = uncap(w)
-            print(w + " =? " + x)
-            return w == x
+            return self.word.check_form() == x
         elif self.word.lang == 'greek':
-            x = Converter.convert(x)
-            w = BetaCode.uncap(w)
-            w = BetaCode.fix_grave(w)
-            w = BetaCode.fix_2nd_acute(w)
-            print(w + " =? " + x)
-            return x == w
+            return self.word.check_form() == Converter.convert(x)
         else:
             return False
         
@@ -887,19 +960,11 @@ class Analysis:
         """ A string representing the submitted and returned form match.
             Originally for debugging.
         """    
-        w = self.word.word
         x = self.form()
         if self.word.lang == 'la':
-            w = uncap(w)
-            
-            return w + " /= " + x
+            return self.word.check_form() + " /= " + x
         elif self.word.lang == 'greek':
-            x = Converter.convert(x)
-            w = BetaCode.uncap(w)
-            w = BetaCode.fix_grave(w)
-            w = BetaCode.fix_2nd_acute(w)
-            
-            return w + " /= " + x
+            return self.word.check_form() + " /= " + Converter.convert(x)
         else:
             return ''
     
@@ -31,6 +31,21 @@ import pickle
 import datetime
 import collections
 import sqlite3
+import mmap
+import os
+import struct
+import zlib
+import heapq
+import array
+import sys
+import bisect
+import itertools
+import functools
+import re
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 def read_dict(file):
     """Read a file of lines with key value pairs separated by whitespace into
@@ -170,6 +185,29 @@ def retry_all(urls, max_tries, cache = None):
         return (d, l, False)
 
 
+def prefer(old, new):
+    """Choose between two responses cached under the same key.
+
+    A successful response is preferred to an unsuccessful one; otherwise the
+    one fetched later is preferred.
+    Args:
+        old, new: MorpheusResponse or None.
+    Returns:
+        old or new. new if it is not possible to choose.
+    """
+    if old is None:
+        return new
+    elif new is None:
+        return old
+    elif old.is_ok() != new.is_ok():
+        return old if old.is_ok() else new
+    else:
+        to = getattr(old, 'fetched', None)
+        tn = getattr(new, 'fetched', None)
+        if to is not None and tn is not None and to > tn:
+            return old
+        else:
+            return new
     
 class LangError(ValueError):
     """An exception for unrecognized language options.
@@ -287,6 +325,7 @@ class BetaCode(object):
     beta = beta_ll + beta_lu + beta_diac
     uc_shift = '*'
     trans = None
+    tables = None
 
     @classmethod
     def get_trans(cls):
@@ -319,106 +358,89 @@ class BetaCode(object):
         return c in (cls.beta + cls.uc_shift)
         #return c in "abcdefghijklmnopqrstuwxyzABCDEFGHIJKLMNOPQRSTUWXYZ*/\=+)(|'"
     
+    @classmethod
+    def get_tables(cls):
+        """The translation tables used by to_unicode(), one for each value of
+        its lunate argument. Like the translator, but 's' and 'S' go to 
+        lower case medial or lunate sigma.
+        Returns:
+            dict of bool -> dict.
+        Effect:
+            sets the tables class attribute lazily.
+        """
+        if cls.tables is None:
+            tables = {}
+            for lunate in [False, True]:
+                t = dict(cls.get_trans())
+                sigma = UniGreek.lunate_sigma if lunate else UniGreek.sigma
+                t[ord('s')] = sigma
+                t[ord('S')] = sigma
+                tables[lunate] = t
+            cls.tables = tables
+        return cls.tables
+
     @classmethod
     def to_unicode(cls, s, lunate = False):
         """Convert BetaCode to Unicode. Output is in non-composed chatacters."
+        
+        An upper case letter is '*', then its diacritics, then the letter; 
+        in the output the diacritics follow the letter. A final sigma is 
+        made final. Conversions are remembered, see convert().
         Args:
             s: the string to convert.
             lunate: use the lunate sigma (optional, bool, default = False)?
         Returns:
             str.
         """
-        
-        
-        buf = io.StringIO(' ' * len(s))
-        i = 0
-        while i < len(s):
-            if s[i] == '*':
-                print("help")
-                i = cls.conv_uc(s, i, buf, lunate)
-            elif s[i].isalpha():
-                i = cls.conv_lc(s, i, buf, lunate)
-            else:
-                i = cls.conv_diac(s, i, buf)
-        o = buf.getvalue().rstrip()
-        buf.close()
-        
+        return cls.convert(s, lunate)
+
+    @staticmethod
+    @functools.lru_cache(maxsize = 65536)
+    def convert(s, lunate):
+        """to_unicode(), remembering the most recent conversions."""
+        cls = BetaCode
+        t = cls.get_tables()[lunate]
+        i = s.find('*')
+        if i < 0:
+            o = s.translate(t).rstrip()
+        else:
+            trans = cls.get_trans()
+            out = [s[:i].translate(t)]
+            while i >= 0:
+                # The diacritics run from after the '*' to the next letter.
+                j = i + 1
+                while not s[j].isalpha():
+                    j = j + 1
+                c = s[j]
+                if c == 's' or c == 'S':
+                    if lunate:
+                        out.append(UniGreek.lunate_sigma.upper())
+                    else:
+                        out.append(UniGreek.sigma.upper())
+                else:
+                    out.append(c.translate(trans).upper())
+                out.append(s[i + 1:j].rstrip().translate(trans))
+                i = s.find('*', j + 1)
+                out.append(s[j + 1:].translate(t) if i < 0 
+                           else s[j + 1:i].translate(t))
+            o = ''.join(out).rstrip()
+
         if o[-1] == UniGreek.sigma:
             return o[:-1] + UniGreek.final_sigma
         else: 
             return o
 
     @classmethod
-    def conv_uc(cls, s, i, buf, lunate):
-        """Helper method for to_unicode(). Performs conversion of uppercase
-        letters.
-        Args:
-            s: the string being converted
-            i: index of character being converted (int)
-            buf: buffer receiving conversion output (io.StringIO)
-            lunate: use lunate sigma (bool)?
-        Returns:
-            index of next character to convert (int).
-        """
-        # b receives diacritics.
-        b = io.StringIO('  ')
-        i = i + 1
-        c = s[i]
-        
-        while not c.isalpha():
-            b.write(c)
-            i = i + 1
-            c = s[i]
-        bb = b.getvalue().rstrip()
-        # c is now the letter.
-        if  c == 's' or c == 'S':
-            if lunate:
-                buf.write(UniGreek.lunate_sigma.upper())
-            else:
-                buf.write(UniGreek.sigma.upper()) 
-        else:
-            buf.write(c.translate(cls.get_trans()).upper())
-        for x in bb:
-            buf.write(x.translate(cls.get_trans()))
-        b.close()
-        return i + 1
-
-    @classmethod
-    def conv_lc(cls, s, i, buf, lunate):
-        """Helper method for to_unicode(). Performs translation of lower case
-        characters.
+    def convert_many(cls, ss, lunate = False):
+        """Convert a batch of strings. See to_unicode().
         Args:
-            s: the string being converted
-            i: index of character being converted (int)
-            buf: buffer receiving output (io.StringIO)
-            lunate: use lunate sigma (bool)?
+            ss: iterable of str
+            lunate: use the lunate sigma (optional, bool, default = False)?
         Returns:
-            index of next character to convert.
+            list of str.
         """
-        
-        if s[i] == 's' or s[i] == 'S':
-            if lunate:
-                buf.write(UniGreek.lunate_sigma)
-            else:
-                buf.write(UniGreek.sigma)
-        else:
-            print(s[i] + s[i].translate(cls.get_trans()))
-            buf.write(s[i].translate(cls.get_trans()))
-        return i + 1
+        return [cls.convert(s, lunate) for s in ss]
 
-    @classmethod   
-    def conv_diac(cls, s, i, buf):
-        """Helper method for to_unicode(). Performs translation of diacritics.
-        Args:
-            s: the string being converted
-            i: index of character being converted (int)
-            buf: buffer receiving output (io.StringIO).
-        Returns:
-            index of next character to convert.
-        """
-        buf.write(s[i].translate(cls.get_trans()))
-        return i + 1
-    
     @staticmethod
     def cleanse(s):
         """Remove diacritics from the word for use in a url.
@@ -477,6 +499,7 @@ class UniGreek(object):
     coronis = chr(0x1fbd)
 
     trans = None
+    tables = None
 
     @classmethod
     def make_trans(cls):
@@ -504,10 +527,52 @@ class UniGreek(object):
         else:
             return False
 
+    @classmethod
+    def get_tables(cls):
+        """The tables used by to_betacode() for text it can translate 
+        directly, built from the slow conversion of each character.
+
+        The characters are ASCII and the Greek and Greek Extended blocks, 
+        except those that decompose into a combining mark first.
+        Returns:
+            (dict of mode -> translation table, known-character deletion 
+            table, compiled regex matching an upper case character not 
+            followed by a letter).
+        Effect:
+            sets the tables class attribute lazily.
+        """
+        if cls.tables is None:
+            cs = [chr(i) for i in list(range(0x20, 0x7F)) + 
+                  list(range(0x370, 0x400)) + list(range(0x1F00, 0x2000))]
+            known = []
+            for c in cs:
+                d = unicodedata.normalize('NFD', c)
+                if unicodedata.category(c) == 'Cn' or \
+                   unicodedata.combining(d[0]) != 0 or \
+                   any([x.isalpha() for x in d[1:]]):
+                    continue
+                known.append((c, d))
+            modes = {}
+            for mode in ['upper', 'lower', 'preserve']:
+                # The trailing letter ends a capital's run of diacritics.
+                modes[mode] = str.maketrans(dict([
+                    (c, cls.to_betacode_slow(c + 'a', mode)[:-1]) 
+                    for (c, d) in known]))
+            delete = str.maketrans(dict([(c, None) for (c, d) in known]))
+            esc = lambda xs: ''.join(['\\' + x if x in '\\]^-[' else x 
+                                      for x in xs])
+            upper = esc([c for (c, d) in known if d[0].isupper()])
+            alpha = esc([c for (c, d) in known if d[0].isalpha()])
+            bad = re.compile('[' + upper + '](?![' + alpha + '])')
+            cls.tables = (modes, delete, bad)
+        return cls.tables
+
     @classmethod
     def to_betacode(cls, s, mode):
         
         """Translate a Unicode Greek string to BetaCode.
+
+        Conversions are remembered, see convert().
         Args:
             s: the string to translate
             mode: 'upper', 'lower', or 'preserve'. 'upper' produces old 
@@ -517,7 +582,39 @@ class UniGreek(object):
         Returns:
             str.
         """
-        
+        return cls.convert(s, mode)
+
+    @staticmethod
+    @functools.lru_cache(maxsize = 65536)
+    def convert(s, mode):
+        """to_betacode(), remembering the most recent conversions.
+
+        Most text is translated directly with a table. Text with characters
+        not in the table, with separate combining marks, or with a capital
+        not followed by a letter takes the slow path.
+        """
+        cls = UniGreek
+        (modes, delete, bad) = cls.get_tables()
+        if mode in modes and len(s.translate(delete)) == 0 and \
+           bad.search(s) is None:
+            return s.translate(modes[mode]).rstrip()
+        else:
+            return cls.to_betacode_slow(s, mode)
+
+    @classmethod
+    def to_betacode_many(cls, ss, mode):
+        """Translate a batch of strings. See to_betacode().
+        Args:
+            ss: iterable of str
+            mode: 'upper', 'lower', or 'preserve'.
+        Returns:
+            list of str.
+        """
+        return [cls.convert(s, mode) for s in ss]
+
+    @classmethod
+    def to_betacode_slow(cls, s, mode):
+        """to_betacode() a character at a time, after NFD normalization."""
         t = unicodedata.normalize('NFD', s)
         buf = io.StringIO(' ' * len(t))
         i = 0
@@ -833,6 +930,7 @@ class Word(object):
         w: word ordinal (int, zero-based)
         c: clause ordinal (int, zero-based)
         s: sentence ordinal (int, zero-based)
+        mform: the match form, once computed (str), see match_form().
         
     """
     #features = ['label', 'w', 'c', 's']
@@ -859,6 +957,7 @@ class Word(object):
         self.w = w
         self.c = c
         self.s = s
+        self.mform = None
         
     def same_w(self, other):
         """Are two words positionally the same?
@@ -883,6 +982,34 @@ class Word(object):
         """
         return (self.url_str(), self.lang)   
 
+    def match_form(self):
+        """The form that analyses of this Word must have to match it.
+
+        The word in Unicode, with its accents fixed as in dictionary_str(). 
+        Distinct spellings with the same url_str() share a Morpheus response,
+        but not always the same matched analyses. Computed once.
+        Returns:
+            str.
+        """
+        if self.mform is None:
+            if self.lang == 'greek':
+                if self.greek_mode == 'betacode':
+                    f = BetaCode.to_unicode(self.word)
+                else:
+                    f = self.word
+                self.mform = UniGreek.fix_2nd_acute(UniGreek.fix_grave(f))
+            else:
+                self.mform = self.word
+        return self.mform
+
+    def match_key(self):
+        """A key for a MatchIndex: words with the same match key have the same
+        matched analyses.
+        Returns:
+            (str, str) i.e. (match form, lang).
+        """
+        return (self.match_form(), self.lang)
+
     def prolog(self, greek_mode = None, betacode_mode = None, lunate = False):
         """A Prolog functor for this word.
         A greek word may be in Beta Code or Unicode, output can be either.
@@ -982,19 +1109,26 @@ class MorpheusUrl(object):
     
     
 
-    def fetch(self, cache = None):
+    def fetch(self, cache = None, dictionary = None):
         """Fetch the <analyses> XML document.
         Arg:
             cache: if given, this cache will be tried before the Morpheus
             service (Cache or DbCache). The result will be cached if it was 
             missing from the cache. 
+            dictionary: if given, this MorphDictionary is tried first, before
+            the cache.
         Returns:
-            an instance of MorpheusResponse.
+            an instance of MorpheusResponse (a DictResponse, if found in the
+            dictionary).
         Raises:
             urllib.error.HTTPError
             urllib.error.URLError
         """
-        
+        if dictionary is not None:
+            resp = dictionary.lookup_url(self)
+            if resp is not None:
+                return resp
+
         if cache is None:
             t = None
             try:
@@ -1022,18 +1156,68 @@ class MorpheusUrl(object):
                 return resp
                 
 
+    def fetch_list(self, word, cache = None, dictionary = None, 
+                   chunk = 65536):
+        """Fetch the analyses of a word, parsing the document as it arrives
+        from the Morpheus service rather than after it is read. 
+        Args:
+            word: the word looked up (Word)
+            cache, dictionary: as for fetch(). The response is cached if it 
+                was fetched.
+            chunk: bytes to read at a time (int, optional).
+        Returns:
+            a (MorpheusResponse, AnalysisList) pair. The list is empty if the
+            fetch failed.
+        Raises:
+            urllib.error.URLError
+        """
+        resp = None
+        if dictionary is not None:
+            resp = dictionary.lookup_url(self)
+        if resp is None and cache is not None:
+            resp = cache.lookup_key(self.key)
+            if resp is not None and not resp.is_ok():
+                resp = None
+        if resp is not None:
+            return (resp, resp.make_analysis_list(word))
+        bufs = []
+        try:
+            response = urllib.request.urlopen(self.url)
+            p = AnalysisParser(word)
+            ps = []
+            while True:
+                data = response.read(chunk)
+                if not data:
+                    break
+                bufs.append(data)
+                ps.extend(p.feed(data))
+            ps.extend(p.close())
+            al = AnalysisList(None, word, [a for (_, a) in ps if a is not None])
+            resp = MorpheusResponse(self, b''.join(bufs), None)
+        except urllib.error.HTTPError as ex2:
+            resp = MorpheusResponse(self, None, ResponseErrorInfo(ex2))
+            al = AnalysisList(None, word)
+        if cache is not None:
+            cache.cache(resp)
+        return (resp, al)
+
 class MorpheusResponse(object):
     """A wrapper for the result of submitting a MorpheusUrl, whether or not 
     successful.
     Attributes:
         url: a MorpheusUrl that was fetched
         text: the text returned, if successful (bytes)
-        exn: ResponseErrorInfo from the exception raised if unsuccessful.
+        exn: ResponseErrorInfo from the exception raised if unsuccessful
+        fetched: when the response was made (datetime). Missing from 
+            responses cached by older versions of this module.
+        matches: dict of match key -> positions of the matched analyses, 
+            filled in by matched_indices(). Not pickled.
     """
     def __init__(self, url, text, exn):
         self.url = url
         self.text = text
         self.exn = exn
+        self.fetched = datetime.datetime.now()
         
         
     def __str__(self):
@@ -1072,7 +1256,49 @@ class MorpheusResponse(object):
         Returns:
             AnalysisList
         """
-        return AnalysisList(self.text, word)
+        al = AnalysisList(self.text, word)
+        al.resp = self
+        al.positions = tuple(range(len(al)))
+        return al
+
+    def __getstate__(self):
+        d = dict(self.__dict__)
+        d.pop('matches', None)
+        return d
+
+    def matched_indices(self, word):
+        """Positions of the analyses that match a word, computed once for 
+        each match key (see Word.match_key()).
+        Arg:
+            word: Word.
+        Returns:
+            tuple of int, empty if the response is not OK.
+        """
+        if not self.is_ok():
+            return ()
+        memo = self.__dict__.setdefault('matches', {})
+        k = word.match_key()
+        ix = memo.get(k)
+        if ix is None:
+            ix = self.make_analysis_list(word).matched_indices()
+            memo[k] = ix
+        return ix
+
+    def matched_list(self, word):
+        """The analyses that match a word.
+        Arg:
+            word: Word.
+        Returns:
+            AnalysisList.
+        """
+        if not self.is_ok():
+            return AnalysisList(None, word)
+        al = self.make_analysis_list(word)
+        ix = self.matched_indices(word)
+        ml = AnalysisList(None, word, [al[i] for i in ix])
+        ml.resp = self
+        ml.positions = ix
+        return ml
 
     def save_text(self, file, mode):
         """Save the document text returned by Perseus in a text file. Text is
@@ -1092,22 +1318,71 @@ class MorpheusResponse(object):
         f.close() 
         return n
 
-class Analysis:
-    """ Wrapper for an <analysis> element.
+class DictResponse(MorpheusResponse):
+    """A response found in a MorphDictionary rather than fetched.
 
-        Does the work of fixing and converting the analysis element and provides
-        access to its attributes.
+    Its analyses are made from the dictionary's records, without parsing 
+    XML. The text attribute, for code that needs the document, is made 
+    from them on demand.
+    Attributes:
+        url: the MorpheusUrl looked up
+        records: the analyses, as tuples of Analysis.from_fields() arguments
+            other than the word
+        exn: always None
+        fetched: when the dictionary was compiled (datetime).
+    """
+    def __init__(self, url, records, fetched):
+        self.url = url
+        self.records = records
+        self.exn = None
+        self.fetched = fetched
+
+    def __str__(self):
+        return 'morpheuslib2.DictResponse for ' + str(self.url)
+
+    @property
+    def text(self):
+        return b'<?xml version="1.0" encoding="utf-8"?>\n<analyses>' + \
+               b''.join([Analysis.from_fields(*(r + (None,))).to_xml() 
+                         for r in self.records]) + b'</analyses>'
+
+    def make_analysis_list(self, word):
+        """Make an AnalysisList from the dictionary records.
+        Returns:
+            AnalysisList
+        """
+        al = AnalysisList(None, word, [Analysis.from_fields(*(r + (word,))) 
+                                       for r in self.records])
+        al.resp = self
+        al.positions = tuple(range(len(al)))
+        return al
+
+class Analysis(object):
+    """ An <analysis> element, parsed once into a compact record.
+
+        Does the work of fixing and converting the analysis and provides
+        access to its features. The features are kept as two tuples, tags and
+        values, in document order; the 'lang' attribute of <form> and the 
+        'sfx' attribute of <lemma> are kept apart. The key used for equality
+        and hashing is computed when the record is made or changed, not on 
+        each comparison.
 
         See the fix_ methods for more about fixes that can be applied.
 
         Methods in this class that modify the instance return self in those
         cases where chaining method calls would be natural. 
     Attributes:
-        
-        elem: (Element) the <analysis> element
-        word: (Word) the analysed word.
-        
+        tags: element tags, in document order (tuple of str)
+        values: element texts, None for empty elements (tuple of str)
+        lang: the lang attribute of <form> (str)
+        lemma_sfx: numerical suffix removed from the lemma, or None (str)
+        word: (Word) the analysed word
+        elem: (Element) an <analysis> element built from the record, on 
+            demand. Changing it does not change the record.
     """
+    __slots__ = ('tags', 'values', 'lang', 'lemma_sfx', 'word', 
+                 '_key', '_hash')
+
     # Core features are those not specific to a part of speech.
     # lemma_sfx is not original, but created by extracting a numerical suffix
     # from a lemma and making it an attrib of the lemma . This is an optional fix.
@@ -1116,31 +1391,76 @@ class Analysis:
                     'feature', 'lemma_sfx']
 
     def __init__ (self, elem, word):
-        """Initializes the analysis element and word.
-        
-        
+        """Parse the analysis element.
 
         Args:
             elem: (Element):the <analysis> element 
             word (Word): the word analyzed.
         """
-        
-        self.elem = elem
+        self.tags = tuple([e.tag for e in elem])
+        self.values = tuple([e.text for e in elem])
+        e = elem.find('form')
+        self.lang = None if e is None else e.attrib.get('lang')
+        e = elem.find('lemma')
+        self.lemma_sfx = None if e is None else e.attrib.get('sfx')
         self.word = word
+        self._rekey()
+
+    @classmethod
+    def from_fields(cls, tags, values, lang, lemma_sfx, word):
+        """Make an instance from its fields, without an element.
+        Args:
+            tags, values: tuples of str, the same length
+            lang: 'la' or 'greek'
+            lemma_sfx: str, or None
+            word: Word.
+        Returns:
+            Analysis.
+        """
+        a = cls.__new__(cls)
+        a.tags = tuple(tags)
+        a.values = tuple(values)
+        a.lang = lang
+        a.lemma_sfx = lemma_sfx
+        a.word = word
+        a._rekey()
+        return a
+
+    def copy(self, word = None):
+        """A copy of this analysis, sharing its (immutable) record. Fixing 
+        the copy does not change the original.
+        Arg:
+            word: the Word of the copy (optional, default is this analysis's).
+        Returns:
+            Analysis.
+        """
+        a = Analysis.__new__(Analysis)
+        a.tags = self.tags
+        a.values = self.values
+        a.lang = self.lang
+        a.lemma_sfx = self.lemma_sfx
+        a.word = self.word if word is None else word
+        a._key = self._key
+        a._hash = self._hash
+        return a
+
+    def _rekey(self):
+        """Recompute the key and hash after a change to the record."""
+        self._key = (self.lang, tuple(sorted(zip(self.tags, self.values),
+                                             key = lambda p: p[0])))
+        self._hash = hash(self._key)
+
+    def key(self):
+        """The canonical form of this analysis: its lang, and its (tag, value)
+        pairs sorted by tag. Equal analyses have equal keys. 
+        Returns:
+            (str, tuple of (str, str)).
+        """
+        return self._key
 
     def __eq__(self, other):
         if isinstance(other, Analysis):
-            if self.get_feature('lang') == other.get_feature('lang'):
-                r = self.raw_features()
-                if r == other.raw_features():
-                    for f in r:
-                        if self.get_feature(f) != other.get_feature(f):
-                            return False
-                    return True
-                else:
-                    return False
-            else:
-                return False
+            return self._hash == other._hash and self._key == other._key
         else:
             return False
 
@@ -1148,7 +1468,19 @@ class Analysis:
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(tuple([self.get_feature(f) for f in self.raw_features()]))
+        return self._hash
+
+    @property
+    def elem(self):
+        el = ElementTree.Element('analysis')
+        for (t, v) in zip(self.tags, self.values):
+            e = ElementTree.SubElement(el, t)
+            e.text = v
+            if t == 'form' and self.lang is not None:
+                e.set('lang', self.lang)
+            elif t == 'lemma' and self.lemma_sfx is not None:
+                e.set('sfx', self.lemma_sfx)
+        return el
 
     def get_feature(self, feature):
         """Return the feature of this analysis that is in the element named 
@@ -1161,24 +1493,24 @@ class Analysis:
             ValueError, if no such feature.
         """
         if feature == 'lang':
-            return self.elem.find('form').attrib.get('lang')
+            return self.lang
         elif feature == 'lemma_sfx':
-            return self.elem.find('lemma').attrib.get('sfx')
+            return self.lemma_sfx
         elif feature in Word.features:
             return getattr(self.word, feature)
         else:
-            e = self.elem.find(feature)
-            if e is None:
-                raise ValueError("No feature " + feature + " in " + self.raw_str())
-            else:
-                return e.text
+            try:
+                return self.values[self.tags.index(feature)]
+            except ValueError:
+                raise ValueError("No feature " + feature + " in " + 
+                                 self.raw_str())
 
     def fix_lemma(self):
         """Remove a numerical suffix from the lemma, if present.
         
         Effect:    
-            if the lemma has a suffix, the <lemma> element text is replaced and
-            a new element lemma_sfx is added with the removed suffix. 
+            if the lemma has a suffix, the lemma is replaced and the removed 
+            suffix becomes lemma_sfx.
         Returns:
             self.
         """
@@ -1186,19 +1518,14 @@ class Analysis:
         if len(sfx) == 0:
             pass
         else:
-            #el = ElementTree.Element('lemma_sfx')
-            #el.text = sfx
-            #self.elem.append(el)
-            el = self.elem.find('lemma')
-            el.text = lem
-            el.set('sfx', sfx)
-        #self.set_feature('lemma', lem)
+            self.lemma_sfx = sfx
+            self.set_feature('lemma', lem)
         return self
 
     def fix_part(self):
         """Fix the Latin present participle by supplying its missing voice.
         Effect:
-            a <voice> element with value 'act' is added to the analysis.
+            a voice feature with value 'act' is added to the analysis.
         Returns:
             self.
 
@@ -1206,9 +1533,7 @@ class Analysis:
         if (self.get_feature('pos') == 'part' and 
             self.get_feature('lang') == 'la'
             and self.get_feature('tense') == 'pres'):
-            el = ElementTree.Element('voice')
-            el.text = 'act'
-            self.elem.append(el)
+            self.add_feature('voice', 'act')
         else:
             pass
         return self
@@ -1217,7 +1542,7 @@ class Analysis:
         """Fix a pronoun by adding person information, so that verb agreement
            can be computed. Only Latin ones need this.
         Effect:
-            adds a <person> element to the analysis, if the pronoun is known.
+            adds a person feature to the analysis, if the pronoun is known.
         Returns:
             self.
         Raises:
@@ -1227,9 +1552,7 @@ class Analysis:
             self.get_feature('lang') == 'la':
             
             person = Latin.person(self.get_feature('lemma'))
-            el = ElementTree.Element('person')
-            el.text = person
-            self.elem.append(el)
+            self.add_feature('person', person)
         else:
             pass
         return self
@@ -1243,16 +1566,18 @@ class Analysis:
         Returns:
             self.
         Effect:
-            removes <mood> element from supine, infinitive and gerundive and 
-            tranfers its value to the <pos> element.
+            removes the mood from supine, infinitive and gerundive and 
+            tranfers its value to the pos feature.
         """
-        el = self.elem.find('mood')
-        if el == None:
+        if 'mood' not in self.tags:
             pass
         else:
-            if el.text == 'supine' or el.text == 'inf' or el.text == 'gerundive':
-                self.set_feature('pos', el.text)
-                self.elem.remove(el)
+            i = self.tags.index('mood')
+            v = self.values[i]
+            if v == 'supine' or v == 'inf' or v == 'gerundive':
+                self.tags = self.tags[:i] + self.tags[i + 1:]
+                self.values = self.values[:i] + self.values[i + 1:]
+                self.set_feature('pos', v)
             else: 
                 pass
         return self
@@ -1276,7 +1601,7 @@ class Analysis:
         Returns:
             self.
         Effect:
-            possbly modifies the form element.
+            possbly modifies the form.
         """
             
         if self.is_uc():
@@ -1293,21 +1618,22 @@ class Analysis:
         Returns:
             self.
         Effect:
-            sets the text of the element to the text argument.
+            replaces the value of the feature.
         Raises:
             ValueError if no such feature.
         """
-        el = self.elem.find(feature)
-        if el is None:
+        if feature not in self.tags:
             raise ValueError("No feature " + feature)
         else:
-            el.text = text
+            i = self.tags.index(feature)
+            self.values = self.values[:i] + (text,) + self.values[i + 1:]
+            self._rekey()
             return self
 
     def add_feature(self, feature, value):
-        el = ElementTree.Element(feature)
-        el.text = value
-        self.elem.append(el)
+        self.tags = self.tags + (feature,)
+        self.values = self.values + (value,)
+        self._rekey()
         return self
 
     def fix(self, *fixes):
@@ -1324,15 +1650,14 @@ class Analysis:
         Raises:
             AttributeError if no such fix exists.
         """
-        for fix in fixes:
-            getattr(self, 'fix_' + fix)()
+        FixPipeline.get(*fixes).apply(self)
             
     def inflectional_features(self):
         """Infections of the analysed word.  
         Returns:
             names of those features specific to the part of speech (list of str).
         """
-        return sorted([x.tag for x in self.elem if x.tag not in Analysis.core_features])
+        return sorted([t for t in self.tags if t not in Analysis.core_features])
 
     def to_xml(self):
         """The XML text for this analysis. Not identical to the original, if
@@ -1347,8 +1672,8 @@ class Analysis:
         Returns:
             str.
         """
-        return ' '.join([t.tag + ':' + t.text for t in self.elem
-                         if t.text is not None])
+        return ' '.join([t + ':' + v for (t, v) in zip(self.tags, self.values)
+                         if v is not None])
 
     def raw_features(self):
         """Tags in the xml document, sorted ascending.
@@ -1358,7 +1683,7 @@ class Analysis:
         Returns:
             list of str.
         """
-        return sorted([t.tag for t in self.elem])
+        return sorted(self.tags)
  
     def is_matched(self):
         """Does the form of the analysis match the word submitted?
@@ -1372,31 +1697,176 @@ class Analysis:
         Returns:
             bool.
         """
-        if self.word.lang == 'la':
-            f = self.word.word
-        elif self.word.lang == 'greek':
-            if self.word.greek_mode == 'betacode':
-                f = BetaCode.to_unicode(self.word.word)
-            else:
-                f = self.word.word        
-        #if check_case:
+        f = self.word.match_form()
         if unicodedata.category(f[0]) \
         != unicodedata.category(self.get_feature('lemma')[0]):
             return False
-        #if self.word.lang == 'la':
-            #f = self.word.lower()
-        if self.word.lang == 'greek':
-            #if self.word.greek_mode == 'betacode':
-                #f = BetaCode.to_unicode(self.word.word)
-            fg = UniGreek.fix_grave
-            f2a = UniGreek.fix_2nd_acute    
-            f = f2a(fg(f))            
-        else:
-            #f = self.lower()
-            pass
-            
         return f == self.get_feature('form')    
 
+class FixPipeline(object):
+    """A list of fixes (see Analysis.fix()), compiled once and applied in one
+    pass over an analysis record, with the results remembered per response.
+
+    Fixes depend only on an analysis, not on the word, so the fixed records 
+    of a cached response can be reused for every occurrence of the word: 
+    AnalysisList.fix() takes them from the memo when the list still holds
+    the unfixed analyses of a response. The memo is keyed by the response's
+    cache key and fetch time, and holds the memo_size responses most 
+    recently used.
+    Class attributes:
+        revision: bump when a fix changes; get() then compiles new pipelines,
+            with empty memos (int)
+        memo_size: number of responses kept in each pipeline's memo (int)
+        steps: dict of fix name -> step function
+        compiled: dict of (fix tuple, revision) -> FixPipeline, see get().
+    Attributes:
+        fixes: the fix names (tuple of str)
+        version: (fixes, revision)
+        memo: collections.OrderedDict of (cache key, fetched) -> tuple of 
+            records, least recently used first.
+    """
+    revision = 1
+    memo_size = 4096
+    compiled = {}
+
+    @staticmethod
+    def _value(tags, values, feature):
+        if feature in tags:
+            return values[tags.index(feature)]
+        raise ValueError("No feature " + feature)
+
+    @staticmethod
+    def _lemma(r):
+        (lem, sfx) = num_sfx(FixPipeline._value(r[0], r[1], 'lemma'))
+        if len(sfx) > 0:
+            r[1][r[0].index('lemma')] = lem
+            r[3] = sfx
+
+    @staticmethod
+    def _part(r):
+        v = FixPipeline._value
+        if v(r[0], r[1], 'pos') == 'part' and r[2] == 'la' and \
+           v(r[0], r[1], 'tense') == 'pres':
+            r[0].append('voice')
+            r[1].append('act')
+
+    @staticmethod
+    def _pron(r):
+        if FixPipeline._value(r[0], r[1], 'pos') == 'pron' and r[2] == 'la':
+            r[1].append(Latin.person(FixPipeline._value(r[0], r[1], 'lemma')))
+            r[0].append('person')
+
+    @staticmethod
+    def _mood(r):
+        if 'mood' in r[0]:
+            i = r[0].index('mood')
+            m = r[1][i]
+            if m == 'supine' or m == 'inf' or m == 'gerundive':
+                del r[0][i]
+                del r[1][i]
+                r[1][r[0].index('pos')] = m
+
+    @staticmethod
+    def _form(r):
+        v = FixPipeline._value
+        if unicodedata.category(v(r[0], r[1], 'lemma')[0]) == 'Lu':
+            r[1][r[0].index('form')] = v(r[0], r[1], 'form').title()
+
+    steps = {'lemma': _lemma.__func__, 'part': _part.__func__, 
+             'pron': _pron.__func__, 'mood': _mood.__func__, 
+             'form': _form.__func__}
+
+    def __init__(self, *fixes):
+        """
+        Arg:
+            fixes: names of fixes, as for Analysis.fix().
+        Raises:
+            AttributeError if no such fix exists.
+        """
+        self.fixes = tuple(fixes)
+        self.version = (self.fixes, FixPipeline.revision)
+        for f in fixes:
+            if f not in FixPipeline.steps:
+                raise AttributeError("No fix " + f)
+        self.run = [FixPipeline.steps[f] for f in fixes]
+        self.memo = collections.OrderedDict()
+
+    @classmethod
+    def get(cls, *fixes):
+        """The pipeline for a list of fixes, compiled when first asked for.
+        Returns:
+            FixPipeline.
+        """
+        k = (fixes, cls.revision)
+        p = cls.compiled.get(k)
+        if p is None:
+            p = cls(*fixes)
+            cls.compiled[k] = p
+        return p
+
+    def fix_record(self, tags, values, lang, lemma_sfx):
+        """Apply the fixes to an analysis record.
+        Returns:
+            the fixed (tags, values, lang, lemma_sfx) record.
+        """
+        r = [list(tags), list(values), lang, lemma_sfx]
+        for step in self.run:
+            step(r)
+        return (tuple(r[0]), tuple(r[1]), r[2], r[3])
+
+    def apply(self, analysis):
+        """Fix an analysis in place.
+        Returns:
+            the analysis.
+        """
+        (analysis.tags, analysis.values, analysis.lang, 
+         analysis.lemma_sfx) = self.fix_record(analysis.tags, analysis.values,
+                                               analysis.lang, 
+                                               analysis.lemma_sfx)
+        analysis._rekey()
+        return analysis
+
+    def records(self, resp):
+        """The fixed records of a response, from the memo if possible.
+        Arg:
+            resp: MorpheusResponse.
+        Returns:
+            tuple of (tags, values, lang, lemma_sfx) records; empty if the 
+            response is not OK.
+        """
+        if not resp.is_ok():
+            return ()
+        k = (resp.key(), getattr(resp, 'fetched', None))
+        recs = self.memo.get(k)
+        if recs is None:
+            recs = tuple([self.fix_record(a.tags, a.values, a.lang, 
+                                          a.lemma_sfx)
+                          for a in resp.make_analysis_list(None)])
+            self.memo[k] = recs
+            if len(self.memo) > FixPipeline.memo_size:
+                self.memo.popitem(last = False)
+        else:
+            self.memo.move_to_end(k)
+        return recs
+
+    def analysis_list(self, resp, word, positions = None):
+        """The fixed analyses of a response.
+        Args:
+            resp: MorpheusResponse
+            word: the analysed word (Word)
+            positions: the positions of the analyses wanted, e.g. from 
+                MorpheusResponse.matched_indices() (tuple of int, optional, 
+                default is all of them).
+        Returns:
+            AnalysisList.
+        """
+        recs = self.records(resp)
+        if positions is not None:
+            recs = [recs[i] for i in positions]
+        return AnalysisList(None, word, 
+                            [Analysis.from_fields(*(r + (word,))) 
+                             for r in recs])
+
 class AnalysisList:
     """ Provides multiple-pass processing of analyses.
     Attributes:
@@ -1404,6 +1874,12 @@ class AnalysisList:
         root: root of the <analyses> document
         text: raw document text (bytes)
         l: the list of Analysis objects
+        resp: the MorpheusResponse whose unfixed analyses l holds, or None.
+            Set by MorpheusResponse.make_analysis_list() and matched_list(),
+            kept by discard_unmatched(), and cleared by the other methods 
+            that change the list or its analyses.
+        positions: the positions in resp of the analyses in l (tuple of 
+            int), or None.
   
     """
     def __init__(self, text, word, list = None):
@@ -1421,6 +1897,8 @@ class AnalysisList:
         AnalysisList(None, word, list).
         """
         self.word = word
+        self.resp = None
+        self.positions = None
         if text is not None:
             els = ElementTree.fromstring(text).findall('analysis')
             self.l = [Analysis(el, word) for el in els]
@@ -1430,6 +1908,20 @@ class AnalysisList:
             else:
                 self.l = list
 
+    @classmethod
+    def from_stream(cls, stream, word, chunk = 65536):
+        """Make an instance by parsing a document from a stream as it is 
+        read, e.g. from an HTTP response. See AnalysisParser.
+        Args:
+            stream: binary file-like object
+            word: the analyzed word (morpheuslib2.Word)
+            chunk: bytes to read at a time (int, optional).
+        Returns:
+            AnalysisList.
+        """
+        return cls(None, word, 
+                   list(AnalysisParser.iter_analyses(stream, word, chunk)))
+
     def __getitem__(self, i):
         return self.l[i]
     
@@ -1500,6 +1992,7 @@ class AnalysisList:
             self.
         """
         self.l = self.filter(**terms)
+        self.resp = None
         return self
     
 
@@ -1512,6 +2005,7 @@ class AnalysisList:
             self.
         """   
         self.l =  list(set(self))
+        self.resp = None
         return self
     
     def deduped(self):
@@ -1543,78 +2037,1907 @@ class AnalysisList:
         Returns:
             self.
         """
-        self.l = [a for a in self if a.is_matched()]
+        if self.resp is None:
+            self.l = [a for a in self if a.is_matched()]
+        else:
+            ps = [(i, a) for (i, a) in zip(self.positions, self) 
+                  if a.is_matched()]
+            self.positions = tuple([i for (i, _) in ps])
+            self.l = [a for (_, a) in ps]
         return self
       
     def fix(self, *fixes):
-        for a in self:
-            a.fix(*fixes)
+        """Apply fixes to all the analyses, see Analysis.fix(). If the list
+        holds the unfixed analyses of a response, the fixed analyses are made
+        from the records memoized by the FixPipeline instead.
+        Arg:
+            fixes: names of fixes.
+        Returns:
+            self.
+        """
+        p = FixPipeline.get(*fixes)
+        if self.resp is not None and len(self.positions) == len(self.l):
+            self.l = p.analysis_list(self.resp, self.word, self.positions).l
+        else:
+            for a in self:
+                p.apply(a)
+        self.resp = None
+        self.positions = None
         return self
     
     def get_feature(self, feature):
         return [a.get_feature(feature) for a in self]
-    
-class Cache:
-    """A simple cache for MorpheusResponses. 
 
-    Keys are pairs cnsisting of the url form of a word, and its language.
-    Words of both languages are stored in one cache.
-    This class is not designed for concurrent usage.
+    def matched_indices(self):
+        """Positions of the analyses whose form matches the submitted form.
+        Returns:
+            tuple of int.
+        """
+        return tuple([i for (i, a) in enumerate(self) if a.is_matched()])
+
+    def encoded(self, schema = None):
+        """The analyses in compact form.
+        Arg:
+            schema: FeatureSchema (optional, default is the shared one).
+        Returns:
+            list of EncodedAnalysis.
+        """
+        return [EncodedAnalysis(a, schema) for a in self]
+
+class AnalysisParser(object):
+    """An incremental parser for <analyses> documents.
 
+    Text is fed in chunks, as it arrives; each <analysis> element is made 
+    into an Analysis when it is complete, and then cleared, so the whole
+    tree is never held in memory. Any number of documents may follow one
+    another, as in a file of saved responses; each starts with an XML 
+    declaration.
     Attributes:
-        file : location of cache, new or existing (str)
-        pers: a dict of (str, str) -> MorpheusResponse mappings
-        status: a basic status message 'reopened_cache', 'new_cache', or 
-            'cache_changed'. The status is of the in-memory cache.
-        last_save: when changes made to in-memory dict of this instance were
-        last saved to disk, or None (datetime). 
+        word: the analysed word, given to each Analysis (Word)
+        doc: the number of the current document (int, zero-based)
+        parser: XMLPullParser of the current document, or None.
     """
+    decl = b'<?xml'
 
-    CommitReport = collections.namedtuple('CommitReport', ['will_be_deleted', 
-        'will_be_replaced', 'will_be_added'])
-
-    def __init__(self, file):
-        """
+    def __init__(self, word):
+        self.word = word
+        self.doc = -1
+        self.parser = None
+        self.held = b''
+
+    def _events(self):
+        """The (doc, Analysis or None) pairs completed so far in the current
+        document. None marks the end of a document."""
+        out = []
+        for (ev, el) in self.parser.read_events():
+            if el.tag == 'analysis':
+                out.append((self.doc, Analysis(el, self.word)))
+                el.clear()
+            elif el.tag == 'analyses':
+                out.append((self.doc, None))
+                el.clear()
+        return out
+
+    def _start(self):
+        self.doc = self.doc + 1
+        self.parser = ElementTree.XMLPullParser(events = ('end',))
+
+    def feed(self, data):
+        """Parse a chunk of text.
         Arg:
-            file: file name with (for non-relative location) or without (for 
-                location in same directory) path.
+            data: bytes.
+        Returns:
+            list of (document number, Analysis) pairs, for the analyses 
+            completed; a pair (document number, None) marks the end of a 
+            document.
         """
-        f = None
-        try:
-            f = open(file, 'rb')
-            self.last_save, self.pers = pickle.load(f)
-            self.status = 'reopened cache'
-        except IOError:
-            f = open(file, 'wb')
-            pickle.dump((datetime.datetime.now(), {}), f)
-            self.pers = {}
-            self.status = 'new cache'
-            self.last_save = None
-        except Exception as exn:    
-            self.pers = {}
-            self.status = 'corrupted cache'
-            self.load_exn = exn
-            self.last_save = None 
-        finally:
-            f.close()
-            self.file = file
-
-    def __str__(self):
-        return "morpheuslib2.Cache at " + self.file
-
-    def __getitem__(self, key):
+        data = self.held + data
+        # Hold back a tail that may be the start of a declaration.
+        self.held = b''
+        for j in range(len(AnalysisParser.decl) - 1, 0, -1):
+            if data.endswith(AnalysisParser.decl[:j]):
+                self.held = data[-j:]
+                data = data[:-j]
+                break
+        out = []
+        while len(data) > 0:
+            if data.startswith(AnalysisParser.decl):
+                out.extend(self.close_doc())
+                self._start()
+                i = data.find(AnalysisParser.decl, 1)
+            else:
+                i = data.find(AnalysisParser.decl)
+                if self.parser is None:
+                    if i > 0 and len(data[:i].strip()) == 0:
+                        data = data[i:]
+                        continue
+                    else:
+                        self._start()
+            seg = data if i < 0 else data[:i]
+            self.parser.feed(seg)
+            out.extend(self._events())
+            data = b'' if i < 0 else data[i:]
+        return out
+
+    def close_doc(self):
+        """Finish the current document.
+        Returns:
+            list of (document number, Analysis) pairs, as feed().
         """
-        Arg:
-            a pair consisting of the url form of the word
-            and the language of the word (str, str).
-        Raises:
-            KeyError if the key is not in the cache.
+        out = []
+        if self.parser is not None:
+            self.parser.close()
+            out = self._events()
+            self.parser = None
+        return out
+
+    def close(self):
+        """Finish parsing, including any text held back.
+        Returns:
+            list of (document number, Analysis) pairs, as feed().
         """
-        return self.pers[key]    
+        out = []
+        if len(self.held) > 0:
+            held = self.held
+            self.held = b''
+            if self.parser is None:
+                self._start()
+            self.parser.feed(held)
+            out = self._events()
+        return out + self.close_doc()
 
-    def cache(self, resp):
-        """Cache a Morpheus response under  pair consisting of the url form 
-            of the word and the language.
+    @staticmethod
+    def iter_pairs(stream, word, chunk = 65536):
+        """Parse a stream of documents.
+        Args:
+            stream: a binary file-like object, e.g. an HTTP response
+            word: the analysed word (Word)
+            chunk: bytes to read at a time (int, optional).
+        Returns:
+            iterator of (document number, Analysis) pairs, as feed().
+        """
+        p = AnalysisParser(word)
+        while True:
+            data = stream.read(chunk)
+            if not data:
+                break
+            for x in p.feed(data):
+                yield x
+        for x in p.close():
+            yield x
+
+    @staticmethod
+    def iter_analyses(stream, word, chunk = 65536):
+        """The analyses in a stream of documents, as they are parsed.
+        Returns:
+            iterator of Analysis.
+        """
+        for (_, a) in AnalysisParser.iter_pairs(stream, word, chunk):
+            if a is not None:
+                yield a
+
+    @staticmethod
+    def iter_documents(stream, word, chunk = 65536):
+        """The documents in a stream, each as an AnalysisList.
+        Returns:
+            iterator of AnalysisList.
+        """
+        l = []
+        for (_, a) in AnalysisParser.iter_pairs(stream, word, chunk):
+            if a is None:
+                yield AnalysisList(None, word, l)
+                l = []
+            else:
+                l.append(a)
+
+class FeatureSchema(object):
+    """A registry of small integer codes for feature names and values.
+
+    Morphological features (pos, case, gender, number, tense, mood, voice, 
+    dialect and so on) take their values from a small vocabulary. A schema
+    gives each feature name, and each value of each feature, a code, assigned
+    in the order they are first seen. Value code 0 stands for no value (an 
+    empty element). The open-ended features, form, lemma and expandedForm, 
+    are not coded; their strings are interned instead.
+
+    Codes are only meaningful with the schema that made them: pickle the
+    schema with the encoded data.
+    Attributes:
+        names: feature names, indexed by code (list of str)
+        name_codes: dict of feature name -> code
+        values: for each feature code, its values indexed by code (list of
+            list of str)
+        value_codes: for each feature code, dict of value -> code (list of 
+            dict).
+    """
+    # Features stored as interned strings, not codes.
+    text_features = ('form', 'lemma', 'expandedForm')
+    shared = None
+
+    def __init__(self):
+        self.names = []
+        self.name_codes = {}
+        self.values = []
+        self.value_codes = []
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def get_shared(cls):
+        """The schema shared by default by all EncodedAnalysis instances and 
+        AnalysisTables in this process (FeatureSchema)."""
+        if cls.shared is None:
+            cls.shared = cls()
+        return cls.shared
+
+    def name_code(self, name):
+        """The code of a feature name, assigned if new.
+        Arg:
+            name: str.
+        Returns:
+            int.
+        """
+        c = self.name_codes.get(name)
+        if c is None:
+            c = len(self.names)
+            self.names.append(name)
+            self.name_codes[name] = c
+            self.values.append([None])
+            self.value_codes.append({None: 0})
+        return c
+
+    def value_code(self, name, value):
+        """The code of a value of a feature, assigned if new.
+        Args:
+            name: feature name, or its code (str or int)
+            value: str, or None.
+        Returns:
+            int.
+        """
+        f = name if isinstance(name, int) else self.name_code(name)
+        vc = self.value_codes[f]
+        c = vc.get(value)
+        if c is None:
+            c = len(self.values[f])
+            self.values[f].append(value)
+            vc[value] = c
+        return c
+
+    def find_code(self, name, value):
+        """The code of a value of a feature, without assigning one.
+        Returns:
+            int, or None if the name or value has no code.
+        """
+        f = self.name_codes.get(name)
+        if f is None:
+            return None
+        else:
+            return self.value_codes[f].get(value)
+
+    def value(self, name, code):
+        """The value for a code.
+        Args:
+            name: feature name, or its code (str or int)
+            code: int.
+        Returns:
+            str, or None.
+        """
+        f = name if isinstance(name, int) else self.name_codes[name]
+        return self.values[f][code]
+
+    def encode(self, analysis, check = False):
+        """Encode an Analysis.
+        Args:
+            analysis: Analysis
+            check: decode the result and compare it with analysis (bool, 
+                optional, default is False).
+        Returns:
+            EncodedAnalysis.
+        Raises:
+            ValueError, if check is True and the encoded analysis does not
+            decode to one equal to analysis.
+        """
+        e = EncodedAnalysis(analysis, self)
+        if check and e.decode() != analysis:
+            raise ValueError("Analysis does not survive encoding: " 
+                             + str(analysis.key()))
+        return e
+
+class EncodedAnalysis(object):
+    """A compact, read-only form of an Analysis.
+
+    Its coded features are kept as an array of unsigned shorts, (feature code,
+    value code) pairs sorted by feature code, stored as bytes. Two encoded 
+    analyses made with the same schema are equal when their strings and code 
+    bytes are.
+    Attributes:
+        schema: the FeatureSchema of the codes
+        codes: (feature code, value code) pairs as array('H') bytes
+        form, lemma, expandedForm: interned str, or None
+        text: which of form, lemma and expandedForm the analysis has, as
+            bits in the order of FeatureSchema.text_features (int); an 
+            empty element is present with the value None
+        lang: 'la' or 'greek'
+        lemma_sfx: str, or None
+        word: the analysed word (Word).
+    """
+    __slots__ = ('schema', 'codes', 'form', 'lemma', 'expandedForm', 'text',
+                 'lang', 'lemma_sfx', 'word', '_hash')
+
+    def __init__(self, analysis, schema = None):
+        """
+        Args:
+            analysis: Analysis
+            schema: FeatureSchema (optional, default is the shared one).
+        """
+        self.schema = FeatureSchema.get_shared() if schema is None else schema
+        self.form = self.lemma = self.expandedForm = None
+        self.text = 0
+        pairs = []
+        for (t, v) in zip(analysis.tags, analysis.values):
+            if t in FeatureSchema.text_features:
+                setattr(self, t, None if v is None else sys.intern(v))
+                self.text |= 1 << FeatureSchema.text_features.index(t)
+            else:
+                f = self.schema.name_code(t)
+                pairs.append((f, self.schema.value_code(f, v)))
+        pairs.sort()
+        self.codes = array.array('H', [c for p in pairs for c in p]).tobytes()
+        self.lang = analysis.lang
+        self.lemma_sfx = analysis.lemma_sfx
+        self.word = analysis.word
+        self._hash = hash(self.key())
+
+    def key(self):
+        """The canonical form of this encoded analysis.
+        Returns:
+            tuple.
+        """
+        return (self.lang, self.text, self.form, self.lemma, 
+                self.expandedForm, self.codes)
+
+    def __eq__(self, other):
+        if isinstance(other, EncodedAnalysis):
+            return self._hash == other._hash and self.key() == other.key()
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return self._hash
+
+    def pairs(self):
+        """The coded features.
+        Returns:
+            list of (feature code, value code) pairs.
+        """
+        a = array.array('H')
+        a.frombytes(self.codes)
+        return list(zip(a[0::2], a[1::2]))
+
+    def get_feature(self, feature):
+        """See Analysis.get_feature().
+        Raises:
+            ValueError, if no such feature.
+        """
+        if feature == 'lang':
+            return self.lang
+        elif feature == 'lemma_sfx':
+            return self.lemma_sfx
+        elif feature in FeatureSchema.text_features:
+            if self.text & 1 << FeatureSchema.text_features.index(feature):
+                return getattr(self, feature)
+            else:
+                raise ValueError("No feature " + feature)
+        elif feature in Word.features:
+            return getattr(self.word, feature)
+        else:
+            f = self.schema.name_codes.get(feature)
+            for (k, v) in self.pairs():
+                if k == f:
+                    return self.schema.value(f, v)
+            raise ValueError("No feature " + feature)
+
+    def decode(self):
+        """The Analysis this was encoded from. Tags other than form, lemma
+        and expandedForm come in the order of their codes.
+        Returns:
+            Analysis.
+        """
+        tags = []
+        values = []
+        for (i, t) in enumerate(FeatureSchema.text_features):
+            if self.text & 1 << i:
+                tags.append(t)
+                values.append(getattr(self, t))
+        for (f, v) in self.pairs():
+            tags.append(self.schema.names[f])
+            values.append(self.schema.value(f, v))
+        return Analysis.from_fields(tags, values, self.lang, self.lemma_sfx,
+                                    self.word)
+
+class StringPool(object):
+    """Interned strings, each stored once and referred to by its index. Index
+    0 stands for None.
+    Attributes:
+        strings: list of str, indexed by code
+        codes: dict of str -> code.
+    """
+    def __init__(self):
+        self.strings = [None]
+        self.codes = {None: 0}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def add(self, s):
+        """The code of a string, added to the pool if new.
+        Returns:
+            int.
+        """
+        c = self.codes.get(s)
+        if c is None:
+            c = len(self.strings)
+            self.strings.append(sys.intern(s))
+            self.codes[s] = c
+        return c
+
+    def __getitem__(self, c):
+        return self.strings[c]
+
+class AnalysisTable(object):
+    """The analyses of a corpus, stored column-wise.
+
+    There is one row per analysis and one token per word. Rows are added 
+    token by token, so the rows of a token are contiguous. Strings (labels,
+    words, forms, lemmas) are kept once in a StringPool and the columns hold
+    their codes; features are coded with a FeatureSchema, one column per 
+    feature, with AnalysisTable.absent where a row lacks the feature.
+    Attributes:
+        schema: FeatureSchema
+        pool: StringPool
+        tok_label, tok_word, tok_lang, tok_mode: pool codes per token 
+            (array 'I')
+        tok_w, tok_c, tok_s: word, clause and sentence ordinals per token 
+            (array 'q')
+        tok_start: first row of each token, plus the row count at the end 
+            (array 'q')
+        token: token of each row (array 'I')
+        form, lemma, expandedForm, lang, lemma_sfx: pool codes per row 
+            (array 'I')
+        features: dict of feature code -> value codes per row (array 'H').
+    """
+    # Row columns holding pool codes; the first three are 
+    # FeatureSchema.text_features.
+    string_columns = ('form', 'lemma', 'expandedForm', 'lang', 'lemma_sfx')
+    # Feature column value for a row without the feature. (Code 0 is an
+    # empty element, which is not the same.)
+    absent = 0xFFFF
+
+    def __init__(self, schema = None):
+        """
+        Arg:
+            schema: FeatureSchema (optional, default is the shared one).
+        """
+        self.schema = FeatureSchema.get_shared() if schema is None else schema
+        self.pool = StringPool()
+        for c in ['tok_label', 'tok_word', 'tok_lang', 'tok_mode']:
+            setattr(self, c, array.array('I'))
+        for c in ['tok_w', 'tok_c', 'tok_s']:
+            setattr(self, c, array.array('q'))
+        self.tok_start = array.array('q', [0])
+        self.token = array.array('I')
+        for c in AnalysisTable.string_columns:
+            setattr(self, c, array.array('I'))
+        self.features = {}
+        self.index = None
+
+    def __len__(self):
+        return len(self.token)
+
+    def get_index(self):
+        """The bitmap index of this table, made when first needed 
+        (TableIndex)."""
+        if self.index is None:
+            self.index = TableIndex(self)
+        return self.index
+
+    def select(self, **terms):
+        """The rows whose analyses satisfy all the terms. Unlike 
+        AnalysisList.filter(), a row without a feature does not raise an 
+        error; it is not selected.
+        Arg:
+            **terms: feature=value clauses, see TableIndex.
+        Returns:
+            list of row numbers (int).
+        """
+        ix = self.get_index()
+        return ix.rows(ix.select(**terms))
+
+    def count(self, **terms):
+        """The number of rows whose analyses satisfy all the terms (int)."""
+        ix = self.get_index()
+        return ix.count(ix.select(**terms))
+
+    def __str__(self):
+        return "morpheuslib2.AnalysisTable of %d tokens, %d rows" % \
+            (self.n_tokens(), len(self))
+
+    def n_tokens(self):
+        """The number of tokens (int)."""
+        return len(self.tok_word)
+
+    def add_word(self, word):
+        """Add a token without analyses.
+        Arg:
+            word: Word.
+        Returns:
+            the token number (int).
+        """
+        p = self.pool.add
+        self.tok_label.append(p(word.label))
+        self.tok_word.append(p(word.word))
+        self.tok_lang.append(p(word.lang))
+        self.tok_mode.append(p(word.greek_mode))
+        self.tok_w.append(word.w)
+        self.tok_c.append(word.c)
+        self.tok_s.append(word.s)
+        self.tok_start.append(self.tok_start[-1])
+        return self.n_tokens() - 1
+
+    def add_analyses(self, word, analyses):
+        """Add a token and its analyses.
+        Args:
+            word: Word
+            analyses: iterable of Analysis, e.g. an AnalysisList.
+        Returns:
+            the token number (int).
+        """
+        t = self.add_word(word)
+        p = self.pool.add
+        n = len(self)
+        for a in analyses:
+            self.token.append(t)
+            seen = set()
+            for (k, v) in zip(a.tags, a.values):
+                if k in FeatureSchema.text_features:
+                    pass
+                else:
+                    f = self.schema.name_code(k)
+                    col = self.features.get(f)
+                    if col is None:
+                        col = array.array('H', [AnalysisTable.absent] * n)
+                        self.features[f] = col
+                    col.append(self.schema.value_code(f, v))
+                    seen.add(f)
+            for (f, col) in self.features.items():
+                if f not in seen:
+                    col.append(AnalysisTable.absent)
+            d = dict(zip(a.tags, a.values))
+            for c in FeatureSchema.text_features:
+                getattr(self, c).append(p(d.get(c)))
+            self.lang.append(p(a.lang))
+            self.lemma_sfx.append(p(a.lemma_sfx))
+            n = n + 1
+        self.tok_start[-1] = n
+        return t
+
+    def add_response(self, word, resp, matched = True, fixes = ()):
+        """Add a token and the analyses in its Morpheus response.
+        Args:
+            word: Word
+            resp: MorpheusResponse. If not OK, the token has no analyses.
+            matched: add only matched analyses (bool, optional, default is 
+                True)
+            fixes: names of fixes to apply, see Analysis.fix() (optional).
+        Returns:
+            the token number (int).
+        """
+        if not resp.is_ok():
+            return self.add_word(word)
+        ix = resp.matched_indices(word) if matched else None
+        al = FixPipeline.get(*fixes).analysis_list(resp, word, ix)
+        return self.add_analyses(word, al)
+
+    def word(self, t):
+        """The Word of a token.
+        Arg:
+            t: token number (int).
+        Returns:
+            Word.
+        """
+        s = self.pool
+        return Word(s[self.tok_label[t]], s[self.tok_word[t]], 
+                    s[self.tok_lang[t]], s[self.tok_mode[t]], 
+                    self.tok_w[t], self.tok_c[t], self.tok_s[t])
+
+    def rows(self, t):
+        """The rows of a token.
+        Returns:
+            range.
+        """
+        return range(self.tok_start[t], self.tok_start[t + 1])
+
+    def get(self, i, feature):
+        """The value of a feature in a row, as for Analysis.get_feature(). 
+        Features of the word (label, w, etc.) come from its token.
+        Args:
+            i: row number (int)
+            feature: str.
+        Returns:
+            str, or None if the row lacks the feature.
+        """
+        if feature in AnalysisTable.string_columns:
+            return self.pool[getattr(self, feature)[i]]
+        elif feature in Word.features:
+            return getattr(self.word(self.token[i]), feature)
+        else:
+            f = self.schema.name_codes.get(feature)
+            if f is None or f not in self.features:
+                return None
+            c = self.features[f][i]
+            if c == AnalysisTable.absent:
+                return None
+            else:
+                return self.schema.value(f, c)
+
+    def column(self, feature):
+        """The values of a feature in all rows.
+        Returns:
+            list of str (None where a row lacks the feature).
+        """
+        if feature in AnalysisTable.string_columns:
+            s = self.pool.strings
+            return [s[c] for c in getattr(self, feature)]
+        f = self.schema.name_codes.get(feature)
+        if f is None or f not in self.features:
+            return [None] * len(self)
+        vs = self.schema.values[f]
+        return [None if c == AnalysisTable.absent else vs[c] 
+                for c in self.features[f]]
+
+    def analysis(self, i, word = None):
+        """A row as an Analysis. Features other than form, lemma and 
+        expandedForm come in the order of their codes.
+        Args:
+            i: row number (int)
+            word: the row's Word, if already made (optional).
+        Returns:
+            Analysis.
+        """
+        s = self.pool.strings
+        tags = list(FeatureSchema.text_features)
+        values = [s[self.form[i]], s[self.lemma[i]], s[self.expandedForm[i]]]
+        for f in sorted(self.features):
+            c = self.features[f][i]
+            if c != AnalysisTable.absent:
+                tags.append(self.schema.names[f])
+                values.append(self.schema.values[f][c])
+        if word is None:
+            word = self.word(self.token[i])
+        return Analysis.from_fields(tags, values, s[self.lang[i]], 
+                                    s[self.lemma_sfx[i]], word)
+
+    def groups(self):
+        """Iterate over tokens with their rows.
+        Returns:
+            iterator of (token number, range of rows) pairs.
+        """
+        st = self.tok_start
+        for t in range(self.n_tokens()):
+            yield (t, range(st[t], st[t + 1]))
+
+    def by_token(self):
+        """Iterate over tokens with their analyses.
+        Returns:
+            iterator of (Word, AnalysisList) pairs.
+        """
+        for (t, rs) in self.groups():
+            w = self.word(t)
+            yield (w, AnalysisList(None, w, [self.analysis(i, w) for i in rs]))
+
+    def export(self, exporter, format = 'prolog', functor = '$pos', 
+               omit = []):
+        """Export the analyses of all tokens, in token order. Each token's
+        duplicate analyses are exported once, as by Exporter.set_analysis().
+        Args:
+            exporter: Exporter
+            format: 'prolog', 'json' or 'oz' (optional, default is 'prolog')
+            functor: for Prolog, see Exporter.prolog() (optional)
+            omit: features to omit (optional).
+        Returns:
+            iterator of str.
+        """
+        for (w, al) in self.by_token():
+            exporter.unique = set()
+            for a in al:
+                if exporter.set_analysis(a):
+                    if format == 'prolog':
+                        yield exporter.prolog(functor, omit)
+                    else:
+                        yield getattr(exporter, format)(omit)
+
+    def save_columns(self, file):
+        """Save the table as a column file, for reading with ColumnFile.
+        Arg:
+            file: location of the file (str).
+        Returns:
+            number of columns written (int).
+        """
+        cw = ColumnWriter(file)
+        try:
+            for c in ColumnFile.array_columns:
+                cw.add(c, getattr(self, c))
+            cw.add_strings('pool', self.pool.strings)
+            for f in sorted(self.features):
+                n = self.schema.names[f]
+                cw.add('feature.' + n, self.features[f])
+                cw.add_strings('values.' + n, self.schema.values[f])
+        except:
+            cw.abort()
+            raise
+        return cw.close()
+
+class ColumnWriter(object):
+    """Writes a column file for ColumnFile.
+
+    Layout: a header (magic, byte order, column count), then the columns
+    one after another. Each column is a record (name length, array type 
+    code, item size), the name, and the data length followed by the data, 
+    with the data starting on an 8-byte boundary so that it can be cast in
+    place. Lists of strings are stored as two columns, name.offsets (array 
+    'q', one more than the strings) and name.data (UTF-8 bytes). Only the
+    first string of a list may be None; it is stored as an empty string, 
+    and an empty first string is read back as None. Like SnapshotWriter, it
+    writes under a temporary name and moves the file into place on close().
+    Attributes:
+        file: the column file name (str)
+        n: number of columns written (int).
+    """
+    def __init__(self, file):
+        self.file = file
+        self.tmp = file + '.tmp'
+        self.f = open(self.tmp, 'wb')
+        self.f.write(struct.pack(ColumnFile.header_fmt, ColumnFile.magic, 
+                                 ColumnFile.byteorder, 0))
+        self.n = 0
+
+    def pad(self):
+        """Pad the file to an 8-byte boundary."""
+        self.f.write(b'\0' * (-self.f.tell() % 8))
+
+    def add(self, name, a):
+        """Add a column.
+        Args:
+            name: str
+            a: array.array.
+        """
+        nb = name.encode('utf-8')
+        self.f.write(struct.pack(ColumnFile.column_fmt, len(nb), 
+                                 a.typecode.encode('ascii'), a.itemsize))
+        self.f.write(nb)
+        self.pad()
+        b = a.tobytes()
+        self.f.write(struct.pack('<Q', len(b)))
+        self.f.write(b)
+        self.pad()
+        self.n = self.n + 1
+
+    def add_strings(self, name, l):
+        """Add a list of strings as two columns.
+        Args:
+            name: str
+            l: list of str, whose first element may be None.
+        """
+        data = bytearray()
+        offsets = array.array('q', [0])
+        for x in l:
+            if x is not None:
+                data += x.encode('utf-8')
+            offsets.append(len(data))
+        self.add(name + '.offsets', offsets)
+        self.add(name + '.data', array.array('B', data))
+
+    def abort(self):
+        """Close and remove the temporary file."""
+        self.f.close()
+        os.remove(self.tmp)
+
+    def close(self):
+        """Write the column count and move the file into place.
+        Returns:
+            number of columns written (int).
+        """
+        self.f.seek(0)
+        self.f.write(struct.pack(ColumnFile.header_fmt, ColumnFile.magic,
+                                 ColumnFile.byteorder, self.n))
+        self.f.close()
+        os.replace(self.tmp, self.file)
+        return self.n
+
+class ColumnFile(object):
+    """A memory-mapped column file, as saved by AnalysisTable.save_columns().
+
+    Columns are memoryviews cast to their array type directly on the mapping,
+    so opening the file reads only the column records, and the pages of a
+    column are read when it is used. The columns are those of AnalysisTable:
+    the token columns, the row columns, 'pool', the string pool, and for
+    each feature 'feature.' + name, its value codes, and 'values.' + name,
+    its values. The file can only be read on a machine of the byte order 
+    that wrote it.
+
+    close() releases the mapping; memoryviews obtained from the file must
+    not be used (or held, e.g. in a cast) after that.
+    Attributes:
+        file: location of the file (str)
+        columns: dict of column name -> memoryview
+        string_lists: dict of name -> list of str decoded by strings().
+    """
+    magic = b'MLCOLS01'
+    header_fmt = '<8sQQ'
+    column_fmt = '<IcB'
+    byteorder = 1 if sys.byteorder == 'little' else 0
+    # The array columns of an AnalysisTable.
+    array_columns = ('tok_label', 'tok_word', 'tok_lang', 'tok_mode', 
+                     'tok_w', 'tok_c', 'tok_s', 'tok_start', 'token', 
+                     'form', 'lemma', 'expandedForm', 'lang', 'lemma_sfx')
+
+    def __init__(self, file):
+        """
+        Arg:
+            file: location of the file (str).
+        Raises:
+            IOError if the file can't be read.
+            ValueError if the file is not a column file, or is of the other
+            byte order.
+        """
+        self.file = file
+        self.columns = {}
+        self.string_lists = {}
+        f = open(file, 'rb')
+        try:
+            self.mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        finally:
+            f.close()
+        try:
+            magic, order, n = struct.unpack_from(ColumnFile.header_fmt, 
+                                                 self.mm, 0)
+            if magic != ColumnFile.magic:
+                raise ValueError("Not a column file: " + file)
+            elif order != ColumnFile.byteorder:
+                raise ValueError("Column file of the other byte order: " 
+                                 + file)
+            self.view = memoryview(self.mm)
+            o = struct.calcsize(ColumnFile.header_fmt)
+            for i in range(n):
+                nl, tc, size = struct.unpack_from(ColumnFile.column_fmt, 
+                                                  self.mm, o)
+                o = o + struct.calcsize(ColumnFile.column_fmt)
+                name = bytes(self.mm[o:o + nl]).decode('utf-8')
+                o = o + nl
+                o = o + (-o % 8)
+                bl = struct.unpack_from('<Q', self.mm, o)[0]
+                o = o + 8
+                tc = tc.decode('ascii')
+                if array.array(tc).itemsize != size:
+                    raise ValueError("Column file of another item size for '"
+                                     + tc + "': " + file)
+                self.columns[name] = self.view[o:o + bl].cast(tc)
+                o = o + bl
+                o = o + (-o % 8)
+        except:
+            self.close()
+            raise
+
+    def __str__(self):
+        return "morpheuslib2.ColumnFile at " + self.file
+
+    def __getitem__(self, name):
+        """
+        Arg:
+            name: column name (str).
+        Returns:
+            memoryview.
+        Raises:
+            KeyError if there is no such column.
+        """
+        return self.columns[name]
+
+    def __len__(self):
+        """The number of rows (int)."""
+        return len(self.columns['token'])
+
+    def n_tokens(self):
+        """The number of tokens (int)."""
+        return len(self.columns['tok_word'])
+
+    def strings(self, name):
+        """A list of strings, decoded when first asked for.
+        Arg:
+            name: e.g. 'pool' or 'values.case'.
+        Returns:
+            list of str; the first element may be None.
+        """
+        l = self.string_lists.get(name)
+        if l is None:
+            offs = self.columns[name + '.offsets']
+            data = self.columns[name + '.data']
+            l = [bytes(data[offs[i]:offs[i + 1]]).decode('utf-8') 
+                 for i in range(len(offs) - 1)]
+            if l and l[0] == '':
+                l[0] = None
+            self.string_lists[name] = l
+        return l
+
+    def features(self):
+        """The names of the feature columns (list of str)."""
+        return [c[8:] for c in self.columns if c.startswith('feature.')]
+
+    def column(self, feature):
+        """The values of a feature in all rows, as AnalysisTable.column().
+        Returns:
+            list of str (None where a row lacks the feature).
+        """
+        if feature in AnalysisTable.string_columns:
+            s = self.strings('pool')
+            return [s[c] for c in self.columns[feature]]
+        elif 'feature.' + feature not in self.columns:
+            return [None] * len(self)
+        else:
+            vs = self.strings('values.' + feature)
+            return [None if c == AnalysisTable.absent else vs[c]
+                    for c in self.columns['feature.' + feature]]
+
+    def table(self, schema = None):
+        """Load the file into an AnalysisTable. Feature codes are translated
+        to those of the table's schema.
+        Arg:
+            schema: FeatureSchema (optional, default is the shared one).
+        Returns:
+            AnalysisTable.
+        """
+        t = AnalysisTable(schema)
+        for c in ColumnFile.array_columns:
+            setattr(t, c, array.array(getattr(t, c).typecode, 
+                                      self.columns[c]))
+        for x in self.strings('pool')[1:]:
+            t.pool.add(x)
+        for n in self.features():
+            f = t.schema.name_code(n)
+            tr = [t.schema.value_code(f, v) 
+                  for v in self.strings('values.' + n)]
+            t.features[f] = array.array('H', 
+                [AnalysisTable.absent if c == AnalysisTable.absent else tr[c]
+                 for c in self.columns['feature.' + n]])
+        return t
+
+    def close(self):
+        """Release the columns and the mapping."""
+        for v in self.columns.values():
+            v.release()
+        self.columns = {}
+        if getattr(self, 'view', None) is not None:
+            self.view.release()
+            self.view = None
+        self.mm.close()
+
+class TableIndex(object):
+    """Bitmap indexes over an AnalysisTable, for queries across a corpus.
+
+    A bitmap is an int with one byte per row, 1 for a row that is selected
+    and 0 otherwise, so that & | and ^ combine selections at C speed. 
+    Bitmaps for (feature, value) pairs are made when first needed and kept.
+    The index is rebuilt if rows have been added to the table since.
+
+    Queries use the syntax of AnalysisList.filter(): feature = 'value', 
+    '!value' to exclude it, and '#n' for an integer. A pair (lo, hi) selects
+    values from lo to hi inclusive; w, c and s (the ordinals of the word) 
+    are integers, other features are compared as strings. A row without a
+    feature matches no term on that feature, not even a '!' one.
+    Attributes:
+        table: the AnalysisTable
+        n: the number of rows indexed (int)
+        ones: the bitmap of all rows (int)
+        bitmaps: dict of (column, value) -> bitmap.
+    """
+    # Token columns; the ordinals hold ints, the rest pool codes.
+    token_columns = {'label': 'tok_label', 'word': 'tok_word', 
+                     'w': 'tok_w', 'c': 'tok_c', 's': 'tok_s'}
+
+    def __init__(self, table):
+        self.table = table
+        self.reset()
+
+    def reset(self):
+        """Discard the bitmaps, e.g. after rows are added to the table."""
+        self.n = len(self.table)
+        self.ones = int.from_bytes(b'\x01' * self.n, 'little')
+        self.bitmaps = {}
+        self.data = {}
+        self.sorted = {}
+
+    def _bytes(self, name, col):
+        """The bytes of a column, kept for reuse."""
+        d = self.data.get(name)
+        if d is None:
+            d = col.tobytes()
+            self.data[name] = d
+        return d
+
+    def _eq(self, name, col, v, ones):
+        """The bitmap of the items of a column equal to v.
+        Args:
+            name: key under which to keep the column's bytes
+            col: an array of unsigned ints
+            v: the value (int)
+            ones: the bitmap of all items.
+        Returns:
+            int.
+        """
+        size = col.itemsize
+        if v < 0 or v >= 1 << (8 * size):
+            return 0
+        data = self._bytes(name, col)
+        vb = v.to_bytes(size, sys.byteorder)
+        bits = ones
+        for j in range(size):
+            t = bytearray(256)
+            t[vb[j]] = 1
+            bits = bits & int.from_bytes(data[j::size].translate(t), 'little')
+        return bits
+
+    def _rows(self, tbits):
+        """The bitmap of the rows of the tokens in a token bitmap."""
+        tb = tbits.to_bytes(self.table.n_tokens(), 'little')
+        return int.from_bytes(bytes(map(tb.__getitem__, self.table.token)),
+                              'little')
+
+    def _is_sorted(self, name):
+        s = self.sorted.get(name)
+        if s is None:
+            col = getattr(self.table, name)
+            s = all([col[i] <= col[i + 1] for i in range(len(col) - 1)])
+            self.sorted[name] = s
+        return s
+
+    def _range(self, name, lo, hi):
+        """The bitmap of the rows whose tokens have ordinals in [lo, hi]."""
+        col = getattr(self.table, name)
+        if self._is_sorted(name):
+            a = bisect.bisect_left(col, lo)
+            b = bisect.bisect_right(col, hi)
+            st = self.table.tok_start
+            (i, j) = (st[a], st[b]) if a < b else (0, 0)
+            return int.from_bytes(b'\x01' * (j - i), 'little') << (8 * i)
+        else:
+            tb = bytes([1 if lo <= x <= hi else 0 for x in col])
+            return self._rows(int.from_bytes(tb, 'little'))
+
+    def present(self, feature):
+        """The bitmap of the rows that have a feature.
+        Returns:
+            int.
+        """
+        k = (feature, None)
+        b = self.bitmaps.get(k)
+        if b is None:
+            t = self.table
+            if feature in TableIndex.token_columns:
+                b = self.ones
+            elif feature in AnalysisTable.string_columns:
+                b = self.ones ^ self._eq(feature, getattr(t, feature), 0, 
+                                         self.ones)
+            else:
+                f = t.schema.name_codes.get(feature)
+                if f is None or f not in t.features:
+                    b = 0
+                else:
+                    b = self.ones ^ self._eq(feature, t.features[f], 
+                                             AnalysisTable.absent, self.ones)
+            self.bitmaps[k] = b
+        return b
+
+    def bitmap(self, feature, value):
+        """The bitmap of the rows where a feature has a value.
+        Args:
+            feature: str
+            value: str, or int for w, c and s; or a (lo, hi) pair.
+        Returns:
+            int.
+        """
+        if len(self.table) != self.n:
+            self.reset()
+        k = (feature, value)
+        b = self.bitmaps.get(k)
+        if b is not None:
+            return b
+        t = self.table
+        name = TableIndex.token_columns.get(feature)
+        if isinstance(value, tuple):
+            if name in ['tok_w', 'tok_c', 'tok_s']:
+                b = self._range(name, value[0], value[1])
+            else:
+                vs = self.values(feature)
+                b = 0
+                for v in vs:
+                    if v is not None and value[0] <= v <= value[1]:
+                        b = b | self.bitmap(feature, v)
+        elif name in ['tok_w', 'tok_c', 'tok_s']:
+            b = self._range(name, int(value), int(value))
+        elif name is not None:
+            c = t.pool.codes.get(str(value))
+            tones = int.from_bytes(b'\x01' * t.n_tokens(), 'little')
+            b = 0 if c is None else \
+                self._rows(self._eq(name, getattr(t, name), c, tones))
+        elif feature in AnalysisTable.string_columns:
+            c = t.pool.codes.get(str(value))
+            b = 0 if c is None else \
+                self._eq(feature, getattr(t, feature), c, self.ones)
+        else:
+            c = t.schema.find_code(feature, str(value))
+            f = t.schema.name_codes.get(feature)
+            if c is None or f not in t.features:
+                b = 0
+            else:
+                b = self._eq(feature, t.features[f], c, self.ones)
+        self.bitmaps[k] = b
+        return b
+
+    def values(self, feature):
+        """The values a feature may have (list of str)."""
+        t = self.table
+        if feature in AnalysisTable.string_columns:
+            return t.pool.strings
+        f = t.schema.name_codes.get(feature)
+        return [] if f is None else t.schema.values[f]
+
+    def select(self, **terms):
+        """The bitmap of the rows that satisfy all terms.
+        Arg:
+            **terms: feature=value clauses. See the class comment.
+        Returns:
+            int.
+        """
+        if len(self.table) != self.n:
+            self.reset()
+        b = self.ones
+        for (k, v) in terms.items():
+            neg = False
+            if isinstance(v, str):
+                if v[0] == '!':
+                    neg = True
+                    v = v[1:]
+                if v[0] == '#':
+                    v = int(v[1:])
+            if neg:
+                b = b & self.present(k) & ~self.bitmap(k, v)
+            else:
+                b = b & self.bitmap(k, v)
+        return b
+
+    def count(self, bits):
+        """The number of rows in a bitmap (int)."""
+        return bin(bits).count('1')
+
+    def rows(self, bits):
+        """The rows in a bitmap.
+        Returns:
+            list of int, ascending.
+        """
+        bs = bits.to_bytes(self.n, 'little')
+        return list(itertools.compress(range(self.n), bs))
+
+class MatchIndex(object):
+    """A secondary index from surface forms to their matched analyses.
+
+    A Cache holds one response per url form, so differently accented or cased
+    spellings of a word share a response. This index records, for each match
+    key (see Word.match_key()), the cache key of the response and the 
+    positions of the analyses that matched, so that a spelling seen before
+    needs no fetch and no filtering. An entry is recomputed if the response
+    has been replaced since it was made.
+
+    A cache made with matches = True owns an index, kept in a file next to
+    the cache, and discards the entries of a key when its response is 
+    replaced or removed. The positions are saved; the matched analyses 
+    themselves are kept in memory once made, and copied for each lookup.
+    Attributes:
+        file: the pickle file, or None for an index kept in memory only (str)
+        index: dict of match key -> (cache key, fetched, tuple of int)
+        lists: dict of match key -> (cache key, fetched, tuple of Analysis),
+            the matched analyses, not saved
+        by_key: dict of cache key -> set of match keys
+        dirty: are there changes not yet saved (bool)?
+    """
+    def __init__(self, file = None):
+        """
+        Arg:
+            file: pickle file, loaded if it exists (str, optional).
+        """
+        self.file = file
+        self.dirty = False
+        self.index = {}
+        self.lists = {}
+        self.by_key = {}
+        if file is None:
+            pass
+        elif os.path.exists(file):
+            f = open(file, 'rb')
+            self.index = pickle.load(f)
+            f.close()
+            for (k, e) in self.index.items():
+                self.by_key.setdefault(e[0], set()).add(k)
+
+    def __str__(self):
+        return "morpheuslib2.MatchIndex at " + str(self.file)
+
+    def __len__(self):
+        return len(self.index)
+
+    def indices(self, word, resp, al = None):
+        """Positions of the analyses in a response that match a word.
+        Args:
+            word: the word looked up (Word)
+            resp: its response (MorpheusResponse)
+            al: resp's AnalysisList, if already made (optional).
+        Returns:
+            tuple of int.
+        Effect:
+            adds an entry to the index if there is none, or if it is stale.
+        """
+        k = word.match_key()
+        fetched = getattr(resp, 'fetched', None)
+        e = self.index.get(k)
+        if e is None or e[0] != resp.key() or e[1] != fetched:
+            if al is None:
+                ix = resp.matched_indices(word)
+            else:
+                ix = al.matched_indices()
+            e = (resp.key(), fetched, ix)
+            self.index[k] = e
+            self.by_key.setdefault(e[0], set()).add(k)
+            self.dirty = True
+        return e[2]
+
+    def matched(self, word, resp):
+        """The analyses in a response that match a word.
+        Args:
+            word: the word looked up (Word)
+            resp: its response (MorpheusResponse).
+        Returns:
+            AnalysisList, empty if the response is not OK.
+        """
+        if not resp.is_ok():
+            return AnalysisList(None, word)
+        k = word.match_key()
+        fetched = getattr(resp, 'fetched', None)
+        e = self.lists.get(k)
+        if e is None or e[0] != resp.key() or e[1] != fetched:
+            al = resp.make_analysis_list(word)
+            e = (resp.key(), fetched, 
+                 tuple([al[i] for i in self.indices(word, resp, al)]))
+            self.lists[k] = e
+            ml = AnalysisList(None, word, [a.copy() for a in e[2]])
+        else:
+            ml = AnalysisList(None, word, [a.copy(word) for a in e[2]])
+        ml.resp = resp
+        ml.positions = self.index[k][2]
+        return ml
+
+    def lookup(self, word, cache):
+        """Look up a word in a cache and return its matched analyses.
+        Args:
+            word: Word
+            cache: Cache, DbCache, SnapshotCache or ShardedCache.
+        Returns:
+            AnalysisList, or None if the word is not in the cache.
+        """
+        resp = cache.lookup_word(word)
+        if resp is None:
+            return None
+        else:
+            return self.matched(word, resp)
+
+    def discard(self, key):
+        """Remove the entries for a cache key, e.g. when it is uncached.
+        Arg:
+            key: (word, lang) pair.
+        Returns:
+            the number of entries removed (int).
+        """
+        ks = self.by_key.pop(key, ())
+        for k in ks:
+            self.index.pop(k, None)
+            self.lists.pop(k, None)
+        if len(ks) > 0:
+            self.dirty = True
+        return len(ks)
+
+    def clear(self):
+        """Remove all entries."""
+        if len(self.index) > 0:
+            self.dirty = True
+        self.index.clear()
+        self.lists.clear()
+        self.by_key.clear()
+
+    def commit(self):
+        """Save the index to its file, if it has one and has changed.
+        Effect:
+            overwrites the file.
+        Returns:
+            self.
+        """
+        if self.file is None or not self.dirty:
+            return self
+        tmp = self.file + '.tmp'
+        f = open(tmp, 'wb')
+        pickle.dump(self.index, f)
+        f.close()
+        os.replace(tmp, self.file)
+        self.dirty = False
+        return self
+    
+class LexiconIndex(object):
+    """An inverted index of the lemmas, forms and features in cached 
+    responses, so that they can be looked up without parsing XML.
+
+    The index is kept up to date by a Cache or DbCache made with 
+    lexicon = True, and saved next to it, in the cache file name + '.lex'.
+    Records are (lemma, form, pos, features), where features is a tuple of
+    the sorted (name, value) pairs of the inflectional features. Lemmas are
+    as given by Morpheus, with any numerical suffix; lookups by lemma also
+    find the suffixed lemmas.
+    Attributes:
+        file: the pickle file, or None for an index kept in memory only (str)
+        by_key: dict of cache key -> (fetched, tuple of records)
+        lemmas: dict of lemma -> dict of form -> Counter of (pos, features)
+        forms: dict of form -> Counter of lemmas
+        features: dict of (pos, name, value) -> Counter of forms; (pos, None,
+            None) for all the forms of a part of speech
+        bases: dict of lemma without suffix -> set of lemmas
+        dirty: are there changes not yet saved (bool)?
+    """
+    def __init__(self, file = None):
+        """
+        Arg:
+            file: pickle file, loaded if it exists (str, optional).
+        """
+        self.file = file
+        self.dirty = False
+        self.clear()
+        if file is None:
+            pass
+        elif os.path.exists(file):
+            f = open(file, 'rb')
+            self.by_key = pickle.load(f)
+            f.close()
+            for (_, recs) in self.by_key.values():
+                self._count(recs, 1)
+        self.dirty = False
+
+    def __str__(self):
+        return "morpheuslib2.LexiconIndex at " + str(self.file)
+
+    def __len__(self):
+        return len(self.by_key)
+
+    def clear(self):
+        """Empty the index."""
+        self.by_key = {}
+        self.lemmas = {}
+        self.forms = {}
+        self.features = {}
+        self.bases = {}
+        self.dirty = True
+
+    @staticmethod
+    def records(resp):
+        """The records of a response.
+        Arg:
+            resp: MorpheusResponse.
+        Returns:
+            tuple of (lemma, form, pos, features) tuples, empty if the 
+            response is not OK.
+        """
+        if not resp.is_ok() or resp.text is None:
+            return ()
+        rs = []
+        for a in AnalysisList(resp.text, None):
+            d = dict(zip(a.tags, a.values))
+            fs = tuple(sorted([(t, d[t]) for t in d 
+                               if t not in Analysis.core_features]))
+            rs.append((d.get('lemma'), d.get('form'), d.get('pos'), fs))
+        return tuple(rs)
+
+    @staticmethod
+    def _bump(d, k, v, n):
+        """Add n to the count of v in the Counter d[k], dropping zeros."""
+        c = d.setdefault(k, collections.Counter())
+        c[v] += n
+        if c[v] <= 0:
+            del c[v]
+            if len(c) == 0:
+                del d[k]
+
+    def _count(self, recs, n):
+        """Add n (1 or -1) to the counts of records."""
+        for (lemma, form, pos, fs) in recs:
+            b = num_sfx(lemma)[0]
+            LexiconIndex._bump(self.lemmas.setdefault(lemma, {}), form, 
+                               (pos, fs), n)
+            if len(self.lemmas[lemma]) == 0:
+                del self.lemmas[lemma]
+                self.bases[b].discard(lemma)
+                if len(self.bases[b]) == 0:
+                    del self.bases[b]
+            else:
+                self.bases.setdefault(b, set()).add(lemma)
+            LexiconIndex._bump(self.forms, form, lemma, n)
+            for (f, x) in ((None, None),) + fs:
+                LexiconIndex._bump(self.features, (pos, f, x), form, n)
+
+    def add(self, resp):
+        """Index a response, replacing any earlier response under its key.
+        Arg:
+            resp: MorpheusResponse.
+        """
+        k = resp.key()
+        fetched = getattr(resp, 'fetched', None)
+        old = self.by_key.get(k)
+        if old is not None:
+            if old[0] == fetched and fetched is not None:
+                return
+            self._count(old[1], -1)
+        recs = LexiconIndex.records(resp)
+        self.by_key[k] = (fetched, recs)
+        self._count(recs, 1)
+        self.dirty = True
+
+    def remove(self, key):
+        """Remove the records of a cache key from the index.
+        Arg:
+            key: (word, lang) pair.
+        """
+        old = self.by_key.pop(key, None)
+        if old is not None:
+            self._count(old[1], -1)
+            self.dirty = True
+
+    def sync(self, items):
+        """Bring the index up to date with a cache's contents.
+        Arg:
+            items: iterable of (key, MorpheusResponse) pairs, all of the 
+                cache's responses.
+        """
+        keys = set()
+        for (k, resp) in items:
+            keys.add(k)
+            e = self.by_key.get(k)
+            if e is None or e[0] != getattr(resp, 'fetched', None):
+                self.add(resp)
+        for k in [k for k in self.by_key if k not in keys]:
+            self.remove(k)
+
+    def _lemmas(self, lemma):
+        """A lemma, and the lemmas with suffixes that it stands for."""
+        return sorted(self.bases.get(lemma, set()) | {lemma})
+
+    @staticmethod
+    def _sort_key(analysis):
+        """A sort key of a (pos, features) pair in which missing values, as
+        of an empty element, sort as ''.
+        """
+        pos, fs = analysis
+        return ('' if pos is None else pos,
+                tuple([(f, '' if x is None else x) for (f, x) in fs]))
+
+    def paradigm(self, lemma):
+        """The forms of a lemma, with their analyses.
+        Arg:
+            lemma: str, with or without a numerical suffix.
+        Returns:
+            dict of form -> sorted list of (pos, features) pairs.
+        """
+        out = {}
+        for l in self._lemmas(lemma):
+            for (form, c) in self.lemmas.get(l, {}).items():
+                out.setdefault(form, set()).update(c)
+        return dict([(f, sorted(s, key = LexiconIndex._sort_key)) 
+                     for (f, s) in out.items()])
+
+    def lemmas_of(self, form):
+        """The lemmas of a form (sorted list of str)."""
+        return sorted(self.forms.get(form, {}))
+
+    def forms_with(self, pos, **features):
+        """The forms having a part of speech and feature values, e.g.
+        forms_with('verb', tense = 'aor', voice = 'mid').
+        Returns:
+            sorted list of str.
+        """
+        s = set(self.features.get((pos, None, None), {}))
+        for (f, v) in features.items():
+            s = s & set(self.features.get((pos, f, v), {}))
+        return sorted(s)
+
+    def commit(self):
+        """Save the index to its file, if it has one and has changed.
+        Effect:
+            overwrites the file.
+        Returns:
+            self.
+        """
+        if self.file is None or not self.dirty:
+            return self
+        tmp = self.file + '.tmp'
+        f = open(tmp, 'wb')
+        pickle.dump(self.by_key, f)
+        f.close()
+        os.replace(tmp, self.file)
+        self.dirty = False
+        return self
+
+class FileLock(object):
+    """An advisory lock on a file, shared by readers or held by one writer.
+
+    The lock is only respected by processes that use it. It is not
+    reentrant: a process must release the lock before acquiring it again.
+    Attribute:
+        file: the lock file, created if missing (str).
+    """
+    def __init__(self, file):
+        """
+        Raises:
+            OSError if file locking is not available on this platform.
+        """
+        if fcntl is None:
+            raise OSError("File locking is not available on this platform.")
+        self.file = file
+        self.f = None
+
+    def acquire(self, exclusive = True):
+        """Wait for and take the lock.
+        Arg:
+            exclusive: take the writer's lock rather than a reader's (bool,
+            optional, default is True).
+        """
+        self.f = open(self.file, 'a')
+        fcntl.flock(self.f.fileno(), 
+                    fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def release(self):
+        """Give up the lock."""
+        fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+        self.f.close()
+        self.f = None
+
+class Cache:
+    """A simple cache for MorpheusResponses. 
+
+    Keys are pairs cnsisting of the url form of a word, and its language.
+    Words of both languages are stored in one cache.
+    Unless opened in shared mode, this class is not designed for concurrent
+    usage. In shared mode, the cache files are locked while they are read or
+    written, and changes saved by other processes are merged into memory
+    when committing and when a lookup misses. Conflicting responses under one
+    key are resolved by prefer().
+
+    Changes made since the last save are tracked. commit() rewrites the cache
+    file; commit_delta() appends just the changes to a delta file (the cache
+    file name + '.delta'), which is merged into the dict on loading.
+
+    Attributes:
+        file : location of cache, new or existing (str)
+        delta_file: location of the delta file (str)
+        pers: a dict of (str, str) -> MorpheusResponse mappings
+        status: a basic status message 'reopened_cache', 'new_cache', or 
+            'cache_changed'. The status is of the in-memory cache.
+        last_save: when changes made to in-memory dict of this instance were
+        last saved to disk, or None (datetime). 
+        entries: number of responses per language (collections.Counter)
+        nbytes: total length of the response documents (int)
+        hits, misses: lookups that found or did not find a response (int)
+        inserts: calls of cache() (int).
+        added: keys in memory but not on disk (set)
+        replaced: keys on disk whose response was changed in memory (set)
+        removed: keys on disk that were removed from memory (set)
+        shared: is the cache shared with other processes (bool)?
+        lexicon: a LexiconIndex of the responses, saved with the cache, or
+            None.
+        matches: a MatchIndex of the cached responses, saved with the 
+            cache, or None.
+    """
+
+    CommitReport = collections.namedtuple('CommitReport', ['will_be_deleted', 
+        'will_be_replaced', 'will_be_added'])
+
+    Stats = collections.namedtuple('Stats', ['entries', 'nbytes', 'hits',
+        'misses', 'inserts'])
+
+    def __init__(self, file, shared = False, lexicon = False, matches = False):
+        """
+        Arg:
+            file: file name with (for non-relative location) or without (for 
+                location in same directory) path.
+            shared: will other processes use the cache file at the same time?
+                Optional, default is False.
+            lexicon: keep a LexiconIndex in the file + '.lex'? Optional, 
+                default is False.
+            matches: keep a MatchIndex in the file + '.match'? Optional, 
+                default is False.
+        Raises:
+            OSError if shared is True and file locking is not available.
+        """
+        self.file = file
+        self.lexicon = LexiconIndex(file + '.lex') if lexicon else None
+        self.matches = MatchIndex(file + '.match') if matches else None
+        self.delta_file = file + '.delta'
+        self.shared = shared
+        if shared:
+            self.lock = FileLock(file + '.lock')
+        else:
+            self.lock = None
+        self.added = set()
+        self.replaced = set()
+        self.removed = set()
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self._lock(False)
+        try:
+            self._load()
+        finally:
+            self._unlock()
+
+    def _load(self):
+        """Read the cache file and the delta file.
+        Effect:
+            replaces the dict; sets status, last_save and the running counts.
+        """
+        f = None
+        try:
+            f = open(self.file, 'rb')
+            self.last_save, self.pers = pickle.load(f)
+            self.status = 'reopened cache'
+        except IOError:
+            f = open(self.file, 'wb')
+            pickle.dump((datetime.datetime.now(), {}), f)
+            self.pers = {}
+            self.status = 'new cache'
+            self.last_save = None
+        except Exception as exn:    
+            self.pers = {}
+            self.status = 'corrupted cache'
+            self.load_exn = exn
+            self.last_save = None 
+        finally:
+            f.close()
+        self.gen = self._generation()
+        self.delta_pos = 0
+        self.recount()
+        if self.status == 'reopened cache':
+            self._read_delta()
+
+    def __str__(self):
+        return "morpheuslib2.Cache at " + self.file
+
+    def _lock(self, exclusive):
+        """Lock the cache files against other processes, if shared."""
+        if self.lock is not None:
+            self.lock.acquire(exclusive)
+
+    def _unlock(self):
+        """Undo _lock()."""
+        if self.lock is not None:
+            self.lock.release()
+
+    def _generation(self):
+        """An identifier of the current version of the cache file, which
+        changes whenever the file is rewritten.
+        Returns:
+            tuple, or None if there is no file.
+        """
+        try:
+            st = os.stat(self.file)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def resp_size(resp):
+        """The length of a response's document.
+        Returns:
+            int, 0 if the response has no document.
+        """
+        return 0 if resp.text is None else len(resp.text)
+
+    def recount(self):
+        """Recompute entries and nbytes from the dict.
+        Effect:
+            sets entries and nbytes. Needed only after the dict was changed
+            other than through the methods of this class.
+        """
+        self.entries = collections.Counter([l for (_, l) in self.pers])
+        self.nbytes = sum([Cache.resp_size(r) for r in self.pers.values()])
+        if self.lexicon is not None:
+            self.lexicon.sync(self.pers.items())
+
+    def _set(self, k, resp):
+        """Put a response in the dict, keeping the running counts."""
+        old = self.pers.get(k)
+        if old is None:
+            self.entries[k[1]] += 1
+        else:
+            self.nbytes = self.nbytes - Cache.resp_size(old)
+            if self.matches is not None:
+                self.matches.discard(k)
+        self.nbytes = self.nbytes + Cache.resp_size(resp)
+        self.pers[k] = resp
+        if self.lexicon is not None:
+            self.lexicon.add(resp)
+
+    def _unset(self, k):
+        """Remove a response from the dict, keeping the running counts.
+        Returns:
+            the response removed, or None.
+        """
+        old = self.pers.pop(k, None)
+        if old is not None:
+            self.entries[k[1]] -= 1
+            self.nbytes = self.nbytes - Cache.resp_size(old)
+            if self.lexicon is not None:
+                self.lexicon.remove(k)
+            if self.matches is not None:
+                self.matches.discard(k)
+        return old
+
+    def _read_delta(self):
+        """Apply the records of the delta file not read yet.
+        Effect:
+            merges the records into the dict (see _merge()). A record left 
+            incomplete by an interrupted write ends the reading.
+        Returns:
+            the number of records applied (int).
+        """
+        n = 0
+        try:
+            f = open(self.delta_file, 'rb')
+        except IOError:
+            return n
+        try:
+            f.seek(self.delta_pos)
+            while True:
+                t, changed, removed = pickle.load(f)
+                self._merge(changed, removed)
+                self.last_save = t
+                self.delta_pos = f.tell()
+                n = n + 1
+        except (EOFError, pickle.UnpicklingError):
+            pass
+        finally:
+            f.close()
+        return n
+
+    def _merge(self, changed, removed):
+        """Merge changes saved by a delta commit into the dict.
+
+        Unsaved changes made in memory are kept, unless prefer() chooses the
+        saved response over the one in memory.
+        Args:
+            changed: dict of (str, str) -> MorpheusResponse
+            removed: list of (str, str).
+        """
+        for k, r in changed.items():
+            if k in self.added or k in self.replaced:
+                if prefer(r, self.pers[k]) is r:
+                    self._set(k, r)
+                    self.added.discard(k)
+                    self.replaced.discard(k)
+            elif k in self.removed:
+                pass
+            elif prefer(self.pers.get(k), r) is r:
+                self._set(k, r)
+        for k in removed:
+            if k in self.added or k in self.replaced or k in self.removed:
+                pass
+            else:
+                self._unset(k)
+
+    def refresh(self):
+        """Read the changes other processes have saved since this instance 
+        last read the cache files.
+        Effect:
+            merges the changes into the dict; unsaved changes in memory are
+            kept (see _merge()).
+        Returns:
+            self.
+        """
+        self._lock(False)
+        try:
+            self._refresh()
+        finally:
+            self._unlock()
+        return self
+
+    def _refresh(self):
+        """refresh() without locking."""
+        if self._generation() == self.gen:
+            self._read_delta()
+        else:
+            # The cache file was rewritten: reload, then redo unsaved changes.
+            pending = dict([(k, self.pers[k]) 
+                            for k in self.added | self.replaced])
+            removed = self.removed
+            self.added = set()
+            self.replaced = set()
+            self.removed = set()
+            self._load()
+            for k, r in pending.items():
+                if prefer(self.pers.get(k), r) is r:
+                    self._touch(k)
+                    self._set(k, r)
+            for k in removed:
+                if k in self.pers:
+                    self._drop(k)
+                    self._unset(k)
+
+    def _touch(self, k):
+        """Record that the response under key k was set in memory."""
+        if k in self.added:
+            pass
+        elif k in self.pers or k in self.removed:
+            self.removed.discard(k)
+            self.replaced.add(k)
+        else:
+            self.added.add(k)
+
+    def _drop(self, k):
+        """Record that key k was removed from memory."""
+        if k in self.added:
+            self.added.discard(k)
+        else:
+            self.replaced.discard(k)
+            self.removed.add(k)
+
+    def is_dirty(self):
+        """Are there changes not yet saved to disk?
+        Returns:
+            bool.
+        """
+        return len(self.added) + len(self.replaced) + len(self.removed) > 0
+
+    def _get(self, k):
+        """Get the response under key k, counting the lookup. In shared mode,
+        a miss is retried after reading other processes' changes.
+        Returns:
+            MorpheusResponse or None.
+        """
+        r = self.pers.get(k)
+        if r is None and self.shared:
+            r = self.refresh().pers.get(k)
+        if r is None:
+            self.misses = self.misses + 1
+        else:
+            self.hits = self.hits + 1
+        return r
+
+    def __getitem__(self, key):
+        """
+        Arg:
+            a pair consisting of the url form of the word
+            and the language of the word (str, str).
+        Raises:
+            KeyError if the key is not in the cache.
+        """
+        return self.pers[key]    
+
+    def cache(self, resp):
+        """Cache a Morpheus response under  pair consisting of the url form 
+            of the word and the language.
         Args:
             resp: an instance of MorpheusResonse.
         Effects:
@@ -1622,38 +3945,1003 @@ class Cache:
             or replacing an exising one under the key; changes the status
             message to 'cache-changed'.
         """
-       
-        
-        self.pers[resp.key()] = resp
-        self.status = 'cache_changed'
- 
-    def lookup_word(self, word):
-        """ Lookup a word in the cache.
+        k = resp.key()
+        self._touch(k)
+        self._set(k, resp)
+        self.inserts = self.inserts + 1
+        self.status = 'cache_changed'
+ 
+    def lookup_word(self, word):
+        """ Lookup a word in the cache.
+        Args:
+            word: an instance of Word.
+        Returns:
+            an Instance of MorpheusResponse such as would have been returned by
+            Morpheus service; or None if the word is not found.
+        """ 
+        return self._get(word.key_pair())
+
+    def lookup_matched(self, word):
+        """Look up a word and return the analyses that match it (see 
+        MorpheusResponse.matched_list()), through the match index if there
+        is one.
+        Arg:
+            word: Word.
+        Returns:
+            AnalysisList, or None if the word's response is missing or not
+            OK.
+        """
+        resp = self.lookup_word(word)
+        if resp is None or not resp.is_ok():
+            return None
+        elif self.matches is None:
+            return resp.matched_list(word)
+        else:
+            return self.matches.matched(word, resp)
+
+    def lookup_str(self, word, lang, greek_mode = None):
+        """Lookup a word in plain string form.
+        Args:
+            word: str
+            lang: 'greek' or 'la'
+            greek_mode: 'unicode' or 'betacode' (optional, default: None).
+        Returns:
+            MorpheusResponse.
+        Raises:
+            LangError if lang == 'greek' and greek_mode is not 'unicode' or 
+            'betacode'.
+        """
+        if lang == 'greek' and greek_mode not in ['unicode', 'betacode']:
+            raise LangError("Invalid greek_mode " + str(greek_mode))
+        else:
+            return self.lookup_key((url_form(word, lang, greek_mode), lang))
+                                 
+    def lookup_key(self, key):
+        """Look up the key which is a pair consisting of the url form of the word
+        and the language of the word.
+        Arg:
+            (str, str).
+        Returns:
+            a MorpheusResponse, or None if the key is not found.
+            
+        """
+        return self._get(key)
+        
+    def commit(self):
+        """ Commit the cache's current (memory) state.
+
+        In shared mode, changes saved by other processes are merged in first.
+        Effect:
+            overwrites the existing cache file.
+        Returns:
+            self.
+        Raises:
+            OS, IO or Pickle error.
+        """
+        self._lock(True)
+        try:
+            if self.shared:
+                self._refresh()
+            self._commit()
+        finally:
+            self._unlock()
+        return self
+
+    def _commit(self):
+        """commit() without locking or merging."""
+        t = datetime.datetime.now()
+        tmp = self.file + '.tmp'
+        g = open(tmp, "bw")
+        pickle.dump((t, self.pers), g)
+        g.close()
+        os.replace(tmp, self.file)
+        if os.path.exists(self.delta_file):
+            os.remove(self.delta_file)
+        self.gen = self._generation()
+        self.delta_pos = 0
+        self._saved(t)
+        if self.lexicon is not None:
+            self.lexicon.commit()
+        if self.matches is not None:
+            self.matches.commit()
+
+    def commit_delta(self):
+        """Commit only the changes made since the last save.
+
+        The changes are appended to the delta file as one record. When the
+        delta file has grown larger than the cache file, a full commit() is
+        made instead. In shared mode, changes saved by other processes are 
+        merged in first; the cache files are locked only while this is done.
+        Effect:
+            appends to the delta file, or overwrites the cache file.
+        Returns:
+            self.
+        Raises:
+            OS, IO or Pickle error.
+        """
+        if self.matches is not None:
+            self.matches.commit()
+        if not self.is_dirty():
+            return self
+        self._lock(True)
+        try:
+            if self.shared:
+                self._refresh()
+            if (os.path.exists(self.delta_file) and 
+                os.path.getsize(self.delta_file) > os.path.getsize(self.file)):
+                self._commit()
+            elif self.is_dirty():
+                t = datetime.datetime.now()
+                changed = dict([(k, self.pers[k]) 
+                                for k in self.added | self.replaced])
+                g = open(self.delta_file, "ab")
+                pickle.dump((t, changed, list(self.removed)), g)
+                self.delta_pos = g.tell()
+                g.close()
+                self._saved(t)
+                if self.lexicon is not None:
+                    self.lexicon.commit()
+        finally:
+            self._unlock()
+        return self
+
+    def _saved(self, t):
+        """Record a save at time t.
+        Effect:
+            clears the change sets.
+        """
+        self.added.clear()
+        self.replaced.clear()
+        self.removed.clear()
+        self.last_save = t
+        
+    def cached_words(self, lang = None):
+        """ The list words currently stored in this instance.
+        Args:
+            lang : the language (optional, str) 'greek' or 'la', or None to
+            return words for both languages.
+        Returns:
+            list of (str, str) i.e. (word, lang) pairs. Note that the word is in
+            url form.
+        """
+        if lang is None:
+            return self.cached_words('greek') + self.cached_words('la')
+        else:
+            return [(w, l) for (w, l) in self.pers.keys() if l == lang]
+
+    def count(self, lang = None):
+        """The size - number of words - of this cache.
+        Arg:
+            lang: 'greek' or 'la' (optional). If omitted, count for both 
+            languages.
+        Returns:
+            int.
+        """
+        if lang is None:
+            return len(self.pers)
+        else:
+            return self.entries[lang]
+
+    def stats(self):
+        """The running counts of this cache.
+        Returns:
+            a Cache.Stats named tuple: entries per language (dict), total 
+            document bytes, hits, misses and inserts.
+        """
+        return Cache.Stats(dict(self.entries), self.nbytes, self.hits, 
+                           self.misses, self.inserts)
+
+    def clear(self):
+        """ Remove all entries from this cache in memory.
+        Effect:
+            clears the instance's dict; sets status to 'cache_changed'.
+            No effect on disk cache until save() is called.
+        
+        """
+        for k in self.pers:
+            if k not in self.added:
+                self.removed.add(k)
+        self.added.clear()
+        self.replaced.clear()
+        self.pers.clear()
+        self.recount()
+        if self.matches is not None:
+            self.matches.clear()
+        self.status = 'cache_cleared'
+
+    def uncache_word(self, word):
+        """Remove the response for the argument word from the cache.
+        Arg:
+            Word object.
+        Effect:
+            removes the cache entry from the in-memory cache.
+        Returns:
+            the value (MorpheusResponse), if the key is found, otherwise None.
+        """
+        # del self.pers[(url_form(w.word, w.lang, w.greek_mode), w.lang)]
+        k = self._unset(word.key_pair())
+        if k is not None:
+            self._drop(word.key_pair())
+        self.status = 'cache_changed' 
+        return k
+
+    def zap(self):
+        """Erase the cache file. Useful if it gets corrupted.
+        Effect:
+            writes a (datetime, empty dict) pair to the cache file and removes
+            the delta file. No effect on data in memory, all of which counts as
+            added.
+        """
+        
+        self._lock(True)
+        try:
+            tmp = self.file + '.tmp'
+            g = open(tmp, "bw")
+            pickle.dump((datetime.datetime.now(), {}), g)
+            g.close()
+            os.replace(tmp, self.file)
+            if os.path.exists(self.delta_file):
+                os.remove(self.delta_file)
+            self.gen = self._generation()
+            self.delta_pos = 0
+        finally:
+            self._unlock()
+        self.added = set(self.pers)
+        self.replaced.clear()
+        self.removed.clear()
+        #self.status = 'cache_zapped'
+
+    def commit_report(self):
+        """A report on how a call to commit() will change the cache disk file.
+
+        The report is made from the changes tracked since the last save; the
+        disk file is not read.
+        Returns:
+            a Cache.CommitReport named tuple, which is a triple of lists of 
+            (str, str) i.e. (word, lang) pairs. The first list is all keys in 
+            disk file that will be gone after a save. The second list is all 
+            keys in the disk cache that will be updated by values in memory. 
+            The third is all keys in memory that will be added to the disk cache.
+        """
+        return Cache.CommitReport(sorted(self.removed), sorted(self.replaced),
+                                  sorted(self.added))
+
+    def not_ok(self, lang = None):
+        """A list of responses in the cash that are lacking the <analyses> 
+        document.
+        Arg:
+            'greek'. 'la', or None. If None, results for both languages are 
+            returned. Optional, default is None.
+        Returns:
+            list of ((word, lang), resp) pairs ((str, str), MorpheusResponse).
+        """
+        if lang is None:
+
+            return [(k, resp) for (k, resp) in self.pers.items() if not resp.is_ok()]
+        else:
+            return[((w, l), resp) for ((w, l), resp)in self.pers.items() if (not resp.is_ok()) and (l == lang)]
+        
+    def filter(self, filter):
+        """A list of MorpheusResponses satisfying filter criteria.
+        Arg:
+            filter: a callable (method of MorpheusResponse, or lambda), 
+            returning bool.
+        Returns:
+            a list of MorpheusResponses.
+        Raises:
+            AttributeError if the filter calls an a non-existent method.
+        """ 
+        return [resp for resp in self.pers.values() if filter(resp)]    
+        
+    @classmethod
+    def default(cls):
+        """Create a cache with file named morpheuslib2.cache in the current
+        directory.
+        """
+        return cls('morpheuslib2.cache')
+
+    def triples(self, filter = None):
+        """A list of (word, lang, pickled response) triples.
+        Arg:
+            filter: a callable on the triple giving a bool. Optional, default is 
+                None.
+        """ 
+        if filter is None:
+            return [(w, l, pickle.dumps(resp)) for ((w, l), resp) in self.pers.items()]
+        else:
+            
+            return [(w, l, pickle.dumps(resp)) for ((w, l), resp) in self.pers.items() if filter(w, l, resp)]
+
+    def iter_sorted(self):
+        """Iterate over the cache in key order.
+        Returns:
+            iterator of (word, lang, pickled response) triples (str, str, 
+            bytes).
+        """
+        for (w, l) in sorted(self.pers):
+            yield (w, l, pickle.dumps(self.pers[(w, l)]))
+
+class Exporter(object):
+    """Exports analyses as Prolog facts, JSON objects or Oz records.
+
+    The output for an analysis is rendered from a template compiled once for
+    its features (which depend on its part of speech), the format and the 
+    omitted features, and then kept. 
+    Attributes:
+        core_features: names of the features exported first (list of str)
+        keys: names of the features of the current analysis (list of str)
+        vals: their values (list)
+        values: dict of key -> value of the current analysis
+        quoted: the values quoted for Prolog and Oz, see get_quoted()
+        unique: analyses exported so far (set)
+        betacode_mode: see __init__()
+        templates: dict of (tags, format, functor, omit) -> template
+    """
+    def __init__(self, *core_features, betacode_mode = None):
+        """
+        Args:
+            features : names of core_features to extract. If inflectional is false,
+                include inflectional features here also.
+            inflectional: if True (default) all inflectional exported in order
+                by feature name; if False, only inflectional features in *features
+                are exported. Optional.
+            omit: names of features to omit frm export. Optional, default is []
+            betacode_mode: if 'lower', 'upper', or preserve, export form, lemma,
+            and extendedForm in Beta Code instead of Unicode (the Morpheus default).
+            Optional, default is False.
+        """
+        self.core_features = list(core_features)
+        self.unique = set()
+        self.vals = []
+        self.keys = []
+        self.values = {}
+        self.quoted = None
+        self.tags = None
+        self.key_lists = {}
+        self.templates = {}
+        self.betacode_mode = betacode_mode
+        
+    def __iter__(self):
+        return self.keys.__iter__()
+
+    def __getitem__(self, key):
+        return self.values[key]
+        
+    def set_analysis(self, analysis):
+        """Set the analysis to export.
+        Arg:
+            analysis: instance of Analysis.
+        Returns:
+            False if the analysis was exported before, otherwise True.
+        Raises:
+            ValueError if a feature is not found among analysis's features.
+        """
+        n = len(self.unique)
+        self.unique.add(analysis)
+        if len(self.unique) == n:
+            return False
+        else:
+            self.tags = analysis.tags
+            self.keys = self.key_lists.get(self.tags)
+            if self.keys is None:
+                self.keys = self.core_features + analysis.inflectional_features()
+                self.key_lists[self.tags] = self.keys
+            d = dict(zip(reversed(analysis.tags), reversed(analysis.values)))
+            vals = [d[k] if k in d and k not in Word.features 
+                    else analysis.get_feature(k) for k in self.keys]
+            if analysis.word.lang == 'greek'and self.betacode_mode is not None:
+                self.vals = [(UniGreek.to_betacode(v, self.betacode_mode).replace("'", r"\'") 
+                              if k in ['form', 'lemma', 'extendedForm'] 
+                              else v) for (k, v) in zip(self.keys, vals)]
+            else:    
+                self.vals = vals
+            self.values = dict(zip(self.keys, self.vals))
+            self.quoted = None
+            return True
+
+    def get_quoted(self):
+        """The values of the current analysis as Prolog/Oz terms, see 
+        special_str(), made once per analysis (list of str)."""
+        if self.quoted is None:
+            self.quoted = ["'" + v + "'" if isinstance(v, str) else 
+                           special_str(v, 'none') for v in self.vals]
+        return self.quoted
+
+    def template(self, format, functor = None, omit = []):
+        """The template for the current analysis's features.
+        Args:
+            format: 'prolog', 'json' or 'oz'
+            functor: for 'prolog', see prolog()
+            omit: names of features to omit.
+        Returns:
+            a (str, list of int) pair: a format string, and the positions in 
+            vals of the values to format with it, in order.
+        """
+        k = (self.tags, format, functor, tuple(omit))
+        t = self.templates.get(k)
+        if t is not None:
+            return t
+        ix = [i for (i, key) in enumerate(self.keys) if key not in omit]
+        esc = lambda s: s.replace('{', '{{').replace('}', '}}')
+        if format == 'prolog':
+            if functor[0] == '$':
+                head = '{}'
+                ix = [self.keys.index(functor[1:])] + ix
+            else:
+                head = esc(functor)
+            fmt = head + '(' + ','.join(['{}'] * (len(ix) - 
+                                         (1 if functor[0] == '$' else 0))) + ')'
+        elif format == 'json':
+            # Like json.dumps() of a dict: a repeated key keeps its first 
+            # place.
+            first = {}
+            for i in ix:
+                first.setdefault(self.keys[i], i)
+            ix = sorted(first.values())
+            fmt = '{{' + ', '.join([esc(json.dumps(self.keys[i], 
+                                                   ensure_ascii = False)) + 
+                                    ': {}' for i in ix]) + '}}'
+        elif format == 'oz':
+            fmt = 'analysis|' + esc(':'.join([self.keys[i] for i in ix])) + \
+                  '|' + ':'.join(['{}'] * len(ix))
+        else:
+            raise ValueError("Invalid export format " + format)
+        t = (fmt, ix)
+        self.templates[k] = t
+        return t
+
+    def json(self, omit = []):
+        """Export the analysis as JSON key:value pairs.
+        Returns:
+            str. If exporter was not initialized with an analysis, returns the 
+            string 'null'.
+        """
+        if self.tags is None:
+            return 'null'
+        (fmt, ix) = self.template('json', None, omit)
+        return fmt.format(*[json.dumps(self.values[self.keys[i]], 
+                                       ensure_ascii = False) for i in ix])
+
+    def prolog(self, functor, omit = []):
+        """A Prolog functor from this analysis."
+        
+        Default is to use the pos as a functor. Be sure to include 'pos' in the
+        features argument of the Exporter constructor if you want this as the
+        functor. Any functor arg that can't be found as a key will be used as 
+        the functor.
+        Arg:
+            functor: str.
+        Returns:
+            str. 
+        Raises:
+            KeyError if functor is '$' and a feature name not among the keys.
+        """
+        if functor[0] == '$' and functor[1:] not in self.values:
+            raise KeyError(functor[1:])
+        (fmt, ix) = self.template('prolog', functor, omit)
+        qs = self.get_quoted()
+        if functor[0] == '$':
+            return fmt.format(self.vals[ix[0]], *[qs[i] for i in ix[1:]])
+        else:
+            return fmt.format(*[qs[i] for i in ix])
+
+    def oz(self, omit = []):
+        """A string for importing as an Oz language record."""
+        (fmt, ix) = self.template('oz', None, omit)
+        qs = self.get_quoted()
+        return fmt.format(*[qs[i] for i in ix])
+
+class DbCache(object):
+    """A cache implemented in the Sqlite database.
+    
+    The database has one table whose primary key is the (word, lang) pair used
+    in the file system cache dictionary. The MorpheusResponse is pickled and placed
+    in an Sqlite BLOB column.
+
+    In shared mode the database uses write-ahead logging, so that readers and
+    one writer at a time do not block each other, and cache() resolves 
+    conflicting responses by prefer() within one write transaction.
+    Attributes:
+        file: location of the database (str)
+        shared: is the database shared with other processes (bool)?
+        cnx: sqlite3.Connection
+        hits, misses: lookups by this instance that found or did not find a
+            response (int)
+        inserts: calls of cache() on this instance (int).
+        lexicon: a LexiconIndex of the responses, saved in file + '.lex' on
+            close(), or None. Changes made by other processes are not seen
+            until sync_lexicon() is called.
+        matches: a MatchIndex of the responses, saved in file + '.match' on
+            close(), or None. Entries made stale by other processes are 
+            recomputed when next used.
+    """
+    def __init__(self, file, shared = False, timeout = 30.0, lexicon = False,
+                 matches = False):
+        """Creates the cache table in the database at file, if it doesn't exist.
+        Args:
+            file: file name (for relative location) or path + file name (for 
+                absolute location.
+            shared: will other processes use the database at the same time?
+                Optional, default is False.
+            timeout: seconds to wait for another process's lock on the 
+                database (float, optional, default is 30).
+            lexicon: keep a LexiconIndex in the file + '.lex'? Optional, 
+                default is False. It is built from the table if missing.
+            matches: keep a MatchIndex in the file + '.match'? Optional, 
+                default is False.
+        Effect:
+            creates an opn connection to the cache database.
+        """
+        self.file = file
+        self.shared = shared
+        self.cnx = sqlite3.connect(file, timeout = timeout)
+        if shared:
+            self.cnx.execute("pragma journal_mode = wal")
+            self.cnx.execute("pragma synchronous = normal")
+        self.cnx.execute("create table if not exists cache(word TEXT, lang TEXT, resp BLOB, primary key(word, lang))")
+        self.cnx.commit()
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.lexicon = None
+        if lexicon:
+            self.lexicon = LexiconIndex(file + '.lex')
+            if len(self.lexicon) == 0:
+                self.sync_lexicon()
+        self.matches = MatchIndex(file + '.match') if matches else None
+
+    def __str__(self):
+        return "morpheuslib2.DbCache at " + self.file
+
+    def sync_lexicon(self):
+        """Bring the lexicon up to date with the table, reading every row.
+        Returns:
+            self.
+        """
+        if self.lexicon is not None:
+            self.lexicon.sync([((w, l), pickle.loads(r)) 
+                               for (w, l, r) in self.iter_sorted()])
+        return self
+        
+    def insert(self, resp):
+        """Insert the argument into the cache table.
+        Arg:
+            resp: MorpheusResponse.
+        Raises:
+            sqlite3.IntegrityError if the key (word, lang) is already in the
+            database.
+        Returns:
+            self.
+        """
+        w, l = resp.key()
+        self.cnx.execute('insert into cache values (?,?,?)', (w, l, pickle.dumps(resp)))
+        self.cnx.commit()
+        if self.lexicon is not None:
+            self.lexicon.add(resp)
+        if self.matches is not None:
+            self.matches.discard((w, l))
+        return self
+
+    def cache(self, resp):
+        """A 'no-fault' method like Cache.cache(), if the key is in the table, 
+        an update is done, otherwise an insert.
+        Arg:
+            resp: MorpheusResponse.
+        Returns:
+            self.
+        Raises:
+            other exception.
+        """
+        self.inserts = self.inserts + 1
+        if self.shared:
+            return self.merge(resp)
+        try:
+            self.insert(resp)
+        except sqlite3.IntegrityError:
+            self.update(resp)
+        except Exception as exn:
+            raise exn
+        return self
+
+    def merge(self, resp):
+        """Cache the response unless the response already in the table under
+        its key is preferred to it (see prefer()).
+        Arg:
+            resp: MorpheusResponse.
+        Returns:
+            self.
+        """
+        w, l = resp.key()
+        self.cnx.execute("begin immediate")
+        try:
+            r = self.cnx.execute("select resp from cache where word = ? and lang = ?", (w, l)).fetchone()
+            old = None if r is None else pickle.loads(r[0])
+            if prefer(old, resp) is resp:
+                self.cnx.execute("insert or replace into cache values (?,?,?)", (w, l, pickle.dumps(resp)))
+                if self.lexicon is not None:
+                    self.lexicon.add(resp)
+                if self.matches is not None:
+                    self.matches.discard((w, l))
+            self.cnx.commit()
+        except:
+            self.cnx.rollback()
+            raise
+        return self
+    
+    def close(self):
+        """Close this instance's connection.
+        Effect:
+            instance is no longer usable. Saves the lexicon and the match
+            index, if any.
+        """
+        if self.lexicon is not None:
+            self.lexicon.commit()
+        if self.matches is not None:
+            self.matches.commit()
+        self.cnx.close()
+
+    def count(self, lang = None):
+        """A count of the responses currently in the cache.
+        Arg:
+            lang: 'greek' or 'la' (optional). If omitted, count for both languages.
+        Returns:
+            int.
+        """
+        if lang is None:
+            (n,) = self.cnx.execute("select count(*) from cache").fetchone()
+        else:
+            (n,) = self.cnx.execute("select count(*) from cache where lang = ?", (lang,)).fetchone()
+        return n
+ 
+    def lookup_word(self, word):
+        """Lookup the word in this cache.
+        Arg:
+            instance of Word.
+        Returns:
+            MorpheusResponse.
+        """
+        return self.lookup_key(word.key_pair())
+
+    def lookup_matched(self, word):
+        """See Cache.lookup_matched()."""
+        resp = self.lookup_word(word)
+        if resp is None or not resp.is_ok():
+            return None
+        elif self.matches is None:
+            return resp.matched_list(word)
+        else:
+            return self.matches.matched(word, resp)
+
+    def lookup_key(self, key):
+        """Look up the key which is a pair consisting of the url form of the word
+        and the language of the word.
+        Arg:
+            (str, str).
+        Returns:
+            a MorpheusResponse, or None if the key is not found.
+        """
+        r = self.cnx.execute("select resp from cache where word = ? and lang = ?", key).fetchone()
+        if r is None:
+            self.misses = self.misses + 1
+            return r
+        else:  
+            self.hits = self.hits + 1
+            return pickle.loads(r[0])
+
+    def stats(self):
+        """The counts of this cache. Entries and bytes are counted by the
+        database, the rest by this instance.
+        Returns:
+            a Cache.Stats named tuple: entries per language (dict), total 
+            bytes of the pickled responses, hits, misses and inserts.
+        """
+        entries = dict(self.cnx.execute(
+            "select lang, count(*) from cache group by lang").fetchall())
+        (n,) = self.cnx.execute(
+            "select coalesce(sum(length(resp)), 0) from cache").fetchone()
+        return Cache.Stats(entries, n, self.hits, self.misses, self.inserts)
+
+    def triples(self, filter = None):
+        """A list of (word, lang, pickled response) triples.
+        Arg:
+            filter: a callable (w, lang, resp) -> bool. Optional, default is 
+                None.
+        """
+        rows = self.cnx.execute("select word, lang, resp from cache")
+        if filter is None:
+            return [(w, l, r) for (w, l, r) in rows]
+        else:
+            return [(w, l, r) for (w, l, r) in rows 
+                    if filter(w, l, pickle.loads(r))]
+
+    def zap(self):
+        """Erase this cache's data table.
+        Effect:
+            immediate and cannot be rolled back. Does not drop the cache table.
+        Returns:
+            self.
+        """
+        self.cnx.execute("delete from cache")
+        if self.lexicon is not None:
+            self.lexicon.clear()
+        if self.matches is not None:
+            self.matches.clear()
+        return self
+
+    def update(self, resp):
+        """Replace the response currently keyed to the argument's (word, lang)
+        pair with the argument.
+        Arg:
+            MorpheusResponse.
+        Returns:
+            self.
+        """
+        w, l = resp.key()
+        self.cnx.execute("update cache set resp = ? where word = ? and lang = ?", (pickle.dumps(resp), w, l))
+        self.cnx.commit()
+        if self.lexicon is not None:
+            self.lexicon.add(resp)
+        if self.matches is not None:
+            self.matches.discard((w, l))
+        return self
+
+    def import_cache(self, cache, filter = None):
+        """Import responses from a cache into this database. Where a key is
+        already in the database, the response kept is chosen by prefer().
         Args:
-            word: an instance of Word.
+            cache: instance of class Cache, DbCache or SnapshotCache.
+            filter: a callable (w, lang, resp) -> bool.
         Returns:
-            an Instance of MorpheusResponse such as would have been returned by
-            Morpheus service; or None if the word is not found.
+            self.
         """ 
-        return self.pers.get(word.key_pair())
+        self.cnx.execute("begin immediate")
+        try:
+            for (w, l, r) in cache.triples(filter):
+                x = self.cnx.execute("select resp from cache where word = ? and lang = ?", (w, l)).fetchone()
+                new = None
+                if x is None:
+                    self.cnx.execute("insert into cache values (?,?,?)", (w, l, r))
+                    if self.lexicon is not None:
+                        new = pickle.loads(r)
+                else:
+                    new = pickle.loads(r)
+                    if prefer(pickle.loads(x[0]), new) is new:
+                        self.cnx.execute("update cache set resp = ? where word = ? and lang = ?", (r, w, l))
+                        if self.matches is not None:
+                            self.matches.discard((w, l))
+                    else:
+                        new = None
+                if new is not None and self.lexicon is not None:
+                    self.lexicon.add(new)
+            self.cnx.commit()
+        except:
+            self.cnx.rollback()
+            raise
+        return self
 
-    def lookup_str(self, word, lang, greek_mode = None):
-        """Lookup a word in plain string form.
+    def iter_sorted(self):
+        """Iterate over the cache in key order, reading rows as needed.
+        Returns:
+            iterator of (word, lang, pickled response) triples (str, str, 
+            bytes).
+        """
+        cur = self.cnx.cursor()
+        cur.execute("select word, lang, resp from cache order by word, lang")
+        for row in cur:
+            yield row
+
+    @classmethod
+    def default(cls):
+        return cls('morpheuslib2.dbcache')
+
+def snapshot_key(word, lang):
+    """The byte string under which a (word, lang) key is stored in a snapshot.
+
+    The NUL separator makes byte order agree with the order of (word, lang)
+    pairs.
+    Args:
+        word: url form of the word (str)
+        lang: 'greek' or 'la'.
+    Returns:
+        bytes.
+    """
+    return word.encode('utf-8') + b'\x00' + lang.encode('utf-8')
+
+def cache_kind(file):
+    """The kind of cache stored in a file, judged by its first bytes.
+    Arg:
+        file: path and file name (str).
+    Returns:
+        'sqlite', 'snapshot', 'sharded' (for a directory) or 'pickle'.
+    Raises:
+        IOError if the file can't be read.
+    """
+    if os.path.isdir(file):
+        return 'sharded'
+    f = open(file, 'rb')
+    head = f.read(16)
+    f.close()
+    if head.startswith(b'SQLite format 3\x00'):
+        return 'sqlite'
+    elif head.startswith(SnapshotCache.magic):
+        return 'snapshot'
+    else:
+        return 'pickle'
+
+def open_cache(file):
+    """Open an existing cache file of any kind.
+    Arg:
+        file: path and file name (str).
+    Returns:
+        Cache, DbCache, SnapshotCache or ShardedCache.
+    Raises:
+        IOError if the file can't be read.
+    """
+    kind = cache_kind(file)
+    if kind == 'sharded':
+        return ShardedCache(file)
+    elif kind == 'sqlite':
+        return DbCache(file)
+    elif kind == 'snapshot':
+        return SnapshotCache(file)
+    else:
+        return Cache(file)
+
+class SnapshotWriter(object):
+    """Writes a snapshot file for SnapshotCache.
+
+    Entries must be added in ascending key order (see snapshot_key()). The
+    file is written under a temporary name and moved into place by close(), so
+    processes that have the old snapshot mapped are not disturbed.
+
+    Layout: a header (magic, entry count, index offset), the key and value
+    bytes of every entry, then the index - one (key offset, key length, value
+    offset, value length) record per entry, in key order.
+    Attributes:
+        file: the snapshot file name (str)
+        n: number of entries written (int).
+    """
+    def __init__(self, file):
+        self.file = file
+        self.tmp = file + '.tmp'
+        self.f = open(self.tmp, 'wb')
+        self.f.write(struct.pack(SnapshotCache.header_fmt, SnapshotCache.magic,
+                                 0, 0))
+        self.index = bytearray()
+        self.last = None
+        self.n = 0
+
+    def add(self, word, lang, data):
+        """Add an entry.
         Args:
-            word: str
+            word: url form of the word (str)
             lang: 'greek' or 'la'
-            greek_mode: 'unicode' or 'betacode' (optional, default: None).
+            data: the pickled MorpheusResponse (bytes).
+        Raises:
+            ValueError if the key is not greater than the last key added.
+        """
+        k = snapshot_key(word, lang)
+        if self.last is not None and k <= self.last:
+            raise ValueError("Snapshot keys out of order at " + word + ' ' + lang)
+        ko = self.f.tell()
+        self.f.write(k)
+        self.f.write(data)
+        self.index += struct.pack(SnapshotCache.entry_fmt, ko, len(k), 
+                                  ko + len(k), len(data))
+        self.last = k
+        self.n = self.n + 1
+
+    def close(self):
+        """Write the index and header and move the file into place.
         Returns:
-            MorpheusResponse.
+            number of entries written (int).
+        """
+        xo = self.f.tell()
+        self.f.write(self.index)
+        self.f.seek(0)
+        self.f.write(struct.pack(SnapshotCache.header_fmt, SnapshotCache.magic,
+                                 self.n, xo))
+        self.f.close()
+        os.replace(self.tmp, self.file)
+        return self.n
+
+class SnapshotCache(object):
+    """A read-only, memory-mapped snapshot of a Cache or DbCache.
+
+    Opening a snapshot reads only its header. Lookups binary-search the key 
+    index in the mapping and unpickle only the response found, so any number
+    of processes can share one page-cached copy of the file.
+
+    Responses passed to cache() go to an in-memory dict that is never saved
+    (cf. the volatile cache of morpheus.Cache). Make a new snapshot with 
+    freeze() to keep them.
+    Attributes:
+        file: location of the snapshot (str)
+        n: number of entries in the snapshot (int)
+        vola: dict of (str, str) -> MorpheusResponse mappings cached since 
+            opening
+        matches: a MatchIndex kept in memory only, or None.
+    """
+    magic = b'MLSNAP01'
+    header_fmt = '<8sQQ'
+    entry_fmt = '<QIQI'
+    entry_size = struct.calcsize(entry_fmt)
+
+    def __init__(self, file, matches = False):
+        """
+        Args:
+            file: location of the snapshot (str)
+            matches: keep a MatchIndex in memory? Optional, default is False.
         Raises:
-            LangError if lang == 'greek' and greek_mode is not 'unicode' or 
-            'betacode'.
+            IOError if the file can't be read.
+            ValueError if the file is not a snapshot.
         """
-        if lang == 'greek' and greek_mode not in ['unicode', 'betacode']:
-            raise LangError("Invalid greek_mode " + str(greek_mode))
+        self.file = file
+        self.vola = {}
+        self.matches = MatchIndex() if matches else None
+        f = open(file, 'rb')
+        try:
+            self.mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        finally:
+            f.close()
+        magic, self.n, self.index_offset = struct.unpack_from(
+            SnapshotCache.header_fmt, self.mm, 0)
+        if magic != SnapshotCache.magic:
+            self.mm.close()
+            raise ValueError("Not a cache snapshot: " + file)
+
+    def __str__(self):
+        return "morpheuslib2.SnapshotCache at " + self.file
+
+    def __getitem__(self, key):
+        """
+        Arg:
+            a pair consisting of the url form of the word
+            and the language of the word (str, str).
+        Raises:
+            KeyError if the key is not in the cache.
+        """
+        r = self.lookup_key(key)
+        if r is None:
+            raise KeyError(key)
         else:
-            return self.pers.get((url_form(word, lang, greek_mode, lang)))
-                                 
+            return r
+
+    def _entry(self, i):
+        """The index record of the i-th entry.
+        Returns:
+            (key offset, key length, value offset, value length).
+        """
+        return struct.unpack_from(SnapshotCache.entry_fmt, self.mm, 
+                                  self.index_offset 
+                                  + i * SnapshotCache.entry_size)
+
+    def _key(self, i):
+        """The stored key of the i-th entry (bytes)."""
+        ko, kl, _, _ = self._entry(i)
+        return self.mm[ko:ko + kl]
+
+    def _find(self, k):
+        """Binary search for a stored key.
+        Arg:
+            k: key as returned by snapshot_key() (bytes).
+        Returns:
+            the pickled response (bytes), or None if not found.
+        """
+        lo = 0
+        hi = self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            ko, kl, vo, vl = self._entry(mid)
+            x = self.mm[ko:ko + kl]
+            if x < k:
+                lo = mid + 1
+            elif x > k:
+                hi = mid
+            else:
+                return self.mm[vo:vo + vl]
+        return None
+
     def lookup_key(self, key):
         """Look up the key which is a pair consisting of the url form of the word
         and the language of the word.
@@ -1661,385 +4949,604 @@ class Cache:
             (str, str).
         Returns:
             a MorpheusResponse, or None if the key is not found.
-            
         """
-        try:
-            return self.pers[key]
-        except KeyError:
+        r = self.vola.get(key)
+        if r is not None:
+            return r
+        d = self._find(snapshot_key(*key))
+        if d is None:
             return None
-        
-    def commit(self):
-        """ Commit the cache's current (memory) state.
-        Effect:
-            overwrites the existing cache file.
+        else:
+            return pickle.loads(d)
+
+    def lookup_word(self, word):
+        """ Lookup a word in the cache.
+        Args:
+            word: an instance of Word.
+        Returns:
+            MorpheusResponse, or None if the word is not found.
+        """
+        return self.lookup_key(word.key_pair())
+
+    def lookup_matched(self, word):
+        """See Cache.lookup_matched()."""
+        resp = self.lookup_word(word)
+        if resp is None or not resp.is_ok():
+            return None
+        elif self.matches is None:
+            return resp.matched_list(word)
+        else:
+            return self.matches.matched(word, resp)
+
+    def cache(self, resp):
+        """Keep a response in memory for the life of this instance.
+        Arg:
+            resp: MorpheusResponse.
         Returns:
             self.
-        Raises:
-            OS, IO or Pickle error.
         """
-        
-        t = datetime.datetime.now()
-        g = open(self.file, "bw")
-        pickle.dump((t, self.pers), g)
-        g.close()
-        
-    
-        self.last_save = t
+        self.vola[resp.key()] = resp
+        if self.matches is not None:
+            self.matches.discard(resp.key())
         return self
-        
-    def cached_words(self, lang = None):
-        """ The list words currently stored in this instance.
-        Args:
-            lang : the language (optional, str) 'greek' or 'la', or None to
-            return words for both languages.
+
+    def items(self):
+        """Iterate over the snapshot entries in key order. 
         Returns:
-            list of (str, str) i.e. (word, lang) pairs. Note that the word is in
-            url form.
+            iterator of (word, lang, pickled response) triples (str, str,
+            bytes).
         """
-        if lang is None:
-            return self.cached_words('greek') + self.cached_words('la')
+        for i in range(self.n):
+            ko, kl, vo, vl = self._entry(i)
+            w, l = self.mm[ko:ko + kl].split(b'\x00')
+            yield (w.decode('utf-8'), l.decode('utf-8'), self.mm[vo:vo + vl])
+
+    def triples(self, filter = None):
+        """A list of (word, lang, pickled response) triples.
+        Arg:
+            filter: a callable (w, lang, resp) -> bool. Optional, default is 
+                None.
+        """
+        if filter is None:
+            return list(self.items())
         else:
-            return [(w, l) for (w, l) in self.pers.keys() if l == lang]
+            return [(w, l, r) for (w, l, r) in self.items() 
+                    if filter(w, l, pickle.loads(r))]
+
+    def iter_sorted(self):
+        """Iterate over the snapshot in key order. Same as items()."""
+        return self.items()
+
+    def cached_words(self, lang = None):
+        """The words stored in the snapshot.
+        Arg:
+            lang: 'greek', 'la', or None for both (optional).
+        Returns:
+            list of (str, str) i.e. (word, lang) pairs.
+        """
+        return [(w, l) for (w, l, _) in self.items() 
+                if lang is None or l == lang]
 
     def count(self):
-        """The size - number of words - of this cache.
+        """The number of words in the snapshot.
         Returns:
             int.
         """
-        return len(self.cached_words())
+        return self.n
 
-    def clear(self):
-        """ Remove all entries from this cache in memory.
+    def close(self):
+        """Unmap the snapshot.
         Effect:
-            clears the instance's dict; sets status to 'cache_changed'.
-            No effect on disk cache until save() is called.
-        
+            instance is no longer usable.
+        """
+        self.mm.close()
+
+    @classmethod
+    def freeze(cls, cache, file):
+        """Write a snapshot of a cache.
+        Args:
+            cache: Cache, DbCache or SnapshotCache
+            file: location of the snapshot (str).
+        Returns:
+            the number of entries written (int).
+        """
+        ts = sorted(cache.triples(), key = lambda t: snapshot_key(t[0], t[1]))
+        g = SnapshotWriter(file)
+        for (w, l, r) in ts:
+            g.add(w, l, r)
+        return g.close()
+
+def merge_caches(sources, target, kind = None):
+    """Merge cache files into a new cache file.
+
+    The sources are read in key order side by side, so that, except for 
+    pickle (Cache) files, which are loaded whole, only one entry per source 
+    is in memory at a time. Responses under the same key are resolved by
+    prefer(); between equally preferred responses the later source wins.
+    Merging a single source compacts it: the target may be one of the 
+    sources, since snapshot and database targets are written under a 
+    temporary name and moved into place when complete.
+    Args:
+        sources: file names of Cache, DbCache or SnapshotCache files, or
+            ShardedCache directories (list of str)
+        target: name of the file to create or overwrite (str)
+        kind: 'pickle', 'sqlite', 'snapshot' or 'sharded'. Optional; by 
+            default, chosen
+            by the extension of target: '.snap' for a snapshot; '.db', 
+            '.dbcache' or '.sqlite' for a database; a pickle file otherwise.
+    Returns:
+        the number of entries in the target (int).
+    Raises:
+        IOError if a source can't be read.
+        ValueError if kind is not valid.
+    """
+    if kind is None:
+        ext = os.path.splitext(target)[1]
+        if ext == '.snap':
+            kind = 'snapshot'
+        elif ext in ['.db', '.dbcache', '.sqlite']:
+            kind = 'sqlite'
+        else:
+            kind = 'pickle'
+    if kind not in ['pickle', 'sqlite', 'snapshot', 'sharded']:
+        raise ValueError("Invalid cache kind " + str(kind))
+
+    # Open the sources before the target is touched.
+    caches = [open_cache(src) for src in sources]
+    if kind == 'snapshot':
+        out = SnapshotWriter(target)
+        add = out.add
+    elif kind == 'sqlite':
+        tmp = target + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        out = DbCache(tmp)
+        batch = []
+        def add(w, l, r):
+            batch.append((w, l, r))
+            if len(batch) >= 1000:
+                out.cnx.executemany("insert into cache values (?,?,?)", batch)
+                del batch[:]
+    else:
+        out = Cache(target) if kind == 'pickle' else ShardedCache(target)
+        out.clear()
+        add = lambda w, l, r: out.cache(pickle.loads(r))
+
+    def tagged(it, i):
+        # Ties between keys are broken by source order.
+        for (w, l, r) in it:
+            yield (w, l, i, r)
+
+    its = [tagged(c.iter_sorted(), i) for (i, c) in enumerate(caches)]
+    n = 0
+    cur = None
+    for (w, l, _, r) in heapq.merge(*its):
+        if cur is not None and (cur[0], cur[1]) == (w, l):
+            old = pickle.loads(cur[2])
+            new = pickle.loads(r)
+            cur = cur if prefer(old, new) is old else (w, l, r)
+        else:
+            if cur is not None:
+                add(*cur)
+                n = n + 1
+            cur = (w, l, r)
+    if cur is not None:
+        add(*cur)
+        n = n + 1
+
+    for c in caches:
+        if hasattr(c, 'close'):
+            c.close()
+    if kind == 'snapshot':
+        out.close()
+    elif kind == 'sqlite':
+        out.cnx.executemany("insert into cache values (?,?,?)", batch)
+        out.cnx.commit()
+        out.close()
+        os.replace(tmp, target)
+    else:
+        out.commit()
+    return n
+
+class ShardedCache(object):
+    """A cache split into shards by language and by a hash of the word.
+
+    Each shard is a Cache file in one directory, named after its language 
+    and number, e.g. 'la.0a.cache'. Shards are loaded when first used, so a
+    job that looks up only Latin words never loads Greek ones; and commits 
+    write only the shards that have changed. A shard file is created only 
+    when a response is cached in it: lookups and iteration skip shards that
+    are not on disk. The number of shards is fixed when the directory is 
+    created and kept in its 'shards' file.
+    Attributes:
+        directory: location of the shard files (str)
+        n: shards per language (int)
+        shared: are the shards shared with other processes (bool)? See Cache.
+        with_matches: does each shard keep a MatchIndex (bool)? See Cache.
+        shards: dict of (lang, shard number) -> Cache, the shards loaded
+        misses: lookups of keys whose shard does not exist (int).
+    """
+    langs = ['greek', 'la']
+
+    def __init__(self, directory, n = 16, shared = False, matches = False):
+        """
+        Args:
+            directory: location of the shard files, created if missing (str)
+            n: shards per language for a new directory (int, optional, 
+                default is 16). Ignored for an existing directory.
+            shared: see Cache (bool, optional, default is False)
+            matches: see Cache (bool, optional, default is False).
+        """
+        self.directory = directory
+        self.shared = shared
+        self.with_matches = matches
+        self.shards = {}
+        self.misses = 0
+        manifest = os.path.join(directory, 'shards')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        try:
+            f = open(manifest, 'r')
+            self.n = int(f.read().strip())
+            f.close()
+        except IOError:
+            self.n = n
+            f = open(manifest, 'w')
+            f.write(str(n) + '\n')
+            f.close()
+
+    def __str__(self):
+        return "morpheuslib2.ShardedCache at " + self.directory
+
+    def shard_no(self, key):
+        """The number of the shard holding a key.
+        Arg:
+            key: (word, lang) pair (str, str).
+        Returns:
+            int.
+        """
+        return zlib.crc32(key[0].encode('utf-8')) % self.n
+
+    def shard_file(self, lang, i):
+        """The file of a shard (str)."""
+        return os.path.join(self.directory, '%s.%02x.cache' % (lang, i))
+
+    def shard(self, lang, i, create = False):
+        """A shard, loaded if not loaded yet.
+        Args:
+            lang: 'greek' or 'la'
+            i: shard number (int)
+            create: create the shard file if it does not exist (bool, 
+                optional, default is False).
+        Returns:
+            Cache, or None if the shard does not exist and create is False.
+        """
+        c = self.shards.get((lang, i))
+        if c is None:
+            f = self.shard_file(lang, i)
+            if not create and not os.path.exists(f):
+                return None
+            c = Cache(f, self.shared, matches = self.with_matches)
+            self.shards[(lang, i)] = c
+        return c
+
+    def shard_for(self, key, create = False):
+        """The shard holding a key. See shard().
+        Returns:
+            Cache, or None.
+        """
+        return self.shard(key[1], self.shard_no(key), create)
+
+    def lang_shards(self, lang = None):
+        """The existing shards of a language, or of both languages if lang 
+        is None.
+        Returns:
+            list of Cache.
+        """
+        ls = ShardedCache.langs if lang is None else [lang]
+        cs = [self.shard(l, i) for l in ls for i in range(self.n)]
+        return [c for c in cs if c is not None]
+
+    def __getitem__(self, key):
+        """
+        Arg:
+            a pair consisting of the url form of the word
+            and the language of the word (str, str).
+        Raises:
+            KeyError if the key is not in the cache.
+        """
+        c = self.shard_for(key)
+        if c is None:
+            raise KeyError(key)
+        return c[key]
+
+    def cache(self, resp):
+        """Cache a Morpheus response in its shard, which is created if
+        missing. See Cache.cache()."""
+        self.shard_for(resp.key(), True).cache(resp)
+
+    def lookup_key(self, key):
+        """Look up a (word, lang) key in its shard.
+        Returns:
+            a MorpheusResponse, or None if the key is not found.
+        """
+        c = self.shard_for(key)
+        if c is None:
+            self.misses = self.misses + 1
+            return None
+        return c.lookup_key(key)
+
+    def lookup_word(self, word):
+        """Look up a Word in its shard.
+        Returns:
+            a MorpheusResponse, or None if the word is not found.
+        """
+        return self.lookup_key(word.key_pair())
+
+    def lookup_matched(self, word):
+        """Look up the analyses matching a Word in its shard. See 
+        Cache.lookup_matched().
         """
-        self.pers.clear()
-        self.status = 'cache_cleared'
+        c = self.shard_for(word.key_pair())
+        if c is None:
+            self.misses = self.misses + 1
+            return None
+        return c.lookup_matched(word)
 
     def uncache_word(self, word):
-        """Remove the response for the argument word from the cache.
-        Arg:
-            Word object.
-        Effect:
-            removes the cache entry from the in-memory cache.
+        """Remove the response for the argument word from its shard.
         Returns:
             the value (MorpheusResponse), if the key is found, otherwise None.
         """
-        # del self.pers[(url_form(w.word, w.lang, w.greek_mode), w.lang)]
-        k = self.pers.pop(word.key_pair(), None)
-        self.status = 'cache_changed' 
-        return k
-
-    def zap(self):
-        """Erase the cache file. Useful if it gets corrupted.
-        Effect:
-            writes a (datetime, empty dict) pair to the cache file. No effect on
-            data in memory.
-        """
-        
-        g = open(self.file, "bw")
-        pickle.dump((datetime.datetime.now(), {}), g)
-        g.close()
-        #self.status = 'cache_zapped'
+        c = self.shard_for(word.key_pair())
+        if c is None:
+            return None
+        return c.uncache_word(word)
 
-    def commit_report(self):
-        """A report on how a call to commit() will change the cache disk file.
+    def clear(self):
+        """Remove all entries from all shards in memory."""
+        for c in self.lang_shards():
+            c.clear()
 
+    def commit(self):
+        """Commit the shards that have unsaved changes. See Cache.commit().
         Returns:
-            a Cache.CommitReport named tuple, which is a triple of lists of 
-            (str, str) i.e. (word, lang) pairs. The first list is all keys in 
-            disk file that will be gone after a save. The second list is all 
-            keys in the disk cache that will be updated by values in memory. 
-            The third is all keys in memory that will be added to the disk cache.
-        Raises:
-            IOError
-            PickleError
-            potentially others. See  Python Library doc sec 12.1.3
+            self.
         """
-        
-        
-        f = open(self.file, 'rb')
-        
-        _, dict = pickle.load(f)
-            
-        fkeys = dict.keys()
-        mkeys = self.pers.keys()
-        f.close()
-        return Cache.CommitReport([k for k in fkeys if k not  in mkeys], 
-               [k for k in mkeys if k in fkeys],
-               [k for k in mkeys if not k in fkeys])
+        for c in self.shards.values():
+            if c.is_dirty():
+                c.commit()
+            elif c.matches is not None:
+                c.matches.commit()
+        return self
 
-    def not_ok(self, lang = None):
-        """A list of responses in the cash that are lacking the <analyses> 
-        document.
-        Arg:
-            'greek'. 'la', or None. If None, results for both languages are 
-            returned. Optional, default is None.
+    def commit_delta(self):
+        """Delta-commit the shards that have unsaved changes. See 
+        Cache.commit_delta().
         Returns:
-            list of ((word, lang), resp) pairs ((str, str), MorpheusResponse).
+            self.
         """
-        if lang is None:
+        for c in self.shards.values():
+            c.commit_delta()
+        return self
 
-            return [(k, resp) for (k, resp) in self.pers.items() if not resp.is_ok()]
-        else:
-            return[((w, l), resp) for ((w, l), resp)in self.pers.items() if (not resp.is_ok()) and (l == lang)]
-        
-    def filter(self, filter):
-        """A list of MorpheusResponses satisfying filter criteria.
-        Arg:
-            filter: a callable (method of MorpheusResponse, or lambda), 
-            returning bool.
+    def is_dirty(self):
+        """Are there changes not yet saved to disk (bool)?"""
+        return any([c.is_dirty() for c in self.shards.values()])
+
+    def commit_report(self):
+        """A report on how a call to commit() will change the shard files.
         Returns:
-            a list of MorpheusResponses.
-        Raises:
-            AttributeError if the filter calls an a non-existent method.
-        """ 
-        return [resp for resp in self.pers.values() if filter(resp)]    
-        
-    @classmethod
-    def default(cls):
-        """Create a cache with file named morpheuslib2.cache in the current
-        directory.
+            a Cache.CommitReport. See Cache.commit_report().
         """
-        return cls('morpheuslib2.cache')
+        rs = [c.commit_report() for c in self.shards.values()]
+        return Cache.CommitReport(sorted(sum([r[0] for r in rs], [])),
+                                  sorted(sum([r[1] for r in rs], [])),
+                                  sorted(sum([r[2] for r in rs], [])))
 
-    def triples(self, filter = None):
-        """A list of (word, lang, pickled response) triples.
+    def cached_words(self, lang = None):
+        """ The words stored in the shards of a language.
         Arg:
-            filter: a callable on the triple giving a bool. Optional, default is 
-                None.
-        """ 
-        if filter is None:
-            return [(w, l, pickle.dumps(resp)) for ((w, l), resp) in self.pers.items()]
-        else:
-            
-            return [(w, l, pickle.dumps(resp)) for ((w, l), resp) in self.pers.items() if filter(w, l, resp)]
-
-class Exporter(object):
-    def __init__(self, *core_features, betacode_mode = None):
-        """
-        Args:
-            features : names of core_features to extract. If inflectional is false,
-                include inflectional features here also.
-            inflectional: if True (default) all inflectional exported in order
-                by feature name; if False, only inflectional features in *features
-                are exported. Optional.
-            omit: names of features to omit frm export. Optional, default is []
-            betacode_mode: if 'lower', 'upper', or preserve, export form, lemma,
-            and extendedForm in Beta Code instead of Unicode (the Morpheus default).
-            Optional, default is False.
+            lang: 'greek' or 'la', or None for both (optional).
+        Returns:
+            list of (str, str) i.e. (word, lang) pairs.
         """
-        self.core_features = list(core_features)
-        self.unique = set()
-        self.vals = []
-        self.keys = []
-        self.betacode_mode = betacode_mode
-        
-    def __iter__(self):
-        return self.keys.__iter__()
+        return sum([list(c.pers.keys()) for c in self.lang_shards(lang)], [])
 
-    def __getitem__(self, key):
-        try:
-            i = self.keys.index(key)
-            return self.vals[i]
-        except ValueError:
-            raise KeyError(key)
-        
-    
-        
-    def set_analysis(self, analysis):
-        """Set the analysis to export.
+    def count(self, lang = None):
+        """The number of words in the shards of a language.
         Arg:
-            analysis: instance of Analysis.
-        Raises:
-            ValueError if a feature is not found among analysis's features.
+            lang: 'greek' or 'la', or None for both (optional).
+        Returns:
+            int.
         """
-        n = len(self.unique)
-        self.unique.add(analysis)
-        if len(self.unique) == n:
-            return False
-        else:
-            self.keys = self.core_features + analysis.inflectional_features()
-            if analysis.word.lang == 'greek'and self.betacode_mode is not None:
-                self.vals = [(UniGreek.to_betacode(analysis.get_feature(k)
-                                                   , self.betacode_mode).replace("'", r"\'") 
-                              if k in ['form', 'lemma', 'extendedForm'] 
-                              else analysis.get_feature(k)) for k in self.keys]
-            else:    
-                self.vals = [analysis.get_feature(k) for k in self.keys]
-            return True
-         
-    def json(self, omit = []):
-        """Export the analysis as JSON key:value pairs.
+        return sum([c.count(lang) for c in self.lang_shards(lang)])
+
+    def stats(self):
+        """The running counts of the shards loaded, summed, with the misses
+        on shards that do not exist.
         Returns:
-            str. If exporter was not initialized with an analysis, returns the 
-            string 'null'.
+            a Cache.Stats named tuple.
         """
-       
-        l = [(k, self.vals[k]) for k in self.keys if k not in omit]
-        return json.dumps(dict(l), ensure_ascii = False)
+        entries = collections.Counter()
+        nbytes = hits = inserts = 0
+        misses = self.misses
+        for c in self.shards.values():
+            entries.update(c.entries)
+            nbytes = nbytes + c.nbytes
+            hits = hits + c.hits
+            misses = misses + c.misses
+            inserts = inserts + c.inserts
+        return Cache.Stats(dict(entries), nbytes, hits, misses, inserts)
 
-    def prolog(self, functor, omit = []):
-        """A Prolog functor from this analysis."
-        
-        Default is to use the pos as a functor. Be sure to include 'pos' in the
-        features argument of the Exporter constructor if you want this as the
-        functor. Any functor arg that can't be found as a key will be used as 
-        the functor.
+    def triples(self, filter = None):
+        """A list of (word, lang, pickled response) triples from all shards.
         Arg:
-            functor: str.
+            filter: a callable (w, lang, resp) -> bool (optional).
+        """
+        return sum([c.triples(filter) for c in self.lang_shards()], [])
+
+    def iter_sorted(self):
+        """Iterate over all shards in key order.
         Returns:
-            str. 
+            iterator of (word, lang, pickled response) triples.
         """
-        #func = None
-        #try:
-            #func   = self[functor]
-        #except KeyError:
-            #func = functor
-        if functor[0] == '$':
-            func = self[functor[1:]]
-        else:
-            func = functor
-        vs = [self[k] for k in self.keys if not k in omit]    
-        vx = [special_str(v, 'none') for v in vs]
-        return func + '(' + ','.join(vx) + ')'
+        return heapq.merge(*[c.iter_sorted() for c in self.lang_shards()])
 
-    def oz(self, omit = []):
-        """A string for importing as an Oz language record."""
-        
-        vx = [special_str(self.vals[k], 'none') for k in self.keys if not k in omit]
-        return '|'.join(['analysis', ':'.join(self.keys), ':'.join(vx)])
+class MorphDictionary(object):
+    """A read-only dictionary of attested forms, compiled from a cache.
 
-class DbCache(object):
-    """A cache implemented in the Sqlite database.
-    
-    The database has one table whose primary key is the (word, lang) pair used
-    in the file system cache dictionary. The MorpheusResponse is pickled and placed
-    in an Sqlite BLOB column.
+    Keys are the (url form, lang) pairs of the caches, kept sorted and 
+    looked up by bisection. Each key has a tuple of record numbers; a record
+    is the (tags, values, lang, lemma_sfx) of an analysis, stored once 
+    however many keys share it. Only the OK responses of the cache are 
+    compiled. Use as a first resolver before the cache and the Morpheus 
+    service, see MorpheusUrl.fetch() and analyze().
     Attributes:
-        cnx: sqlite3.Connection
+        keys: sorted list of (str, str)
+        entries: tuple of record numbers for each key (list of tuple)
+        records: list of (tags, values, lang, lemma_sfx) tuples
+        compiled: when the dictionary was compiled (datetime).
     """
-    def __init__(self, file):
-        """Creates the cache table in the database at file, if it doesn't exist.
+    def __init__(self, keys = None, entries = None, records = None, 
+                 compiled = None):
+        self.keys = [] if keys is None else keys
+        self.entries = [] if entries is None else entries
+        self.records = [] if records is None else records
+        self.compiled = compiled
+
+    def __str__(self):
+        return "morpheuslib2.MorphDictionary of %d forms, %d analyses" % \
+            (len(self.keys), len(self.records))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def compile(cls, cache):
+        """Compile the OK responses of a cache.
         Arg:
-           file name (for relative location) or path + file name (for absolute
-                location.
-        Effect:
-            creates an opn connection to the cache database.
+            cache: Cache, DbCache, SnapshotCache or ShardedCache.
+        Returns:
+            MorphDictionary.
         """
-        self.cnx = sqlite3.connect(file)
-        try:
-            self.cnx.execute("select * from cache")
-        except sqlite3.OperationalError:
-            self.cnx.execute("create table cache(word TEXT, lang TEXT, resp BLOB, primary key(word, lang))")  
-        
-    def insert(self, resp):
-        """Insert the argument into the cache table.
-        Arg:
-            resp: MorpheusResponse.
-        Raises:
-            sqlite3.IntegrityError if the key (word, lang) is already in the
-            database.
+        d = cls(compiled = datetime.datetime.now())
+        ids = {}
+        strs = {}
+        s = lambda x: None if x is None else strs.setdefault(x, sys.intern(x))
+        for (w, l, r) in cache.iter_sorted():
+            resp = pickle.loads(r)
+            if not resp.is_ok() or resp.text is None:
+                continue
+            nos = []
+            for a in AnalysisList(resp.text, None):
+                rec = (tuple([s(t) for t in a.tags]), 
+                       tuple([s(v) for v in a.values]), s(a.lang), 
+                       s(a.lemma_sfx))
+                i = ids.get(rec)
+                if i is None:
+                    i = len(d.records)
+                    d.records.append(rec)
+                    ids[rec] = i
+                nos.append(i)
+            d.keys.append((w, l))
+            d.entries.append(tuple(nos))
+        if any([d.keys[i] > d.keys[i + 1] for i in range(len(d.keys) - 1)]):
+            ks = sorted(range(len(d.keys)), key = lambda i: d.keys[i])
+            d.keys = [d.keys[i] for i in ks]
+            d.entries = [d.entries[i] for i in ks]
+        return d
+
+    def save(self, file):
+        """Save the dictionary.
+        Effect:
+            creates or replaces file.
         Returns:
             self.
         """
-        # c = self.cnx.cursor()
-        # w = resp.word()
-        # r = pickle.dumps(resp)
-        # t = (url_form(w.word, w.lang, w.greek_mode), w.lang, r)
-        w, l = resp.word().key_pair()
-        self.cnx.execute('insert into cache values (?,?,?)', (w, l, pickle.dumps(resp)))
-        self.cnx.commit()
+        tmp = file + '.tmp'
+        f = open(tmp, 'wb')
+        pickle.dump((self.keys, self.entries, self.records, self.compiled), f)
+        f.close()
+        os.replace(tmp, file)
         return self
 
-    def cache(self, resp):
-        """A 'no-fault' method like Cache.cache(), if the key is in the table, 
-        an update is done, otherwise an insert.
-        Arg:
-            resp: MorpheusResponse.
+    @classmethod
+    def load(cls, file):
+        """Load a dictionary saved by save().
         Returns:
-            self.
+            MorphDictionary.
         Raises:
-            other exception.
-        """
-        try:
-            self.insert(resp)
-        except sqlite3.IntegrityError:
-            self.update(resp)
-        except Exception as exn:
-            raise exn
-    
-    def close(self):
-        """Close this instance's connection.
-        Effect:
-            instance is no longer usable.
+            IOError if the file can't be read.
         """
-        self.cnx.close()
+        f = open(file, 'rb')
+        (keys, entries, records, compiled) = pickle.load(f)
+        f.close()
+        return cls(keys, entries, records, compiled)
 
-    def count(self, lang = None):
-        """A count of the responses currently in the cache.
+    def find(self, key):
+        """The records of a key.
         Arg:
-            lang: 'greek' or 'la' (optional). If omitted, count for both languages.
+            key: (word, lang) pair.
         Returns:
-            int.
+            tuple of records, or None if the key is not found.
         """
-        if lang is None:
-            (n,) = self.cnx.execute("select count(*) from cache").fetchone()
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return tuple([self.records[j] for j in self.entries[i]])
         else:
-            (n,) = self.cnx.execute("select count(*) from cache where lang = ?", (lang,)).fetchone()
-        return n
- 
-    def lookup_word(self, word):
-        """Lookup the word in this cache.
-        Arg:
-            instance of Word.
-        Returns:
-            MorpheusResponse.
-        """
-        t = word.key_pair()
-        r = self.cnx.execute("select resp from cache where word = ? and lang = ?", t).fetchone()
-        if r is None:
-            return r
-        else:  
-            return pickle.loads(r[0])
+            return None
 
-    def zap(self):
-        """Erase this cache's data table.
-        Effect:
-            immediate and cannot be rolled back. Does not drop the cache table.
+    def lookup_url(self, url):
+        """Look up a MorpheusUrl.
         Returns:
-            self.
+            DictResponse, or None if its key is not found.
         """
-        self.cnx.execute("delete from cache")
-        return self
+        recs = self.find(url.key)
+        if recs is None:
+            return None
+        else:
+            return DictResponse(url, recs, self.compiled)
 
-    def update(self, resp):
-        """Replace the response currently keyed to the argument's (word, lang)
-        pair with the argument.
-        Arg:
-            MorpheusResponse.
+    def lookup_word(self, word):
+        """Look up a Word.
         Returns:
-            self.
+            DictResponse, or None if the word is not found.
         """
-        w, l = resp.word().key_pair()
-        self.cnx.execute("update cache set resp = ? where word = ? and lang = l", (pickle.dumps(resp), w, l))
-        self.cnx.commit()
-        return self
-
-    def import_cache(self, cache, filter = None):
-        """Import responses from a cache into this database.
-        Args:
-            cache: instance of class Cache.
-            filter: a callable (w, lang, resp) -> bool.
-        Raises:
-            sqlite3.IntegrityError if a key violation would result from any
-            insert operation.
-        """ 
-        self.cnx.executemany("insert into cache values (?,?,?)", cache.triples(filter)) 
-        self.cnx.commit()
+        return self.lookup_url(MorpheusUrl(word))
 
-    @classmethod
-    def default(cls):
-        return cls('morpheuslib2.dbcache')
+def analyze(word, cache = None, dictionary = None, matched = False, 
+            fixes = ()):
+    """The analyses of a word, from a dictionary, a cache or the Morpheus
+    service, tried in that order.
+    Args:
+        word: Word
+        cache: Cache, DbCache, SnapshotCache or ShardedCache (optional)
+        dictionary: MorphDictionary (optional)
+        matched: return only the analyses that match the word (optional, 
+            default is False). A spelling seen before is then served by the
+            cache's match index, if it has one, without filtering
+        fixes: names of fixes to apply, see Analysis.fix() (optional). The
+            fixed analyses of a response are memoized, see FixPipeline.
+    Returns:
+        AnalysisList, empty if the fetch failed.
+    Raises:
+        urllib.error.URLError
+    """
+    al = None
+    if matched and dictionary is None and cache is not None:
+        al = cache.lookup_matched(word)
+    if al is None:
+        resp = MorpheusUrl(word).fetch(cache, dictionary)
+        if not resp.is_ok():
+            return AnalysisList(None, word)
+        elif not matched:
+            return FixPipeline.get(*fixes).analysis_list(resp, word)
+        elif cache is not None and not isinstance(resp, DictResponse):
+            # The response is now cached: make its match index entry.
+            al = cache.lookup_matched(word)
+        if al is None:
+            al = resp.matched_list(word)
+    if fixes:
+        al.fix(*fixes)
+    return al
@@ -0,0 +1,114 @@
+""" support.py
+    Canned Morpheus documents and helpers shared by the tests, so that they
+    run without the Morpheus service.
+"""
+import json
+import pickle
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import morpheuslib2
+
+HEAD = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+# A Latin word with a noun, a verb and a participle analysis.
+LATIN = HEAD + '''<analyses>
+<analysis><form lang="la">{w}</form><lemma>{w}o1</lemma><expandedForm>{w}</expandedForm><pos>noun</pos><number>sg</number><gender>fem</gender><case>nom</case><dialect></dialect><feature></feature></analysis>
+<analysis><form lang="la">{w}</form><lemma>{w}o</lemma><expandedForm>{w}</expandedForm><pos>verb</pos><person>3rd</person><number>sg</number><tense>pres</tense><mood>ind</mood><voice>act</voice><dialect></dialect><feature></feature></analysis>
+<analysis><form lang="la">{w}</form><lemma>{w}o</lemma><expandedForm>{w}</expandedForm><pos>part</pos><number>sg</number><tense>pres</tense><gender>masc</gender><case>abl</case><dialect></dialect><feature></feature></analysis>
+</analyses>'''
+
+# Two noun analyses of one form, one with an empty <case/>.
+ROSA = HEAD + '''<analyses>
+<analysis><form lang="la">rosa</form><lemma>rosa</lemma><expandedForm>rosa</expandedForm><pos>noun</pos><number>sg</number><gender>fem</gender><case/><dialect></dialect><feature></feature></analysis>
+<analysis><form lang="la">rosa</form><lemma>rosa</lemma><expandedForm>rosa</expandedForm><pos>noun</pos><number>sg</number><gender>fem</gender><case>nom</case><dialect></dialect><feature></feature></analysis>
+</analyses>'''
+
+# A Greek word; the second analysis has an unaccented form.
+GREEK = HEAD + '''<analyses>
+<analysis><form lang="greek">μηρύσαντο</form><lemma>μηρύομαι</lemma><expandedForm>μηρύσαντο</expandedForm><pos>verb</pos><person>3rd</person><number>pl</number><tense>aor</tense><mood>ind</mood><voice>mid</voice><dialect>homeric ionic</dialect><feature>unaugmented</feature></analysis>
+<analysis><form lang="greek">μηρυσαντο</form><lemma>μηρύομαι</lemma><expandedForm>μηρύσαντο</expandedForm><pos>verb</pos><person>3rd</person><number>pl</number><tense>aor</tense><mood>ind</mood><voice>mid</voice><dialect>homeric ionic</dialect><feature>unaugmented</feature></analysis>
+</analyses>'''
+
+
+def fixture(name):
+    """ The rows of a JSON fixture in the tests directory.
+    Arg:
+        name: the file name (str).
+    Returns:
+        list of lists.
+    """
+    f = open(os.path.join(ROOT, 'tests', name), encoding = 'utf-8')
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+
+def word(w, lang = 'la'):
+    """ A Word without a textual context.
+    Args:
+        w: str
+        lang: 'la' or 'greek' (optional, default is 'la').
+    Returns:
+        morpheuslib2.Word.
+    """
+    return morpheuslib2.Word.from_str(w, lang,
+                                      'unicode' if lang == 'greek' else None)
+
+
+def response(w, lang = 'la', doc = None, ok = True):
+    """ A MorpheusResponse for a word, as if fetched.
+    Args:
+        w: str
+        lang: 'la' or 'greek' (optional, default is 'la')
+        doc: the document text (optional, default is LATIN for Latin
+            words and GREEK for Greek ones)
+        ok: did the fetch succeed (optional, default is True)?
+    Returns:
+        a (morpheuslib2.MorpheusResponse, morpheuslib2.Word) pair.
+    """
+    wd = word(w, lang)
+    if doc is None:
+        doc = GREEK if lang == 'greek' else LATIN.format(w = w)
+    u = morpheuslib2.MorpheusUrl(wd)
+    if ok:
+        return (morpheuslib2.MorpheusResponse(u, doc.encode('utf-8'), None),
+                wd)
+    else:
+        return (morpheuslib2.MorpheusResponse(u, None, 'error'), wd)
+
+
+def responses(ws, lang = 'la'):
+    """ Responses for a list of words.
+    Returns:
+        list of morpheuslib2.MorpheusResponse.
+    """
+    return [response(w, lang)[0] for w in ws]
+
+
+def temp_dir(test):
+    """ A directory removed when a test is done.
+    Arg:
+        test: unittest.TestCase.
+    Returns:
+        str.
+    """
+    d = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, d)
+    return d
+
+
+def contents(cache):
+    """ The keys and documents of a cache of any kind.
+    Returns:
+        dict of (word, lang) -> bytes.
+    """
+    return dict([((w, l), pickle.loads(r).text) 
+                 for (w, l, r) in cache.iter_sorted()])
@@ -0,0 +1,138 @@
+""" Tests of saving and sharing morpheuslib2.Cache files."""
+import multiprocessing
+import os
+import unittest
+
+import support
+import morpheuslib2 as m
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.file = os.path.join(support.temp_dir(self), 'test.cache')
+
+    def test_commit_and_reload(self):
+        ca = m.Cache(self.file)
+        self.assertEqual(ca.status, 'new cache')
+        for r in support.responses(['amat', 'orat']):
+            ca.cache(r)
+        self.assertTrue(ca.is_dirty())
+        ca.commit()
+        self.assertFalse(ca.is_dirty())
+        cb = m.Cache(self.file)
+        self.assertEqual(cb.status, 'reopened cache')
+        self.assertEqual(support.contents(cb), support.contents(ca))
+        self.assertEqual(cb.nbytes, ca.nbytes)
+        self.assertEqual(cb.entries, ca.entries)
+
+    def test_commit_delta_and_reload(self):
+        ca = m.Cache(self.file)
+        for r in support.responses(['amat', 'orat']):
+            ca.cache(r)
+        ca.commit()
+        ca.cache(support.response('errat')[0])
+        ca.uncache_word(support.word('orat'))
+        ca.commit_delta()
+        self.assertFalse(ca.is_dirty())
+        self.assertTrue(os.path.exists(ca.delta_file))
+        cb = m.Cache(self.file)
+        self.assertEqual(sorted(cb.pers), [('amat', 'la'), ('errat', 'la')])
+        self.assertEqual(support.contents(cb), support.contents(ca))
+        cb.commit()
+        self.assertFalse(os.path.exists(cb.delta_file))
+        self.assertEqual(support.contents(m.Cache(self.file)),
+                         support.contents(ca))
+
+    def test_commit_report(self):
+        ca = m.Cache(self.file)
+        for r in support.responses(['amat', 'orat']):
+            ca.cache(r)
+        ca.commit()
+        ca.cache(support.response('amat')[0])
+        ca.cache(support.response('errat')[0])
+        ca.uncache_word(support.word('orat'))
+        self.assertEqual(ca.commit_report(), 
+                         m.Cache.CommitReport([('orat', 'la')], 
+                                              [('amat', 'la')],
+                                              [('errat', 'la')]))
+
+
+def write_shared(file, ws, db):
+    """ Cache responses for words one at a time in a shared cache, saving
+        each at once, as a separate process would.
+    """
+    if db:
+        ca = m.DbCache(file, shared = True)
+    else:
+        ca = m.Cache(file, shared = True)
+    for r in support.responses(ws):
+        ca.cache(r)
+        if not db:
+            ca.commit_delta()
+    if db:
+        ca.close()
+
+
+class SharedCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = support.temp_dir(self)
+        self.file = os.path.join(self.dir, 'test.cache')
+        m.Cache(self.file).commit()
+
+    def run_writers(self, file, db = False):
+        """ Two processes writing 40 words each to one cache.
+        Returns:
+            the words written (set of str).
+        """
+        ws = [['a%02dat' % i for i in range(40)], 
+              ['o%02dat' % i for i in range(40)]]
+        ctx = multiprocessing.get_context('fork')
+        ps = [ctx.Process(target = write_shared, args = (file, w, db))
+              for w in ws]
+        for p in ps:
+            p.start()
+        for p in ps:
+            p.join()
+            self.assertEqual(p.exitcode, 0)
+        return set(ws[0] + ws[1])
+
+    def test_two_writers(self):
+        ws = self.run_writers(self.file)
+        ca = m.Cache(self.file)
+        self.assertEqual(set([w for (w, _) in ca.pers]), ws)
+        for w in ws:
+            self.assertEqual(ca.lookup_word(support.word(w)).text,
+                             support.LATIN.format(w = w).encode('utf-8'))
+
+    def test_two_db_writers(self):
+        file = os.path.join(self.dir, 'test.db')
+        m.DbCache(file, shared = True).close()
+        ws = self.run_writers(file, True)
+        db = m.DbCache(file)
+        self.addCleanup(db.close)
+        self.assertEqual(db.count(), len(ws))
+
+    def test_interleaved_writers(self):
+        a = m.Cache(self.file, shared = True)
+        b = m.Cache(self.file, shared = True)
+        (old, w) = support.response('amat')
+        new = support.response('amat')[0]
+        a.cache(support.response('orat')[0])
+        a.cache(old)
+        a.commit_delta()
+        self.assertIsNotNone(b.lookup_word(support.word('orat')))
+        b.cache(new)
+        b.commit()
+        a.cache(support.response('errat')[0])
+        a.commit_delta()
+        self.assertEqual(a.lookup_word(w).fetched, new.fetched)
+        c = m.Cache(self.file)
+        self.assertEqual(sorted(c.pers), 
+                         [('amat', 'la'), ('errat', 'la'), ('orat', 'la')])
+        self.assertEqual(c.lookup_word(w).fetched, new.fetched)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+""" Tests of morpheuslib2.FixPipeline and its use by AnalysisList,
+    AnalysisTable and analyze().
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import support
+import morpheuslib2 as m
+
+FIXES = ('lemma', 'part', 'mood', 'form')
+
+
+class CountingPipeline(object):
+    """ Counts the calls of fix_record() on a pipeline."""
+    def __init__(self, p):
+        self.p = p
+        self.calls = 0
+        self.orig = p.fix_record
+
+    def __enter__(self):
+        def counted(*args):
+            self.calls = self.calls + 1
+            return self.orig(*args)
+        self.p.fix_record = counted
+        return self
+
+    def __exit__(self, *exc):
+        del self.p.fix_record
+
+
+class FixPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        m.FixPipeline.revision = m.FixPipeline.revision + 1
+        self.p = m.FixPipeline.get(*FIXES)
+
+    def keys(self, al):
+        return [a.key() for a in al]
+
+    def test_memo_matches_apply(self):
+        for (w, lang) in [('amat', 'la'), ('μηρύσαντο', 'greek')]:
+            (resp, wd) = support.response(w, lang)
+            applied = m.AnalysisList(resp.text, wd)
+            for a in applied:
+                self.p.apply(a)
+            al = resp.make_analysis_list(wd).fix(*FIXES)
+            self.assertEqual(self.keys(al), self.keys(applied))
+            self.assertEqual(self.keys(self.p.analysis_list(resp, wd)),
+                             self.keys(applied))
+
+    def test_second_lookup_does_not_refix(self):
+        (resp, wd) = support.response('amat')
+        with CountingPipeline(self.p) as c:
+            self.p.records(resp)
+            self.assertEqual(c.calls, 3)
+            self.p.records(resp)
+            resp.make_analysis_list(wd).fix(*FIXES)
+            t = m.AnalysisTable(m.FeatureSchema())
+            t.add_response(wd, resp, matched = False, fixes = FIXES)
+            self.assertEqual(c.calls, 3)
+
+    def test_analyze_from_cache_does_not_refix(self):
+        (resp, wd) = support.response('amat')
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d)
+        ca = m.Cache(os.path.join(d, 'test.cache'), matches = True)
+        ca.cache(resp)
+        with CountingPipeline(self.p) as c:
+            first = m.analyze(wd, ca, fixes = FIXES)
+            second = m.analyze(support.word('amat'), ca, fixes = FIXES)
+            matched = m.analyze(wd, ca, matched = True, fixes = FIXES)
+            self.assertEqual(c.calls, 3)
+        self.assertEqual(self.keys(first), self.keys(second))
+        self.assertEqual(len(matched), 3)
+
+    def test_changed_list_is_fixed_in_place(self):
+        (resp, wd) = support.response('amat')
+        al = resp.make_analysis_list(wd).retain(pos = 'verb')
+        self.assertIsNone(al.resp)
+        with CountingPipeline(self.p) as c:
+            al.fix(*FIXES)
+            self.assertEqual(c.calls, 1)
+
+    def test_memo_is_bounded(self):
+        size = m.FixPipeline.memo_size
+        m.FixPipeline.memo_size = 2
+        try:
+            for w in ['amat', 'laudat', 'rogat']:
+                self.p.records(support.response(w)[0])
+            self.assertEqual(len(self.p.memo), 2)
+        finally:
+            m.FixPipeline.memo_size = size
+
+    def test_revision_compiles_new_pipeline(self):
+        m.FixPipeline.revision = m.FixPipeline.revision + 1
+        self.assertIsNot(m.FixPipeline.get(*FIXES), self.p)
+
+
+if __name__ == '__main__':
+    unittest.main()
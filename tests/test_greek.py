@@ -0,0 +1,59 @@
+""" Tests of the Greek conversions of morpheuslib2, against the output of
+    the character at a time conversions they replaced. A null expected value
+    means that the conversion raises IndexError.
+"""
+import unittest
+
+import support
+import morpheuslib2 as m
+
+
+class BetaCodeTest(unittest.TestCase):
+    """ betacode.json: BetaCode input, lunate, Unicode output."""
+
+    def setUp(self):
+        self.rows = support.fixture('betacode.json')
+
+    def test_to_unicode(self):
+        for (s, lunate, u) in self.rows:
+            if u is None:
+                self.assertRaises(IndexError, m.BetaCode.to_unicode, s,
+                                  lunate)
+            else:
+                self.assertEqual(m.BetaCode.to_unicode(s, lunate), u, s)
+
+    def test_convert_many(self):
+        for lunate in [False, True]:
+            rows = [(s, u) for (s, l, u) in self.rows 
+                    if l == lunate and u is not None]
+            self.assertEqual(m.BetaCode.convert_many([s for (s, _) in rows],
+                                                     lunate),
+                             [u for (_, u) in rows])
+
+
+class UniGreekTest(unittest.TestCase):
+    """ unigreek.json: Unicode input, mode, BetaCode output."""
+
+    def setUp(self):
+        self.rows = support.fixture('unigreek.json')
+
+    def test_to_betacode(self):
+        for (s, mode, b) in self.rows:
+            if b is None:
+                self.assertRaises(IndexError, m.UniGreek.to_betacode, s, 
+                                  mode)
+            else:
+                self.assertEqual(m.UniGreek.to_betacode(s, mode), b, s)
+                self.assertEqual(m.UniGreek.to_betacode_slow(s, mode), b, s)
+
+    def test_to_betacode_many(self):
+        for mode in ['upper', 'lower', 'preserve']:
+            rows = [(s, b) for (s, x, b) in self.rows 
+                    if x == mode and b is not None]
+            self.assertEqual(m.UniGreek.to_betacode_many(
+                                 [s for (s, _) in rows], mode),
+                             [b for (_, b) in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+""" Tests of morpheuslib2.LexiconIndex."""
+import unittest
+
+import support
+import morpheuslib2 as m
+
+
+class LexiconIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lex = m.LexiconIndex()
+
+    def test_paradigm_with_empty_feature(self):
+        (resp, _) = support.response('rosa', doc = support.ROSA)
+        self.lex.add(resp)
+        p = self.lex.paradigm('rosa')
+        self.assertEqual(list(p), ['rosa'])
+        self.assertEqual([dict(fs).get('case') for (_, fs) in p['rosa']],
+                         [None, 'nom'])
+
+    def test_paradigm_finds_suffixed_lemmas(self):
+        self.lex.add(support.response('amat')[0])
+        p = self.lex.paradigm('amato')
+        self.assertEqual(list(p), ['amat'])
+        self.assertEqual([pos for (pos, _) in p['amat']],
+                         ['noun', 'part', 'verb'])
+
+    def test_remove(self):
+        (resp, wd) = support.response('amat')
+        self.lex.add(resp)
+        self.lex.remove(wd.key_pair())
+        self.assertEqual(len(self.lex), 0)
+        self.assertEqual(self.lex.paradigm('amato'), {})
+        self.assertEqual(self.lex.lemmas_of('amat'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
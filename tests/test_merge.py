@@ -0,0 +1,123 @@
+""" Tests of morpheuslib2.merge_caches()."""
+import os
+import unittest
+
+import support
+import morpheuslib2 as m
+
+KINDS = ['pickle', 'sqlite', 'snapshot', 'sharded']
+
+
+def newer(w):
+    """ A response fetched after the ones of support.response(), with its
+        own document.
+    """
+    doc = support.LATIN.format(w = w).replace('<pos>part</pos>', 
+                                               '<pos>adj</pos>')
+    return support.response(w, doc = doc)[0]
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = support.temp_dir(self)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def make(self, kind, name, resps):
+        """ A cache file of a kind holding some responses.
+        Returns:
+            the file name (str).
+        """
+        if kind == 'pickle':
+            f = self.path(name + '.cache')
+            ca = m.Cache(f)
+            for r in resps:
+                ca.cache(r)
+            ca.commit()
+        elif kind == 'sqlite':
+            f = self.path(name + '.db')
+            ca = m.DbCache(f)
+            for r in resps:
+                ca.cache(r)
+            ca.close()
+        elif kind == 'snapshot':
+            f = self.path(name + '.snap')
+            ca = m.Cache(self.path(name + '.tmp.cache'))
+            for r in resps:
+                ca.cache(r)
+            m.SnapshotCache.freeze(ca, f)
+        else:
+            f = self.path(name)
+            ca = m.ShardedCache(f, 4)
+            for r in resps:
+                ca.cache(r)
+            ca.commit()
+        self.assertEqual(m.cache_kind(f), kind)
+        return f
+
+    def contents(self, f):
+        ca = m.open_cache(f)
+        try:
+            return support.contents(ca)
+        finally:
+            if hasattr(ca, 'close'):
+                ca.close()
+
+    def sources(self):
+        """ One source of each kind, with overlapping keys.
+        Returns:
+            the files, and the expected contents of the merge.
+        """
+        srcs = [self.make('pickle', 'p', support.responses(['amat', 'orat'])),
+                self.make('sqlite', 'q', [newer('orat')] + 
+                          support.responses(['errat'])),
+                self.make('snapshot', 's', support.responses(['laudat'])),
+                self.make('sharded', 'h', 
+                          [support.response('μηρύσαντο', 'greek')[0], 
+                           newer('amat')])]
+        want = {}
+        for f in srcs:
+            want.update(self.contents(f))
+        return (srcs, want)
+
+    def test_merge_into_each_kind(self):
+        (srcs, want) = self.sources()
+        self.assertEqual(len(want), 5)
+        self.assertEqual(want[('orat', 'la')], newer('orat').text)
+        self.assertEqual(want[('amat', 'la')], newer('amat').text)
+        for kind in KINDS:
+            f = self.path('target.' + kind)
+            self.assertEqual(m.merge_caches(srcs, f, kind), 5)
+            self.assertEqual(m.cache_kind(f), kind)
+            self.assertEqual(self.contents(f), want, kind)
+
+    def test_kind_by_extension(self):
+        (srcs, want) = self.sources()
+        for (name, kind) in [('t.snap', 'snapshot'), ('t.db', 'sqlite'),
+                             ('t.cache', 'pickle')]:
+            m.merge_caches(srcs, self.path(name))
+            self.assertEqual(m.cache_kind(self.path(name)), kind)
+        self.assertRaises(ValueError, m.merge_caches, srcs, 
+                          self.path('t.x'), 'zip')
+
+    def test_target_is_source(self):
+        resps = support.responses(['amat', 'orat', 'errat'])
+        for kind in KINDS:
+            f = self.make(kind, 'same', resps)
+            want = self.contents(f)
+            self.assertEqual(len(want), 3)
+            self.assertEqual(m.merge_caches([f], f, kind), 3, kind)
+            self.assertEqual(self.contents(f), want, kind)
+
+    def test_target_is_one_of_the_sources(self):
+        (srcs, want) = self.sources()
+        for f in srcs:
+            kind = m.cache_kind(f)
+            self.assertEqual(m.merge_caches(srcs, f, kind), 5, kind)
+            self.assertEqual(self.contents(f), want, kind)
+
+
+if __name__ == '__main__':
+    unittest.main()
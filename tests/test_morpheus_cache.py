@@ -0,0 +1,95 @@
+""" Tests of the persistent cache of morpheus.py."""
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+import support
+import morpheus
+import morpheuslib
+
+
+def doc(w):
+    """ A Latin document for a word (bytes)."""
+    return support.LATIN.format(w = w).encode('utf-8')
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+        morpheuslib.MorpheusUrl.base = 'http://localhost/'
+        self.fetched = []
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def word(self, w):
+        return morpheuslib.Word('test', w, 'la', 0, 0, 0)
+
+    def warm(self, counts, budget):
+        """ Cache.warm(), with the documents fetched from self.docs."""
+        def fetch(url):
+            self.fetched.append(url.word.word)
+            return morpheuslib.Analyses(self.docs[url.word.word], url.word)
+        words = dict([(k, self.word(k)) for k in counts])
+        with unittest.mock.patch.object(morpheuslib.MorpheusUrl, 'fetch',
+                                        fetch):
+            return self.ca.warm(counts, words, 10, budget)
+
+    def test_warm_fetches_only_what_may_fit(self):
+        self.ca = morpheus.Cache('la')
+        self.ca.pers = {'amat': doc('amat'), 'big': doc('big') * 4}
+        self.docs = {'orat': doc('orat')}
+        counts = collections.Counter({'big': 5, 'amat': 4, 'orat': 3})
+        n = len(doc('amat'))
+        ks = self.warm(counts, 2 * n)
+        self.assertEqual(ks, ['amat', 'orat'])
+        self.assertEqual(self.fetched, ['orat'])
+        self.assertIn('big', self.ca.vola)
+        self.assertEqual(self.ca.size('pers'), 2 * n)
+
+        self.fetched = []
+        ks = self.warm(counts, n)
+        self.assertEqual(ks, ['amat'])
+        self.assertEqual(self.fetched, [])
+
+    def test_warm_keeps_fetched_documents(self):
+        self.ca = morpheus.Cache('la')
+        self.docs = {'amat': doc('amat'), 'laudat': doc('laudat') * 2}
+        counts = collections.Counter({'laudat': 2, 'amat': 1})
+        ks = self.warm(counts, len(doc('amat')) + 1)
+        self.assertEqual(ks, ['amat'])
+        self.assertEqual(self.ca.vola['laudat'], self.docs['laudat'])
+        self.assertEqual(sorted(self.fetched), ['amat', 'laudat'])
+
+    def test_adapt_caps_by_size(self):
+        self.ca = morpheus.Cache('la')
+        self.ca.pers = {'amat': doc('amat'), 'orat': doc('orat'), 
+                        'errat': None}
+        self.ca.vola = {'laudat': doc('laudat')}
+        self.ca.hits = {'amat': 9, 'orat': 2, 'errat': 1, 'laudat': 5}
+        (up, down) = self.ca.adapt(5, len(doc('amat')) + len(doc('laudat')))
+        self.assertEqual(up, ['laudat'])
+        self.assertEqual(down, ['orat'])
+        self.assertEqual(sorted(self.ca.pers), ['amat', 'errat', 'laudat'])
+        self.assertEqual(self.ca.vola, {'orat': doc('orat')})
+
+    def test_hits_decay(self):
+        self.ca = morpheus.Cache('la')
+        self.ca.pers = {'amat': doc('amat')}
+        self.ca.hits = {'amat': 3, 'orat': 4, 'errat': 1}
+        self.ca.save()
+        self.assertEqual(self.ca.hits, {'amat': 3, 'orat': 2})
+        self.ca.lookup(self.word('amat'))
+        self.ca.save()
+        self.assertEqual(morpheus.Cache('la').hits, {'amat': 4, 'orat': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
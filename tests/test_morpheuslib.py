@@ -0,0 +1,52 @@
+""" Tests of morpheuslib.Analyses."""
+import unittest
+
+import support
+import morpheuslib
+
+
+class AnalysesTest(unittest.TestCase):
+
+    def analyses(self, w, doc = None, chunk = None):
+        if doc is None:
+            doc = support.LATIN.format(w = w)
+        ans = morpheuslib.Analyses(doc.encode('utf-8'), 
+                                   morpheuslib.Word('test', w, 'la', 0, 0, 0))
+        if chunk is not None:
+            ans.pending = ans.parse_elements(chunk)
+        return ans
+
+    def test_count_before_iteration(self):
+        ans = self.analyses('amat')
+        self.assertEqual(ans.count(), 3)
+        self.assertEqual(len(list(ans)), 3)
+        self.assertEqual(ans.count(), 3)
+
+    def test_count_during_iteration(self):
+        for chunk in [16, 8192]:
+            ans = self.analyses('amat', chunk = chunk)
+            next(ans)
+            self.assertEqual(ans.count(), 3)
+            self.assertEqual(len(list(ans)), 2)
+
+    def test_count_with_unretained(self):
+        ans = self.analyses('rosa', support.LATIN.format(w = 'rosam'))
+        self.assertEqual(len(list(ans)), 0)
+        self.assertEqual(ans.count(), len(ans.non_ret))
+
+    def test_elements_are_dropped(self):
+        ans = self.analyses('amat', chunk = 16)
+        list(ans)
+        self.assertEqual(len(ans.els), 0)
+        self.assertEqual(len(ans.root), 0)
+        self.assertEqual(ans.count(), 3)
+
+    def test_count_ignores_comments(self):
+        doc = support.LATIN.format(w = 'amat').replace(
+            '<analyses>', '<analyses><!-- <analysis> -->', 1)
+        ans = self.analyses('amat', doc)
+        self.assertEqual(ans.count(), len(list(ans)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+""" Tests of morpheuslib2.ShardedCache."""
+import os
+import unittest
+
+import support
+import morpheuslib2 as m
+
+
+class ShardedCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = os.path.join(support.temp_dir(self), 'shards')
+
+    def files(self):
+        return sorted([f for f in os.listdir(self.dir) if f != 'shards'])
+
+    def test_lookup_in_missing_shard(self):
+        sc = m.ShardedCache(self.dir, 4)
+        w = support.word('amat')
+        self.assertIsNone(sc.lookup_word(w))
+        self.assertIsNone(sc.lookup_matched(w))
+        self.assertIsNone(sc.uncache_word(w))
+        self.assertRaises(KeyError, sc.__getitem__, w.key_pair())
+        self.assertEqual(sc.misses, 2)
+        self.assertEqual(sc.stats().misses, 2)
+        self.assertEqual(self.files(), [])
+        self.assertEqual(sc.count(), 0)
+        self.assertEqual(list(sc.iter_sorted()), [])
+        sc.commit()
+        self.assertEqual(self.files(), [])
+
+    def test_lookup_in_other_shard(self):
+        sc = m.ShardedCache(self.dir, 4)
+        (r, w) = support.response('amat')
+        sc.cache(r)
+        sc.commit()
+        others = [x for x in ['a%02dat' % i for i in range(20)]
+                  if sc.shard_no((x, 'la')) != sc.shard_no(w.key_pair())]
+        sc = m.ShardedCache(self.dir)
+        self.assertIsNone(sc.lookup_word(support.word(others[0])))
+        self.assertEqual(sc.misses, 1)
+        self.assertEqual(self.files(), 
+                         [os.path.basename(sc.shard_file(
+                             'la', sc.shard_no(w.key_pair())))])
+
+    def test_commit_and_reload(self):
+        sc = m.ShardedCache(self.dir, 4)
+        rs = support.responses(['a%02dat' % i for i in range(20)])
+        rs.append(support.response('μηρύσαντο', 'greek')[0])
+        for r in rs:
+            sc.cache(r)
+        self.assertTrue(sc.is_dirty())
+        sc.commit()
+        self.assertFalse(sc.is_dirty())
+        tb = m.ShardedCache(self.dir, 16)
+        self.assertEqual(tb.n, 4)
+        self.assertEqual(tb.count(), 21)
+        self.assertEqual(tb.count('greek'), 1)
+        self.assertEqual(support.contents(tb), 
+                         dict([(r.key(), r.text) for r in rs]))
+        tb.uncache_word(support.word('a00at'))
+        tb.commit_delta()
+        self.assertEqual(m.ShardedCache(self.dir).count(), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+""" Tests of morpheuslib2.SnapshotCache."""
+import os
+import unittest
+
+import support
+import morpheuslib2 as m
+
+
+class SnapshotCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = support.temp_dir(self)
+        self.ca = m.Cache(os.path.join(self.dir, 'test.cache'))
+        for r in support.responses(['amat', 'orat', 'errat']):
+            self.ca.cache(r)
+        self.ca.cache(support.response('μηρύσαντο', 'greek')[0])
+        self.file = os.path.join(self.dir, 'test.snap')
+
+    def test_freeze_and_reopen(self):
+        self.assertEqual(m.SnapshotCache.freeze(self.ca, self.file), 4)
+        sn = m.SnapshotCache(self.file)
+        self.addCleanup(sn.close)
+        self.assertEqual(m.cache_kind(self.file), 'snapshot')
+        self.assertEqual(support.contents(sn), support.contents(self.ca))
+        for (k, r) in self.ca.pers.items():
+            self.assertEqual(sn.lookup_key(k).text, r.text)
+            self.assertEqual(sn[k].text, r.text)
+        w = support.word('μηρύσαντο', 'greek')
+        self.assertEqual(sn.lookup_word(w).text, support.GREEK.encode())
+
+    def test_missing_key(self):
+        m.SnapshotCache.freeze(self.ca, self.file)
+        sn = m.SnapshotCache(self.file)
+        self.addCleanup(sn.close)
+        self.assertIsNone(sn.lookup_word(support.word('laudat')))
+        self.assertRaises(KeyError, sn.__getitem__, ('laudat', 'la'))
+
+    def test_cache_is_volatile(self):
+        m.SnapshotCache.freeze(self.ca, self.file)
+        sn = m.SnapshotCache(self.file)
+        (r, w) = support.response('laudat')
+        sn.cache(r)
+        self.assertIs(sn.lookup_word(w), r)
+        sn.close()
+        sn = m.SnapshotCache(self.file)
+        self.addCleanup(sn.close)
+        self.assertIsNone(sn.lookup_word(w))
+
+    def test_not_a_snapshot(self):
+        self.ca.commit()
+        self.assertRaises(ValueError, m.SnapshotCache, self.ca.file)
+
+
+if __name__ == '__main__':
+    unittest.main()
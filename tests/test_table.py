@@ -0,0 +1,146 @@
+""" Tests of morpheuslib2.FeatureSchema, EncodedAnalysis and AnalysisTable."""
+import pickle
+import unittest
+
+import support
+import morpheuslib2 as m
+
+
+def analyses():
+    """ Analyses of Latin and Greek words, with empty elements."""
+    out = []
+    for (w, lang, doc) in [('amat', 'la', None), ('rosa', 'la', support.ROSA),
+                           ('μηρύσαντο', 'greek', None)]:
+        (resp, wd) = support.response(w, lang, doc)
+        out.extend(list(resp.make_analysis_list(wd)))
+    return out
+
+
+class EncodedAnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = m.FeatureSchema()
+        self.analyses = analyses()
+
+    def test_encode_decode(self):
+        for a in self.analyses:
+            e = self.schema.encode(a, check = True)
+            self.assertEqual(e.decode(), a)
+            self.assertEqual(e.decode().key(), a.key())
+            self.assertEqual(e, self.schema.encode(a))
+
+    def test_empty_and_missing_elements(self):
+        rosa = [a for a in self.analyses if a.get_feature('form') == 'rosa']
+        es = [self.schema.encode(a) for a in rosa]
+        self.assertIsNone(es[0].get_feature('case'))
+        self.assertEqual(es[1].get_feature('case'), 'nom')
+        self.assertNotEqual(es[0], es[1])
+        a = m.Analysis.from_fields(('form', 'pos'), ('rosa', 'noun'), 'la', 
+                                   None, rosa[0].word)
+        e = self.schema.encode(a, check = True)
+        self.assertEqual(e.decode(), a)
+        self.assertRaises(ValueError, e.get_feature, 'lemma')
+
+    def test_schema_is_pickled_with_codes(self):
+        es = [self.schema.encode(a) for a in self.analyses]
+        (schema, codes) = pickle.loads(pickle.dumps(
+            (self.schema, [(e.codes, e.text) for e in es])))
+        for (a, (c, t)) in zip(self.analyses, codes):
+            e = m.EncodedAnalysis(a, schema)
+            self.assertEqual((e.codes, e.text), (c, t))
+            self.assertEqual(e.decode(), a)
+
+
+class TableTestCase(unittest.TestCase):
+    """ A table of three tokens and eight rows."""
+
+    def setUp(self):
+        self.table = m.AnalysisTable(m.FeatureSchema())
+        self.words = []
+        for (i, (w, lang, doc)) in enumerate([
+                ('amat', 'la', None), ('rosa', 'la', support.ROSA),
+                ('orat', 'la', None)]):
+            (resp, wd) = support.response(w, lang, doc)
+            wd = m.Word('test', w, lang, None, i, 0, i // 2)
+            self.table.add_response(wd, resp, matched = False)
+            self.words.append((wd, list(resp.make_analysis_list(wd))))
+
+
+class AnalysisTableTest(TableTestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(self.table.n_tokens(), 3)
+        self.assertEqual(len(self.table), 8)
+        got = list(self.table.by_token())
+        self.assertEqual(len(got), 3)
+        for ((w, al), (wd, want)) in zip(got, self.words):
+            self.assertEqual((w.label, w.word, w.lang, w.w, w.c, w.s), 
+                             (wd.label, wd.word, wd.lang, wd.w, wd.c, wd.s))
+            self.assertEqual(list(al), want)
+
+    def test_columns(self):
+        self.assertEqual(self.table.column('pos'), 
+                         ['noun', 'verb', 'part', 'noun', 'noun', 
+                          'noun', 'verb', 'part'])
+        self.assertEqual(self.table.column('case')[3:5], [None, 'nom'])
+        self.assertEqual(self.table.column('mood')[:3], [None, 'ind', None])
+        self.assertIsNone(self.table.get(3, 'case'))
+        self.assertEqual(self.table.get(4, 'case'), 'nom')
+        self.assertEqual(self.table.get(7, 's'), 1)
+        self.assertEqual(list(self.table.rows(1)), [3, 4])
+
+
+class TableIndexTest(TableTestCase):
+
+    def has(self, i, k):
+        """ Does a row have a feature? An empty element counts."""
+        t = self.table
+        if k in m.TableIndex.token_columns:
+            return True
+        elif k in m.AnalysisTable.string_columns:
+            return getattr(t, k)[i] != 0
+        f = t.schema.name_codes.get(k)
+        return f in t.features and t.features[f][i] != m.AnalysisTable.absent
+
+    def scan(self, **terms):
+        """ The rows satisfying the terms, found a row at a time."""
+        out = []
+        for i in range(len(self.table)):
+            ok = True
+            for (k, v) in terms.items():
+                x = self.table.get(i, k)
+                if isinstance(v, tuple):
+                    ok = ok and x is not None and v[0] <= x <= v[1]
+                elif v[0] == '!':
+                    ok = ok and self.has(i, k) and x != v[1:]
+                elif v[0] == '#':
+                    ok = ok and x == int(v[1:])
+                else:
+                    ok = ok and x == v
+            if ok:
+                out.append(i)
+        return out
+
+    def test_select(self):
+        for terms in [{'pos': 'noun'}, {'pos': '!noun'}, {'case': 'nom'},
+                      {'case': '!abl'}, {'pos': 'noun', 'gender': 'fem'},
+                      {'mood': 'ind', 'w': '#2'}, {'w': (1, 2)},
+                      {'s': '#0', 'pos': '!verb'}, {'lemma': 'amato'},
+                      {'pos': ('p', 'v')}, {'label': 'test', 'c': '#0'},
+                      {'pos': 'adj'}, {'dialect': 'attic'}, {'word': 'rosa'}]:
+            self.assertEqual(self.table.select(**terms), self.scan(**terms),
+                             terms)
+            self.assertEqual(self.table.count(**terms), 
+                             len(self.scan(**terms)), terms)
+
+    def test_rows_added_after_a_query(self):
+        self.assertEqual(self.table.count(pos = 'verb'), 2)
+        (resp, wd) = support.response('errat')
+        self.table.add_response(m.Word('test', 'errat', 'la', None, 3, 1, 2),
+                                resp, matched = False)
+        self.assertEqual(self.table.count(pos = 'verb'), 3)
+        self.assertEqual(self.table.select(w = '#3'), [8, 9, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()